@@ -0,0 +1,116 @@
+"""
+Accuracy-vs-speed benchmark of the CPU inference profiles against the fp32 baseline.
+
+Every profile forecasts the same windows of a fixed CSV with the same seeds. Reported per profile:
+mean latency per forecast, speedup over fp32, MAE of the predicted close against the fp32 forecast
+(deviation introduced by the profile) and against the ground truth.
+
+Usage:
+    python benchmark_cpu_inference.py --profiles fp32 int8 bf16 --compile --threads 8
+"""
+import argparse
+import copy
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.append("../")
+from model import Kronos, KronosTokenizer, KronosPredictor
+from model.inference_profile import PROFILES, apply_inference_profile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Kronos CPU inference benchmark")
+    parser.add_argument("--csv", default="./data/XSHG_5min_600977.csv")
+    parser.add_argument("--tokenizer", default="NeoQuasar/Kronos-Tokenizer-base")
+    parser.add_argument("--model", default="NeoQuasar/Kronos-base")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=PROFILES)
+    parser.add_argument("--compile", action="store_true", help="Also compile the decode step")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = all cores)")
+    parser.add_argument("--lookback", type=int, default=400)
+    parser.add_argument("--pred-len", type=int, default=30)
+    parser.add_argument("--windows", type=int, default=5, help="Number of forecast windows taken from the CSV")
+    parser.add_argument("--sample-count", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def build_windows(df, lookback, pred_len, n_windows):
+    """Evenly spaced (history, future) windows over the CSV."""
+    last_start = len(df) - lookback - pred_len
+    if last_start < 0:
+        raise ValueError(f"CSV has {len(df)} rows, need at least lookback + pred_len = {lookback + pred_len}")
+    starts = np.linspace(0, last_start, n_windows).astype(int)
+    windows = []
+    for start in starts:
+        hist = df.iloc[start:start + lookback]
+        future = df.iloc[start + lookback:start + lookback + pred_len]
+        windows.append((hist, future))
+    return windows
+
+
+def run_profile(name, base_model, base_tokenizer, windows, args):
+    model, tokenizer, autocast_dtype = apply_inference_profile(
+        copy.deepcopy(base_model), copy.deepcopy(base_tokenizer),
+        profile=name, compile=args.compile, num_threads=args.threads
+    )
+    predictor = KronosPredictor(model, tokenizer, device="cpu", max_context=512, autocast_dtype=autocast_dtype)
+
+    def predict(i, hist, future):
+        torch.manual_seed(args.seed + i)
+        return predictor.predict(
+            df=hist[['open', 'high', 'low', 'close', 'volume', 'amount']],
+            x_timestamp=hist['timestamps'],
+            y_timestamp=future['timestamps'],
+            pred_len=args.pred_len,
+            T=1.0,
+            top_p=0.9,
+            sample_count=args.sample_count,
+            verbose=False
+        )
+
+    # Warm-up (first-call overhead, compilation)
+    predict(0, *windows[0])
+
+    latencies, closes = [], []
+    for i, (hist, future) in enumerate(windows):
+        start = time.perf_counter()
+        pred_df = predict(i, hist, future)
+        latencies.append(time.perf_counter() - start)
+        closes.append(pred_df['close'].to_numpy())
+    return np.array(latencies), closes
+
+
+def main():
+    args = parse_args()
+
+    df = pd.read_csv(args.csv)
+    df['timestamps'] = pd.to_datetime(df['timestamps'])
+    windows = build_windows(df, args.lookback, args.pred_len, args.windows)
+    truths = [future['close'].to_numpy() for _, future in windows]
+
+    tokenizer = KronosTokenizer.from_pretrained(args.tokenizer).eval()
+    model = Kronos.from_pretrained(args.model).eval()
+
+    profiles = list(dict.fromkeys(['fp32'] + args.profiles))  # fp32 is always the reference
+    results = {}
+    for name in profiles:
+        print(f"Running profile {name} ...")
+        results[name] = run_profile(name, model, tokenizer, windows, args)
+
+    base_latency, base_closes = results['fp32']
+    print()
+    print(f"{'profile':<10}{'latency(s)':>12}{'speedup':>10}{'MAE vs fp32':>14}{'MAE vs truth':>14}")
+    for name in profiles:
+        latencies, closes = results[name]
+        mae_fp32 = np.mean([np.abs(c - b).mean() for c, b in zip(closes, base_closes)])
+        mae_truth = np.mean([np.abs(c - t).mean() for c, t in zip(closes, truths)])
+        print(f"{name:<10}{latencies.mean():>12.3f}{base_latency.mean() / latencies.mean():>10.2f}"
+              f"{mae_fp32:>14.4f}{mae_truth:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
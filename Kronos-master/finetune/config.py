@@ -38,12 +38,15 @@ class Config:
         self.backtest_time_range = ["2024-07-01", "2025-06-05"]
 
         # TODO: Directory to save the processed, pickled datasets.
+        # The training datasets also keep a float32 memmap copy of each split here ({split}_data.npy / _index.npz).
         self.dataset_path = "./data/processed_datasets"
 
         # =================================================================
         # Training Hyperparameters
         # =================================================================
         self.clip = 5.0  # Clipping value for normalized data to prevent outliers.
+        # Normalize whole batches in the DataLoader collate function instead of per sample in the dataset.
+        self.normalize_in_collate = False
 
         self.epochs = 30
         self.log_interval = 100  # Log training status every N batches.
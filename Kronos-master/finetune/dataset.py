@@ -1,3 +1,4 @@
+import os
 import pickle
 import random
 import numpy as np
@@ -6,21 +7,104 @@ from torch.utils.data import Dataset
 from config import Config
 
 
+def _time_features(index) -> np.ndarray:
+    """Computes the time features (minute, hour, weekday, day, month) of a DatetimeIndex."""
+    return np.stack([
+        index.minute, index.hour, index.weekday, index.day, index.month
+    ], axis=1).astype(np.float32)
+
+
+def memmap_paths(dataset_path: str, data_type: str) -> tuple[str, str]:
+    """Returns the (values .npy, offsets index .npz) paths of a split's memmap store."""
+    return f"{dataset_path}/{data_type}_data.npy", f"{dataset_path}/{data_type}_index.npz"
+
+
+def build_memmap_store(data_path: str, values_path: str, index_path: str,
+                       feature_list: list, time_feature_list: list) -> None:
+    """
+    Converts a pickled {symbol: DataFrame} split into one contiguous float32 array on disk.
+
+    Rows of all symbols are concatenated along the first axis; each row holds the features followed by
+    the time features. `offsets[i]:offsets[i + 1]` is the row range of `symbols[i]`. Both files are
+    written to temporary names and renamed, so concurrent ranks never read a partially written store.
+
+    Args:
+        data_path (str): Path of the pickled split produced by `qlib_data_preprocess.py`.
+        values_path (str): Output .npy file, loaded later with `np.load(mmap_mode='r')`.
+        index_path (str): Output .npz file with the symbols and row offsets.
+        feature_list (list): Feature columns to store.
+        time_feature_list (list): Time feature columns, must match the order of `_time_features`.
+    """
+    with open(data_path, 'rb') as f:
+        data = pickle.load(f)
+
+    symbols = [symbol for symbol, df in data.items() if len(df) > 0]
+    lengths = np.array([len(data[symbol]) for symbol in symbols], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    n_cols = len(feature_list) + len(time_feature_list)
+
+    tmp_values = f"{values_path}.tmp.{os.getpid()}.npy"
+    values = np.lib.format.open_memmap(tmp_values, mode='w+', dtype=np.float32, shape=(int(offsets[-1]), n_cols))
+    for i, symbol in enumerate(symbols):
+        df = data[symbol]
+        rows = slice(offsets[i], offsets[i + 1])
+        values[rows, :len(feature_list)] = df[feature_list].to_numpy(dtype=np.float32)
+        values[rows, len(feature_list):] = _time_features(df.index)
+    values.flush()
+    del values
+
+    tmp_index = f"{index_path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_index, symbols=np.array(symbols), offsets=offsets,
+             feature_list=np.array(feature_list), time_feature_list=np.array(time_feature_list))
+    os.replace(tmp_values, values_path)
+    os.replace(tmp_index, index_path)
+
+
+class BatchNormalizeCollate:
+    """
+    Collate function that stacks raw windows and applies instance-level normalization to the whole batch at once.
+
+    Used together with `QlibDataset(normalize_in_collate=True)`, which returns unnormalized numpy views.
+
+    Args:
+        clip (float): Clipping value for the normalized data.
+    """
+
+    def __init__(self, clip: float):
+        self.clip = clip
+
+    def __call__(self, batch):
+        x = torch.from_numpy(np.stack([item[0] for item in batch]))
+        x_stamp = torch.from_numpy(np.stack([item[1] for item in batch]))
+
+        # Same statistics as the per-sample path: population std over the time axis of each window.
+        x_mean = x.mean(dim=1, keepdim=True)
+        x_std = x.std(dim=1, keepdim=True, unbiased=False)
+        x = ((x - x_mean) / (x_std + 1e-5)).clamp_(-self.clip, self.clip)
+        return x, x_stamp
+
+
 class QlibDataset(Dataset):
     """
     A PyTorch Dataset for handling Qlib financial time series data.
 
-    This dataset pre-computes all possible start indices for sliding windows
-    and then randomly samples from them during training/validation.
+    The pickled split is converted once into a float32 memmap (features and time features of all symbols in
+    one contiguous array) plus an offsets index. DataLoader workers map the same file read-only, so the data
+    is shared through the page cache instead of being unpickled into every worker, and windows are served as
+    zero-copy slices without touching pandas.
+
+    Windows are sampled randomly over all valid (symbol, start) positions during training/validation.
 
     Args:
         data_type (str): The type of dataset to load, either 'train' or 'val'.
+        normalize_in_collate (bool): Return raw windows as numpy views and leave normalization to
+            `collate_fn` (a `BatchNormalizeCollate`). Defaults to `Config.normalize_in_collate`.
 
     Raises:
         ValueError: If `data_type` is not 'train' or 'val'.
     """
 
-    def __init__(self, data_type: str = 'train'):
+    def __init__(self, data_type: str = 'train', normalize_in_collate: bool = None):
         self.config = Config()
         if data_type not in ['train', 'val']:
             raise ValueError("data_type must be 'train' or 'val'")
@@ -38,41 +122,64 @@ class QlibDataset(Dataset):
             self.data_path = f"{self.config.dataset_path}/val_data.pkl"
             self.n_samples = self.config.n_val_iter
 
-        with open(self.data_path, 'rb') as f:
-            self.data = pickle.load(f)
-
         self.window = self.config.lookback_window + self.config.predict_window + 1
-
-        self.symbols = list(self.data.keys())
         self.feature_list = self.config.feature_list
         self.time_feature_list = self.config.time_feature_list
+        self.n_features = len(self.feature_list)
+
+        if normalize_in_collate is None:
+            normalize_in_collate = self.config.normalize_in_collate
+        self.normalize_in_collate = normalize_in_collate
+        # Pass to DataLoader(collate_fn=...); None keeps the default collate.
+        self.collate_fn = BatchNormalizeCollate(self.config.clip) if normalize_in_collate else None
+
+        self.values_path, self.index_path = memmap_paths(self.config.dataset_path, data_type)
+        if self._store_is_stale():
+            print(f"[{data_type.upper()}] Building memmap store from {self.data_path}...")
+            build_memmap_store(self.data_path, self.values_path, self.index_path,
+                               self.feature_list, self.time_feature_list)
+
+        index = np.load(self.index_path)
+        self.symbols = list(index['symbols'])
+        self.offsets = index['offsets']
+        self._values = None
+        self._values_pid = None
 
-        # Pre-compute all possible (symbol, start_index) pairs.
-        self.indices = []
-        print(f"[{data_type.upper()}] Pre-computing sample indices...")
-        for symbol in self.symbols:
-            df = self.data[symbol].reset_index()
-            series_len = len(df)
-            num_samples = series_len - self.window + 1
-
-            if num_samples > 0:
-                # Generate time features and store them directly in the dataframe.
-                df['minute'] = df['datetime'].dt.minute
-                df['hour'] = df['datetime'].dt.hour
-                df['weekday'] = df['datetime'].dt.weekday
-                df['day'] = df['datetime'].dt.day
-                df['month'] = df['datetime'].dt.month
-                # Keep only necessary columns to save memory.
-                self.data[symbol] = df[self.feature_list + self.time_feature_list]
-
-                # Add all valid starting indices for this symbol to the global list.
-                for i in range(num_samples):
-                    self.indices.append((symbol, i))
+        # Valid window starts per symbol; a global sample id maps back to its symbol via `cum_samples`.
+        lengths = np.diff(self.offsets)
+        self.samples_per_symbol = np.maximum(lengths - self.window + 1, 0)
+        self.cum_samples = np.concatenate([[0], np.cumsum(self.samples_per_symbol)])
+        self.n_total_samples = int(self.cum_samples[-1])
 
         # The effective dataset size is the minimum of the configured iterations
         # and the total number of available samples.
-        self.n_samples = min(self.n_samples, len(self.indices))
-        print(f"[{data_type.upper()}] Found {len(self.indices)} possible samples. Using {self.n_samples} per epoch.")
+        self.n_samples = min(self.n_samples, self.n_total_samples)
+        print(f"[{data_type.upper()}] Found {self.n_total_samples} possible samples. Using {self.n_samples} per epoch.")
+
+    def _store_is_stale(self) -> bool:
+        """True when the memmap store is missing, older than the pickle or built with different features."""
+        if not (os.path.exists(self.values_path) and os.path.exists(self.index_path)):
+            return True
+        if os.path.exists(self.data_path) and os.path.getmtime(self.data_path) > os.path.getmtime(self.values_path):
+            return True
+        index = np.load(self.index_path)
+        return (list(index['feature_list']) != list(self.feature_list)
+                or list(index['time_feature_list']) != list(self.time_feature_list))
+
+    @property
+    def values(self) -> np.ndarray:
+        """The read-only memmap, opened lazily in each process (DataLoader workers get their own mapping)."""
+        if self._values is None or self._values_pid != os.getpid():
+            self._values = np.load(self.values_path, mmap_mode='r')
+            self._values_pid = os.getpid()
+        return self._values
+
+    def __getstate__(self):
+        # Never pickle the mapping itself into spawned workers.
+        state = self.__dict__.copy()
+        state['_values'] = None
+        state['_values_pid'] = None
+        return state
 
     def set_epoch_seed(self, epoch: int):
         """
@@ -89,43 +196,48 @@ class QlibDataset(Dataset):
         """Returns the number of samples per epoch."""
         return self.n_samples
 
-    def __getitem__(self, idx: int) -> tuple[torch.Tensor, torch.Tensor]:
+    def window_rows(self, sample_id: int) -> slice:
+        """Row range in the memmap of the global sample `sample_id`."""
+        symbol_idx = int(np.searchsorted(self.cum_samples, sample_id, side='right')) - 1
+        start = int(self.offsets[symbol_idx] + sample_id - self.cum_samples[symbol_idx])
+        return slice(start, start + self.window)
+
+    def __getitem__(self, idx: int):
         """
         Retrieves a random sample from the dataset.
 
-        Note: The `idx` argument is ignored. Instead, a random index is drawn
-        from the pre-computed `self.indices` list using `self.py_rng`. This
-        ensures random sampling over the entire dataset for each call.
+        Note: The `idx` argument is ignored. Instead, a random sample is drawn
+        over all valid windows using `self.py_rng`. This ensures random sampling
+        over the entire dataset for each call.
 
         Args:
             idx (int): Ignored.
 
         Returns:
-            tuple[torch.Tensor, torch.Tensor]: A tuple containing:
-                - x_tensor (torch.Tensor): The normalized feature tensor.
-                - x_stamp_tensor (torch.Tensor): The time feature tensor.
+            tuple: A tuple containing:
+                - x: The normalized feature tensor, or the raw float32 numpy view when
+                  `normalize_in_collate` is set.
+                - x_stamp: The time feature tensor, or the numpy view when `normalize_in_collate` is set.
         """
-        # Select a random sample from the entire pool of indices.
-        random_idx = self.py_rng.randint(0, len(self.indices) - 1)
-        symbol, start_idx = self.indices[random_idx]
+        # Select a random sample from the entire pool of windows.
+        sample_id = self.py_rng.randint(0, self.n_total_samples - 1)
+        window = self.values[self.window_rows(sample_id)]
 
-        # Extract the sliding window from the dataframe.
-        df = self.data[symbol]
-        end_idx = start_idx + self.window
-        win_df = df.iloc[start_idx:end_idx]
+        # Separate main features and time features (views into the memmap).
+        x = window[:, :self.n_features]
+        x_stamp = window[:, self.n_features:]
 
-        # Separate main features and time features.
-        x = win_df[self.feature_list].values.astype(np.float32)
-        x_stamp = win_df[self.time_feature_list].values.astype(np.float32)
+        if self.normalize_in_collate:
+            return x, x_stamp
 
         # Perform instance-level normalization.
         x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
         x = (x - x_mean) / (x_std + 1e-5)
         x = np.clip(x, -self.config.clip, self.config.clip)
 
-        # Convert to PyTorch tensors.
+        # Convert to PyTorch tensors (the memmap is read-only, so the time features are copied).
         x_tensor = torch.from_numpy(x)
-        x_stamp_tensor = torch.from_numpy(x_stamp)
+        x_stamp_tensor = torch.from_numpy(np.array(x_stamp))
 
         return x_tensor, x_stamp_tensor
 
@@ -9,6 +9,7 @@ from qlib.data.dataset.loader import QlibDataLoader
 from tqdm import trange
 
 from config import Config
+from dataset import build_memmap_store, memmap_paths
 
 
 class QlibDataPreprocessor:
@@ -118,6 +119,12 @@ class QlibDataPreprocessor:
         with open(f"{self.config.dataset_path}/test_data.pkl", 'wb') as f:
             pickle.dump(test_data, f)
 
+        # Contiguous memmap copies of the training splits, read by QlibDataset.
+        for data_type in ['train', 'val']:
+            values_path, index_path = memmap_paths(self.config.dataset_path, data_type)
+            build_memmap_store(f"{self.config.dataset_path}/{data_type}_data.pkl", values_path, index_path,
+                               self.config.feature_list, self.config.time_feature_list)
+
         print("Datasets prepared and saved successfully.")
 
 
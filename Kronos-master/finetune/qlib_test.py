@@ -2,7 +2,7 @@ import os
 import sys
 import argparse
 import pickle
-from collections import defaultdict
+import time
 
 import numpy as np
 import pandas as pd
@@ -33,12 +33,19 @@ class QlibTestDataset(Dataset):
     """
     PyTorch Dataset for handling Qlib test data, specifically for inference.
 
-    This dataset iterates through all possible sliding windows sequentially. It also
-    yields metadata like symbol and timestamp, which are crucial for mapping
-    predictions back to the original time series.
+    This dataset iterates through all possible sliding windows in date-major order
+    (sorted by prediction timestamp, then symbol), so all windows of one date are
+    contiguous. It also yields metadata like symbol and timestamp, which are crucial
+    for mapping predictions back to the original time series.
+
+    Args:
+        data (dict): {symbol: DataFrame} of raw test data.
+        config (Config): Experiment configuration.
+        skip_dates (set, optional): Prediction timestamps whose windows are dropped
+            (e.g. dates that already have a prediction shard).
     """
 
-    def __init__(self, data: dict, config: Config):
+    def __init__(self, data: dict, config: Config, skip_dates: set = None):
         self.data = data
         self.config = config
         self.window_size = config.lookback_window + config.predict_window
@@ -60,10 +67,16 @@ class QlibTestDataset(Dataset):
 
             num_samples = len(df) - self.window_size + 1
             if num_samples > 0:
-                for i in range(num_samples):
-                    timestamp = df.iloc[i + self.config.lookback_window - 1]['datetime']
+                first = self.config.lookback_window - 1
+                timestamps = df['datetime'].iloc[first:first + num_samples]
+                for i, timestamp in enumerate(timestamps):
+                    if skip_dates and timestamp in skip_dates:
+                        continue
                     self.indices.append((symbol, i, timestamp))
 
+        # Date-major order: a date's windows are complete once the next date starts.
+        self.indices.sort(key=lambda item: (item[2], item[0]))
+
     def __len__(self) -> int:
         return len(self.indices)
 
@@ -236,38 +249,104 @@ def collate_fn_for_inference(batch):
     return x_batch, x_stamp_batch, y_stamp_batch, list(symbols), list(timestamps)
 
 
-def generate_predictions(config: dict, test_data: dict) -> dict[str, pd.DataFrame]:
+SHARD_DATE_FORMAT = '%Y%m%d%H%M%S'
+
+
+def _shard_path(shard_dir: str, date) -> str:
+    return os.path.join(shard_dir, f"{pd.Timestamp(date).strftime(SHARD_DATE_FORMAT)}.pkl")
+
+
+def _shard_date(name: str) -> pd.Timestamp:
+    return pd.to_datetime(name[:-len('.pkl')], format=SHARD_DATE_FORMAT)
+
+
+def _write_shard(shard_dir: str, date, records: list):
+    """Atomically writes the signals of one prediction date ({instrument: {signal: score}})."""
+    shard = pd.DataFrame.from_dict(dict(records), orient='index')
+    shard.index.name = 'instrument'
+    path = _shard_path(shard_dir, date)
+    tmp_path = f"{path}.tmp"
+    shard.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def completed_dates(shard_dir: str) -> set:
+    """Prediction dates that already have a shard on disk."""
+    if not os.path.isdir(shard_dir):
+        return set()
+    return {_shard_date(name) for name in os.listdir(shard_dir) if name.endswith('.pkl')}
+
+
+def load_prediction_shards(shard_dir: str) -> dict[str, pd.DataFrame]:
+    """
+    Merges the per-date shards into signal DataFrames.
+
+    Returns:
+        A dictionary where keys are signal types (e.g., 'mean', 'last') and
+        values are DataFrames of predictions (datetime index, symbol columns).
+    """
+    shards = {}
+    for name in sorted(os.listdir(shard_dir)):
+        if name.endswith('.pkl'):
+            shards[_shard_date(name)] = pd.read_pickle(os.path.join(shard_dir, name))
+    if not shards:
+        return {}
+
+    merged = pd.concat(shards, names=['datetime', 'instrument'])
+    return {sig_type: merged[sig_type].unstack('instrument').sort_index() for sig_type in merged.columns}
+
+
+def generate_predictions(config: dict, test_data: dict, shard_dir: str, resume: bool = True) -> dict[str, pd.DataFrame]:
     """
     Runs inference on the test dataset to generate prediction signals.
 
+    Windows are processed in date-major order and the signals of each date are written to
+    `shard_dir/<date>.pkl` as soon as the date is complete, so an interrupted run resumes from
+    the first missing date. Throughput (series/s, generated tokens/s) is reported as it runs.
+
     Args:
         config (dict): A dictionary containing inference parameters.
         test_data (dict): The raw test data loaded from a pickle file.
+        shard_dir (str): Directory of the per-date prediction shards.
+        resume (bool): Skip dates that already have a shard. Otherwise existing shards are overwritten.
 
     Returns:
         A dictionary where keys are signal types (e.g., 'mean', 'last') and
         values are DataFrames of predictions (datetime index, symbol columns).
     """
+    os.makedirs(shard_dir, exist_ok=True)
+    done = completed_dates(shard_dir) if resume else set()
+    if done:
+        print(f"Resuming: {len(done)} dates already predicted in {shard_dir}")
+
+    dataset = QlibTestDataset(data=test_data, config=Config(), skip_dates=done)
+    if len(dataset) == 0:
+        print("All dates already predicted.")
+        return load_prediction_shards(shard_dir)
+
     tokenizer, model = load_models(config)
     device = torch.device(config['device'])
 
-    # Use the Dataset and DataLoader for efficient batching and processing
-    dataset = QlibTestDataset(data=test_data, config=Config())
+    # `batch_size` counts sampled paths, each series is expanded to `sample_count` paths inside the model.
     loader = DataLoader(
         dataset,
-        batch_size=config['batch_size'] // config['sample_count'],
+        batch_size=max(1, config['batch_size'] // config['sample_count']),
         shuffle=False,
-        num_workers=os.cpu_count() // 2,
+        num_workers=config.get('num_workers', os.cpu_count() // 2),
         collate_fn=collate_fn_for_inference
     )
 
-    results = defaultdict(list)
+    pending_date, pending_records = None, []
+    n_series, n_dates = 0, 0
+    start_time = time.time()
+    progress = tqdm(loader, desc="Inference")
     with torch.no_grad():
-        for x, x_stamp, y_stamp, symbols, timestamps in tqdm(loader, desc="Inference"):
+        for x, x_stamp, y_stamp, symbols, timestamps in progress:
             preds = auto_regressive_inference(
                 tokenizer, model, x.to(device), x_stamp.to(device), y_stamp.to(device),
                 max_context=config['max_context'], pred_len=config['pred_len'], clip=config['clip'],
-                T=config['T'], top_k=config['top_k'], top_p=config['top_p'], sample_count=config['sample_count']
+                T=config['T'], top_k=config['top_k'], top_p=config['top_p'], sample_count=config['sample_count'],
+                use_kv_cache=True
             )
             # You can try commenting on this line to keep the history data
             preds = preds[:, -config['pred_len']:, :]
@@ -282,17 +361,33 @@ def generate_predictions(config: dict, test_data: dict) -> dict[str, pd.DataFram
             }
 
             for i in range(len(symbols)):
-                for sig_type, sig_values in signals.items():
-                    results[sig_type].append((timestamps[i], symbols[i], sig_values[i]))
-
-    print("Post-processing predictions into DataFrames...")
-    prediction_dfs = {}
-    for sig_type, records in results.items():
-        df = pd.DataFrame(records, columns=['datetime', 'instrument', 'score'])
-        pivot_df = df.pivot_table(index='datetime', columns='instrument', values='score')
-        prediction_dfs[sig_type] = pivot_df.sort_index()
-
-    return prediction_dfs
+                if timestamps[i] != pending_date:
+                    # Indices are sorted by (timestamp, symbol): the previous date is complete.
+                    if pending_records:
+                        _write_shard(shard_dir, pending_date, pending_records)
+                        n_dates += 1
+                    pending_date, pending_records = timestamps[i], []
+                pending_records.append((symbols[i], {sig_type: float(sig_values[i]) for sig_type, sig_values in signals.items()}))
+
+            n_series += len(symbols)
+            elapsed = time.time() - start_time
+            progress.set_postfix({
+                'series/s': f"{n_series / elapsed:.1f}",
+                'tokens/s': f"{n_series * config['sample_count'] * config['pred_len'] / elapsed:.0f}",
+                'dates': n_dates,
+            })
+
+    if pending_records:
+        _write_shard(shard_dir, pending_date, pending_records)
+        n_dates += 1
+
+    elapsed = time.time() - start_time
+    print(f"Predicted {n_series} series over {n_dates} dates in {elapsed:.1f}s "
+          f"({n_series / elapsed:.1f} series/s, "
+          f"{n_series * config['sample_count'] * config['pred_len'] / elapsed:.0f} tokens/s)")
+
+    print("Merging prediction shards into DataFrames...")
+    return load_prediction_shards(shard_dir)
 
 
 # =================================================================================
@@ -303,6 +398,10 @@ def main():
     """Main function to set up config, run inference, and execute backtesting."""
     parser = argparse.ArgumentParser(description="Run Kronos Inference and Backtesting")
     parser.add_argument("--device", type=str, default="cuda:1", help="Device for inference (e.g., 'cuda:0', 'cpu')")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Sampled paths per inference batch (defaults to Config.backtest_batch_size)")
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() // 2, help="DataLoader workers")
+    parser.add_argument("--no-resume", action="store_true", help="Recompute dates that already have a prediction shard")
     args = parser.parse_args()
 
     # --- 1. Configuration Setup ---
@@ -323,7 +422,8 @@ def main():
         'top_k': base_config.inference_top_k,
         'top_p': base_config.inference_top_p,
         'sample_count': base_config.inference_sample_count,
-        'batch_size': base_config.backtest_batch_size,
+        'batch_size': args.batch_size or base_config.backtest_batch_size,
+        'num_workers': args.num_workers,
     }
 
     print("--- Running with Configuration ---")
@@ -337,11 +437,12 @@ def main():
     with open(test_data_path, 'rb') as f:
         test_data = pickle.load(f)
     print(test_data)
-    # --- 3. Generate Predictions ---
-    model_preds = generate_predictions(run_config, test_data)
+    # --- 3. Generate Predictions (streamed to per-date shards) ---
+    save_dir = os.path.join(run_config['result_save_path'], run_config['result_name'])
+    shard_dir = os.path.join(save_dir, "prediction_shards")
+    model_preds = generate_predictions(run_config, test_data, shard_dir, resume=not args.no_resume)
 
     # --- 4. Save Predictions ---
-    save_dir = os.path.join(run_config['result_save_path'], run_config['result_name'])
     os.makedirs(save_dir, exist_ok=True)
     predictions_file = os.path.join(save_dir, "predictions.pkl")
     print(f"Saving prediction signals to {predictions_file}...")
@@ -48,11 +48,13 @@ def create_dataloaders(config: dict, rank: int, world_size: int):
 
     train_loader = DataLoader(
         train_dataset, batch_size=config['batch_size'], sampler=train_sampler,
-        num_workers=config.get('num_workers', 2), pin_memory=True, drop_last=True
+        num_workers=config.get('num_workers', 2), pin_memory=True, drop_last=True,
+        collate_fn=train_dataset.collate_fn
     )
     val_loader = DataLoader(
         valid_dataset, batch_size=config['batch_size'], sampler=val_sampler,
-        num_workers=config.get('num_workers', 2), pin_memory=True, drop_last=False
+        num_workers=config.get('num_workers', 2), pin_memory=True, drop_last=False,
+        collate_fn=valid_dataset.collate_fn
     )
     return train_loader, val_loader, train_dataset, valid_dataset
 
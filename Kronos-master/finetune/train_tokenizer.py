@@ -56,7 +56,8 @@ def create_dataloaders(config: dict, rank: int, world_size: int):
         shuffle=False,  # Shuffle is handled by the sampler
         num_workers=config.get('num_workers', 2),
         pin_memory=True,
-        drop_last=True
+        drop_last=True,
+        collate_fn=train_dataset.collate_fn
     )
     val_loader = DataLoader(
         valid_dataset,
@@ -65,7 +66,8 @@ def create_dataloaders(config: dict, rank: int, world_size: int):
         shuffle=False,
         num_workers=config.get('num_workers', 2),
         pin_memory=True,
-        drop_last=False
+        drop_last=False,
+        collate_fn=valid_dataset.collate_fn
     )
     print(f"[Rank {rank}] Dataloaders created. Train steps/epoch: {len(train_loader)}, Val steps: {len(val_loader)}")
     return train_loader, val_loader, train_dataset, valid_dataset
@@ -127,6 +127,8 @@ class CustomFinetuneConfig:
         self.train_ratio = data_config.get('train_ratio', 0.9)
         self.val_ratio = data_config.get('val_ratio', 0.1)
         self.test_ratio = data_config.get('test_ratio', 0.0)
+        # directory for the converted columnar CSV cache (default: .kline_cache next to each CSV)
+        self.cache_dir = data_config.get('cache_dir')
         
         # training configuration
         training_config = self.loader.get_training_config()
@@ -200,6 +202,7 @@ class CustomFinetuneConfig:
             'train_ratio': self.train_ratio,
             'val_ratio': self.val_ratio,
             'test_ratio': self.test_ratio,
+            'cache_dir': self.cache_dir,
             'epochs': self.tokenizer_epochs,
             'batch_size': self.batch_size,
             'log_interval': self.log_interval,
@@ -226,6 +229,7 @@ class CustomFinetuneConfig:
             'train_ratio': self.train_ratio,
             'val_ratio': self.val_ratio,
             'test_ratio': self.test_ratio,
+            'cache_dir': self.cache_dir,
             'epochs': self.basemodel_epochs,
             'batch_size': self.batch_size,
             'log_interval': self.log_interval,
@@ -0,0 +1,116 @@
+import os
+import re
+import glob
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_VERSION = 1
+TIME_FEATURES = ['minute', 'hour', 'weekday', 'day', 'month']
+
+
+def resolve_csv_files(data_path):
+    """
+    Expands `data_path` into a sorted list of CSV files.
+
+    Accepts a single CSV file, a directory (every *.csv inside), a glob pattern or a list of any of these.
+    Each file is treated as one independent series (e.g. one symbol).
+    """
+    paths = data_path if isinstance(data_path, (list, tuple)) else [data_path]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        elif any(ch in path for ch in '*?['):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    if not files:
+        raise FileNotFoundError(f"No CSV files found for data_path: {data_path}")
+    return files
+
+
+def cache_key(csv_path, feature_list):
+    """
+    Invalidation key of a converted CSV: hash of the absolute path, size, modification time,
+    the stored columns and the cache format version.
+    """
+    stat = os.stat(csv_path)
+    payload = json.dumps([
+        os.path.abspath(csv_path), stat.st_size, stat.st_mtime_ns, list(feature_list), CACHE_VERSION
+    ])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _time_features(timestamps):
+    return np.stack([
+        timestamps.dt.minute, timestamps.dt.hour, timestamps.dt.weekday, timestamps.dt.day, timestamps.dt.month
+    ], axis=1).astype(np.float32)
+
+
+def _save_atomic(path, array):
+    tmp_path = f"{path}.tmp.{os.getpid()}.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def convert_csv(csv_path, values_path, timestamps_path, feature_list):
+    """
+    Parses a CSV once into columnar binary files:
+        - values: float32 [N, len(feature_list) + 5], features followed by the time features
+        - timestamps: int64 [N], nanoseconds since epoch
+    Rows are sorted by time and missing values are forward filled.
+    """
+    df = pd.read_csv(csv_path, usecols=['timestamps'] + list(feature_list))
+    df['timestamps'] = pd.to_datetime(df['timestamps'])
+    df = df.sort_values('timestamps').reset_index(drop=True)
+
+    features = df[list(feature_list)]
+    if features.isnull().any().any():
+        print(f"Warning: Missing values found in {csv_path}, performing forward fill")
+        features = features.ffill()
+
+    values = np.empty((len(df), len(feature_list) + len(TIME_FEATURES)), dtype=np.float32)
+    values[:, :len(feature_list)] = features.to_numpy(dtype=np.float32)
+    values[:, len(feature_list):] = _time_features(df['timestamps'])
+
+    _save_atomic(values_path, values)
+    _save_atomic(timestamps_path, df['timestamps'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+
+
+def load_csv_cached(csv_path, feature_list, cache_dir=None):
+    """
+    Returns the columnar (values, timestamps) arrays of a CSV as read-only memmaps,
+    converting the CSV first when no cache matches its current key.
+
+    Args:
+        csv_path (str): Source CSV with a `timestamps` column and the feature columns.
+        feature_list (list): Feature columns to keep.
+        cache_dir (str, optional): Where converted files are stored. Defaults to `.kline_cache` next to the CSV.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.kline_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    key = cache_key(csv_path, feature_list)
+    values_path = os.path.join(cache_dir, f"{stem}-{key}.values.npy")
+    timestamps_path = os.path.join(cache_dir, f"{stem}-{key}.timestamps.npy")
+
+    if not (os.path.exists(values_path) and os.path.exists(timestamps_path)):
+        print(f"Converting {csv_path} to columnar cache ({cache_dir})...")
+        convert_csv(csv_path, values_path, timestamps_path, feature_list)
+        # Drop conversions of older versions of the same file
+        own_file = re.compile(rf"{re.escape(stem)}-[0-9a-f]{{16}}\.")
+        for stale in glob.glob(os.path.join(cache_dir, f"{glob.escape(stem)}-*.npy")):
+            name = os.path.basename(stale)
+            if own_file.match(name) and not name.startswith(f"{stem}-{key}."):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    return np.load(values_path, mmap_mode='r'), np.load(timestamps_path, mmap_mode='r')
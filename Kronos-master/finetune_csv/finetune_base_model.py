@@ -20,12 +20,21 @@ from torch.nn.parallel import DistributedDataParallel as DDP
 sys.path.append('../')
 from model import Kronos, KronosTokenizer, KronosPredictor
 from config_loader import CustomFinetuneConfig
+from csv_cache import TIME_FEATURES, load_csv_cached, resolve_csv_files
 
 
 class CustomKlineDataset(Dataset):
+    """
+    Sliding-window dataset over one or more K-line CSV files.
+
+    Each CSV is converted once into a cached columnar binary file (see `csv_cache.py`) that every split
+    memory-maps, so later runs skip CSV parsing and samples are sliced with plain numpy. With several
+    files (a directory, glob pattern or list as `data_path`), each file is split by time on its own and
+    windows never cross file boundaries.
+    """
     
     def __init__(self, data_path, data_type='train', lookback_window=90, predict_window=10, 
-                 clip=5.0, seed=100, train_ratio=0.7, val_ratio=0.15, test_ratio=0.15):
+                 clip=5.0, seed=100, train_ratio=0.7, val_ratio=0.15, test_ratio=0.15, cache_dir=None):
         self.data_path = data_path
         self.data_type = data_type
         self.lookback_window = lookback_window
@@ -36,65 +45,61 @@ class CustomKlineDataset(Dataset):
         self.train_ratio = train_ratio
         self.val_ratio = val_ratio
         self.test_ratio = test_ratio
+        self.cache_dir = cache_dir
         
         self.feature_list = ['open', 'high', 'low', 'close', 'volume', 'amount']
-        self.time_feature_list = ['minute', 'hour', 'weekday', 'day', 'month']
+        self.time_feature_list = TIME_FEATURES
+        self.n_features = len(self.feature_list)
         
         self.py_rng = random.Random(seed)
         
         self._load_and_preprocess_data()
         self._split_data_by_time()
         
-        self.n_samples = len(self.data) - self.window + 1
+        # Global sample index -> segment via cumulative window counts
+        self.segment_samples = np.array([max(len(v) - self.window + 1, 0) for v in self.segments], dtype=np.int64)
+        self.cum_samples = np.concatenate([[0], np.cumsum(self.segment_samples)])
+        self.n_samples = int(self.cum_samples[-1])
             
-        print(f"[{data_type.upper()}] Data length: {len(self.data)}, Available samples: {self.n_samples}")
+        print(f"[{data_type.upper()}] Data length: {sum(len(v) for v in self.segments)}, Available samples: {self.n_samples}")
     
     def _load_and_preprocess_data(self):
-        df = pd.read_csv(self.data_path)
-        
-        df['timestamps'] = pd.to_datetime(df['timestamps'])
-        df = df.sort_values('timestamps').reset_index(drop=True)
-        
-        self.timestamps = df['timestamps'].copy()
-        
-        df['minute'] = df['timestamps'].dt.minute
-        df['hour'] = df['timestamps'].dt.hour
-        df['weekday'] = df['timestamps'].dt.weekday
-        df['day'] = df['timestamps'].dt.day
-        df['month'] = df['timestamps'].dt.month
-        
-        self.data = df[self.feature_list + self.time_feature_list].copy()
+        self.files = resolve_csv_files(self.data_path)
+        self.series = []
+        for csv_path in self.files:
+            values, timestamps = load_csv_cached(csv_path, self.feature_list, self.cache_dir)
+            self.series.append((values, timestamps))
         
-        if self.data.isnull().any().any():
-            print("Warning: Missing values found in data, performing forward fill")
-            self.data = self.data.fillna(method='ffill')
-        
-        print(f"Original data time range: {self.timestamps.min()} to {self.timestamps.max()}")
-        print(f"Original data total length: {len(df)} records")
+        total = sum(len(values) for values, _ in self.series)
+        print(f"Loaded {len(self.files)} file(s), {total} records in total")
+        for csv_path, (values, timestamps) in zip(self.files, self.series):
+            if len(timestamps):
+                print(f"Original data time range ({os.path.basename(csv_path)}): "
+                      f"{_to_datetime(timestamps[0])} to {_to_datetime(timestamps[-1])}")
     
     def _split_data_by_time(self):
-        total_length = len(self.data)
-        
-        train_end = int(total_length * self.train_ratio)
-        val_end = int(total_length * (self.train_ratio + self.val_ratio))
+        if self.data_type not in ('train', 'val', 'test'):
+            raise ValueError("data_type must be 'train', 'val' or 'test'")
         
-        if self.data_type == 'train':
-            self.data = self.data.iloc[:train_end].copy()
-            self.timestamps = self.timestamps.iloc[:train_end].copy()
-            print(f"[{self.data_type.upper()}] Training set: first {train_end} time points ({self.train_ratio})")
-            print(f"[{self.data_type.upper()}] Training set time range: {self.timestamps.min()} to {self.timestamps.max()}")
-        elif self.data_type == 'val':
-            self.data = self.data.iloc[train_end:val_end].copy()
-            self.timestamps = self.timestamps.iloc[train_end:val_end].copy()
-            print(f"[{self.data_type.upper()}] Validation set: time points {train_end+1} to {val_end} ({self.val_ratio})")
-            print(f"[{self.data_type.upper()}] Validation set time range: {self.timestamps.min()} to {self.timestamps.max()}")
-        elif self.data_type == 'test':
-            self.data = self.data.iloc[val_end:].copy()
-            self.timestamps = self.timestamps.iloc[val_end:].copy()
-            print(f"[{self.data_type.upper()}] Test set: after time point {val_end+1}")
-            print(f"[{self.data_type.upper()}] Test set time range: {self.timestamps.min()} to {self.timestamps.max()}")
+        self.segments = []
+        self.segment_timestamps = []
+        for values, timestamps in self.series:
+            total_length = len(values)
+            train_end = int(total_length * self.train_ratio)
+            val_end = int(total_length * (self.train_ratio + self.val_ratio))
+            bounds = {'train': (0, train_end), 'val': (train_end, val_end), 'test': (val_end, total_length)}
+            lo, hi = bounds[self.data_type]
+            # Views into the memmap, no copy
+            self.segments.append(values[lo:hi])
+            self.segment_timestamps.append(timestamps[lo:hi])
         
-        print(f"[{self.data_type.upper()}] Data length after split: {len(self.data)} records")
+        ratio = {'train': self.train_ratio, 'val': self.val_ratio, 'test': self.test_ratio}[self.data_type]
+        non_empty = [ts for ts in self.segment_timestamps if len(ts)]
+        print(f"[{self.data_type.upper()}] Split ratio per file: {ratio}")
+        if non_empty:
+            print(f"[{self.data_type.upper()}] Time range: {_to_datetime(min(ts[0] for ts in non_empty))} "
+                  f"to {_to_datetime(max(ts[-1] for ts in non_empty))}")
+        print(f"[{self.data_type.upper()}] Data length after split: {sum(len(v) for v in self.segments)} records")
     
     def set_epoch_seed(self, epoch):
         epoch_seed = self.seed + epoch
@@ -105,22 +110,23 @@ class CustomKlineDataset(Dataset):
         return self.n_samples
     
     def __getitem__(self, idx):
-        max_start = len(self.data) - self.window
-        if max_start <= 0:
+        if self.n_samples <= 1:
             raise ValueError("Data length insufficient to create samples")
         
         if self.data_type == 'train':
             epoch = getattr(self, 'current_epoch', 0)
-            start_idx = (idx * 9973 + (epoch + 1) * 104729) % (max_start + 1)
+            sample = (idx * 9973 + (epoch + 1) * 104729) % self.n_samples
         else:
-            start_idx = idx % (max_start + 1)
+            sample = idx % self.n_samples
         
+        segment = int(np.searchsorted(self.cum_samples, sample, side='right')) - 1
+        start_idx = sample - int(self.cum_samples[segment])
         end_idx = start_idx + self.window
         
-        window_data = self.data.iloc[start_idx:end_idx]
+        window_data = self.segments[segment][start_idx:end_idx]
         
-        x = window_data[self.feature_list].values.astype(np.float32)
-        x_stamp = window_data[self.time_feature_list].values.astype(np.float32)
+        x = window_data[:, :self.n_features]
+        x_stamp = np.array(window_data[:, self.n_features:])
         
         x_mean, x_std = np.mean(x, axis=0), np.std(x, axis=0)
         x = (x - x_mean) / (x_std + 1e-5)
@@ -132,6 +138,10 @@ class CustomKlineDataset(Dataset):
         return x_tensor, x_stamp_tensor
 
 
+def _to_datetime(ns):
+    return pd.Timestamp(int(ns))
+
+
 
 
 def setup_logging(exp_name: str, log_dir: str, rank: int = 0) -> logging.Logger:
@@ -191,7 +201,8 @@ def create_dataloaders(config):
         seed=config.seed,
         train_ratio=config.train_ratio,
         val_ratio=config.val_ratio,
-        test_ratio=config.test_ratio
+        test_ratio=config.test_ratio,
+        cache_dir=config.cache_dir
     )
     
     val_dataset = CustomKlineDataset(
@@ -203,7 +214,8 @@ def create_dataloaders(config):
         seed=config.seed + 1,
         train_ratio=config.train_ratio,
         val_ratio=config.val_ratio,
-        test_ratio=config.test_ratio
+        test_ratio=config.test_ratio,
+        cache_dir=config.cache_dir
     )
     
     use_ddp = dist.is_available() and dist.is_initialized()
@@ -0,0 +1,103 @@
+import os
+import warnings
+
+import torch
+import torch.nn as nn
+
+
+PROFILES = ('fp32', 'int8', 'bf16')
+
+
+def configure_cpu_threads(num_threads=None, num_interop_threads=None):
+    """
+    Pins the intra-op (and optionally inter-op) thread pools used by CPU inference.
+
+    Args:
+        num_threads (int, optional): Intra-op threads. Defaults to the number of available cores.
+        num_interop_threads (int, optional): Inter-op threads. Only settable before the first parallel op runs.
+    """
+    if not num_threads:
+        num_threads = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            # Raised once any inter-op parallel work has started
+            warnings.warn(f"Could not set inter-op threads: {e}")
+    return num_threads
+
+
+def quantize_linear_int8(module):
+    """
+    Applies dynamic int8 quantization to every nn.Linear of `module` (weights int8, activations quantized on the fly).
+
+    Args:
+        module (nn.Module): Module in eval mode on CPU.
+
+    Returns:
+        nn.Module: Quantized module.
+    """
+    quantize_dynamic = getattr(torch, 'ao', torch).quantization.quantize_dynamic
+    return quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+
+def compile_decode_step(model):
+    """
+    Compiles the per-step decode functions (`decode_s1` / `decode_s2`) of a Kronos model with torch.compile.
+
+    Falls back to eager execution when torch.compile is unavailable.
+    """
+    if not hasattr(torch, 'compile'):
+        warnings.warn("torch.compile is not available, decoding runs eagerly")
+        return model
+    try:
+        model.decode_s1 = torch.compile(model.decode_s1, dynamic=True)
+        model.decode_s2 = torch.compile(model.decode_s2, dynamic=True)
+    except Exception as e:
+        warnings.warn(f"torch.compile failed, decoding runs eagerly: {e}")
+    return model
+
+
+def apply_inference_profile(model, tokenizer, profile='fp32', compile=False, num_threads=None, quantize_tokenizer=False):
+    """
+    Prepares a Kronos model/tokenizer pair for CPU inference.
+
+    Profiles:
+        - fp32: unchanged weights.
+        - int8: dynamic int8 quantization of the Kronos model's linear layers. The tokenizer runs once per
+                request and its binary codes are sensitive to small perturbations, so it stays fp32 unless
+                `quantize_tokenizer` is set.
+        - bf16: weights stay fp32, inference runs under bf16 autocast (pass the returned dtype to KronosPredictor).
+
+    Args:
+        model (Kronos): Kronos model.
+        tokenizer (KronosTokenizer): Kronos tokenizer.
+        profile (str): One of PROFILES.
+        compile (bool): Compile the decode step with torch.compile.
+        num_threads (int, optional): Intra-op threads to pin, 0/None uses every available core.
+        quantize_tokenizer (bool): Also quantize the tokenizer in the int8 profile.
+
+    Returns:
+        Tuple[Kronos, KronosTokenizer, Optional[torch.dtype]]: model, tokenizer and the autocast dtype
+        to use with KronosPredictor (None when autocast is not needed).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown inference profile '{profile}', expected one of {PROFILES}")
+
+    configure_cpu_threads(num_threads)
+    model = model.to('cpu').eval()
+    tokenizer = tokenizer.to('cpu').eval()
+    autocast_dtype = None
+
+    if profile == 'int8':
+        model = quantize_linear_int8(model)
+        if quantize_tokenizer:
+            tokenizer = quantize_linear_int8(tokenizer)
+    elif profile == 'bf16':
+        autocast_dtype = torch.bfloat16
+
+    if compile:
+        model = compile_decode_step(model)
+
+    return model, tokenizer, autocast_dtype
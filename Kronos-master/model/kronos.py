@@ -1,3 +1,4 @@
+import contextlib
 import numpy as np
 import pandas as pd
 import torch
@@ -139,32 +140,36 @@ class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
         x = x * q_scale
         return x
 
-    def encode(self, x, half=False):
+    def encode(self, x, half=False, padding_mask=None):
         """
         Encodes the input data into quantized indices.
 
         Args:
             x (torch.Tensor): Input tensor of shape (batch_size, seq_len, d_in).
             half (bool, optional): Whether to use half quantization in BSQuantizer. Defaults to False.
+            padding_mask (torch.Tensor, optional): Boolean mask of padded positions (True = padding).
+                                                   Shape: [batch_size, seq_len]. Defaults to None.
 
         Returns:
             torch.Tensor: Quantized indices from BSQuantizer.
         """
         z = self.embed(x)
         for layer in self.encoder:
-            z = layer(z)
+            z = layer(z, key_padding_mask=padding_mask)
         z = self.quant_embed(z)
 
         bsq_loss, quantized, z_indices = self.tokenizer(z, half)
         return z_indices
 
-    def decode(self, x, half=False):
+    def decode(self, x, half=False, padding_mask=None):
         """
         Decodes quantized indices back to the input data space.
 
         Args:
             x (torch.Tensor): Quantized indices tensor.
             half (bool, optional): Whether the indices were generated with half quantization. Defaults to False.
+            padding_mask (torch.Tensor, optional): Boolean mask of padded positions (True = padding).
+                                                   Shape: [batch_size, seq_len]. Defaults to None.
 
         Returns:
             torch.Tensor: Reconstructed output tensor of shape (batch_size, seq_len, d_in).
@@ -172,7 +177,7 @@ class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
         quantized = self.indices_to_bits(x, half)
         z = self.post_quant_embed(quantized)
         for layer in self.decoder:
-            z = layer(z)
+            z = layer(z, key_padding_mask=padding_mask)
         z = self.head(z)
         return z
 
@@ -275,7 +280,19 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
         s2_logits = self.head.cond_forward(x2)
         return s1_logits, s2_logits
 
-    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None):
+    def init_kv_cache(self, max_len=None):
+        """
+        Creates an empty KV cache for incremental decoding with `decode_s1` / `decode_s2`.
+
+        Args:
+            max_len (int, optional): Sliding window size (normally `max_context`). Defaults to None (unbounded).
+
+        Returns:
+            KVCache: Cache with one entry per Transformer block and one for the dependency-aware layer.
+        """
+        return KVCache(self.n_layers, max_len)
+
+    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None, kv_cache=None):
         """
         Decodes only the s1 tokens.
 
@@ -287,10 +304,14 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
             s2_ids (torch.Tensor): Input tensor of s2 token IDs. Shape: [batch_size, seq_len]
             stamp (torch.Tensor, optional): Temporal stamp tensor. Shape: [batch_size, seq_len]. Defaults to None.
             padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            kv_cache (KVCache, optional): Cache from `init_kv_cache`. When given, the inputs only hold the tokens
+                                          not yet seen by the cache and only the last position's s1 logits are computed.
+                                          Defaults to None.
 
         Returns:
             Tuple[torch.Tensor, torch.Tensor]:
                 - s1 logits: Logits for s1 token predictions. Shape: [batch_size, seq_len, s1_vocab_size]
+                             ([batch_size, 1, s1_vocab_size] with kv_cache)
                 - context: Context representation from the Transformer. Shape: [batch_size, seq_len, d_model]
         """
         x = self.embedding([s1_ids, s2_ids])
@@ -299,15 +320,19 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
             x = x + time_embedding
         x = self.token_drop(x)
 
-        for layer in self.transformer:
-            x = layer(x, key_padding_mask=padding_mask)
+        for i, layer in enumerate(self.transformer):
+            layer_cache = kv_cache.layers[i] if kv_cache is not None else None
+            x = layer(x, key_padding_mask=padding_mask, kv_cache=layer_cache)
 
         x = self.norm(x)
 
-        s1_logits = self.head(x)
+        if kv_cache is not None:
+            s1_logits = self.head(x[:, -1:, :])
+        else:
+            s1_logits = self.head(x)
         return s1_logits, x
 
-    def decode_s2(self, context, s1_ids, padding_mask=None):
+    def decode_s2(self, context, s1_ids, padding_mask=None, kv_cache=None):
         """
         Decodes the s2 tokens, conditioned on the context and s1 tokens.
 
@@ -319,12 +344,16 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
                                      Shape: [batch_size, seq_len, d_model]
             s1_ids (torch.torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len]
             padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            kv_cache (KVCache, optional): The cache passed to `decode_s1`. When given, `context` only holds the new
+                                          context rows, `s1_ids` must be the single sampled token ([batch_size, 1])
+                                          and only the last position is decoded. Defaults to None.
 
         Returns:
-            torch.Tensor: s2 logits. Shape: [batch_size, seq_len, s2_vocab_size]
+            torch.Tensor: s2 logits. Shape: [batch_size, seq_len, s2_vocab_size] ([batch_size, 1, s2_vocab_size] with kv_cache)
         """
         sibling_embed = self.embedding.emb_s1(s1_ids)
-        x2 = self.dep_layer(context, sibling_embed, key_padding_mask=padding_mask)
+        dep_cache = kv_cache.dep if kv_cache is not None else None
+        x2 = self.dep_layer(context, sibling_embed, key_padding_mask=padding_mask, kv_cache=dep_cache)
         return self.head.cond_forward(x2)
 
 
@@ -386,18 +415,41 @@ def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_l
     return x
 
 
-def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False):
+def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False, use_kv_cache=True, padding_mask=None, return_samples=False):
+    """
+    Autoregressively samples `pred_len` future tokens and decodes them back to the input space.
+
+    The history is encoded once per series and shared by all `sample_count` samples. With `use_kv_cache`
+    (default) the shared prefix is also prefilled once and its cache broadcast to every sample, after which
+    each step only runs the newly sampled tokens through the Transformer; `decode_s2` only decodes the last
+    position. As long as `initial_seq_len + pred_len <= max_context` this matches the full re-encoding
+    path. Beyond that the cache slides over the last `max_context` positions, whereas the uncached path
+    re-encodes the truncated window from scratch at every step, so results may differ slightly.
+    Set `use_kv_cache=False` to use the original full re-encoding at every step.
+
+    `padding_mask` ([batch_size, seq_len], True = padding) marks left-padded positions of shorter series
+    in a ragged batch; padded positions are masked out of every attention layer.
+
+    Returns:
+        np.ndarray: Mean over samples, shape [batch_size, window_len, d_in], or every sample with shape
+                    [batch_size, sample_count, window_len, d_in] when `return_samples` is set.
+    """
     with torch.no_grad():
         batch_size = x.size(0)
         initial_seq_len = x.size(1)
         x = torch.clip(x, -clip, clip)
 
         device = x.device
-        x = x.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x.size(1), x.size(2)).to(device)
-        x_stamp = x_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x_stamp.size(1), x_stamp.size(2)).to(device)
-        y_stamp = y_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, y_stamp.size(1), y_stamp.size(2)).to(device)
+        x_stamp = x_stamp.to(device)
+        y_stamp = y_stamp.to(device)
+        if padding_mask is not None:
+            padding_mask = padding_mask.bool().to(device)
 
-        x_token = tokenizer.encode(x, half=True)
+        # Encode the history once and broadcast the tokens to every sample (b -> b * sample_count + s)
+        x_token = tokenizer.encode(x, half=True, padding_mask=padding_mask)
+
+        def expand(t):
+            return t.repeat_interleave(sample_count, dim=0) if t is not None and sample_count > 1 else t
 
         def get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, pred_step):
 
@@ -407,37 +459,90 @@ def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context
                 start_idx = max_context - pred_step
                 return torch.cat([x_stamp[:, -start_idx:, :], y_stamp[:, :pred_step, :]], dim=1)
 
+        def get_window_mask(length):
+            """Padding mask of the last `length` tokens (sampled tokens are never padding)."""
+            if padding_mask is None:
+                return None
+            total = x_token[0].size(1)
+            mask = padding_mask
+            if mask.size(0) != x_token[0].size(0):
+                mask = expand(mask)
+            if total > mask.size(1):
+                mask = torch.cat([mask, mask.new_zeros(mask.size(0), total - mask.size(1))], dim=1)
+            return mask[:, -length:]
+
         if verbose:
             ran = trange
         else:
             ran = range
+
+        kv_cache = model.init_kv_cache(max_context) if use_kv_cache else None
+        if kv_cache is None:
+            x_token = [expand(t) for t in x_token]
+            x_stamp = expand(x_stamp)
+        y_stamp = expand(y_stamp)
+
         for i in ran(pred_len):
             current_seq_len = initial_seq_len + i
 
-            if current_seq_len <= max_context:
-                input_tokens = x_token
+            if kv_cache is not None:
+                if i == 0:
+                    # Prefill the (windowed) shared history once per series, then broadcast it to every sample
+                    input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
+                    current_stamp = x_stamp[:, -max_context:, :]
+                    step_mask = get_window_mask(input_tokens[0].size(1))
+
+                    s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp, padding_mask=step_mask, kv_cache=kv_cache)
+                    if sample_count > 1:
+                        kv_cache.repeat_interleave(sample_count)
+                        x_token = [expand(t) for t in x_token]
+                    s1_logits = expand(s1_logits[:, -1, :])
+                    context = expand(context)
+                    step_mask = expand(step_mask)
+                else:
+                    # Only the token sampled in the previous step is new
+                    input_tokens = [t[:, -1:] for t in x_token]
+                    current_stamp = y_stamp[:, i - 1:i, :]
+                    step_mask = None
+
+                    s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp, kv_cache=kv_cache)
+                    s1_logits = s1_logits[:, -1, :]
+
+                sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+
+                s2_logits = model.decode_s2(context, sample_pre, padding_mask=step_mask, kv_cache=kv_cache)
+                s2_logits = s2_logits[:, -1, :]
+                sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
             else:
-                input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
+                if current_seq_len <= max_context:
+                    input_tokens = x_token
+                else:
+                    input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
 
-            current_stamp = get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, i)
+                current_stamp = get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, i)
+                step_mask = get_window_mask(input_tokens[0].size(1))
 
-            s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp)
-            s1_logits = s1_logits[:, -1, :]
-            sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+                s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp, padding_mask=step_mask)
+                s1_logits = s1_logits[:, -1, :]
+                sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
 
-            s2_logits = model.decode_s2(context, sample_pre)
-            s2_logits = s2_logits[:, -1, :]
-            sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+                s2_logits = model.decode_s2(context, sample_pre, padding_mask=step_mask)
+                s2_logits = s2_logits[:, -1, :]
+                sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
 
             x_token[0] = torch.cat([x_token[0], sample_pre], dim=1)
             x_token[1] = torch.cat([x_token[1], sample_post], dim=1)
 
-            torch.cuda.empty_cache()
+            if device.type == 'cuda':
+                torch.cuda.empty_cache()
 
+        # Single decoding pass over all samples
         input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
-        z = tokenizer.decode(input_tokens, half=True)
+        z = tokenizer.decode(input_tokens, half=True, padding_mask=get_window_mask(input_tokens[0].size(1)))
         z = z.reshape(batch_size, sample_count, z.size(1), z.size(2))
-        preds = z.cpu().numpy()
+        preds = z.float().cpu().numpy()
+        if return_samples:
+            return preds
         preds = np.mean(preds, axis=1)
 
         return preds
@@ -455,8 +560,21 @@ def calc_time_stamps(x_timestamp):
 
 class KronosPredictor:
 
-    def __init__(self, model, tokenizer, device="cuda:0", max_context=512, clip=5):
+    def __init__(self, model, tokenizer, device="cuda:0", max_context=512, clip=5, use_kv_cache=True, autocast_dtype=None):
+        """
+        Args:
+            model (Kronos): Kronos model.
+            tokenizer (KronosTokenizer): Kronos tokenizer.
+            device (str): Device to run inference on.
+            max_context (int): Maximum context length of the model.
+            clip (float): Clipping value for normalized inputs.
+            use_kv_cache (bool): Use KV-cache incremental decoding (see `auto_regressive_inference`).
+            autocast_dtype (torch.dtype, optional): Run inference under autocast with this dtype
+                                                    (e.g. torch.bfloat16 on CPU). Defaults to None (disabled).
+        """
         self.tokenizer = tokenizer
+        self.use_kv_cache = use_kv_cache
+        self.autocast_dtype = autocast_dtype
         self.model = model
         self.max_context = max_context
         self.clip = clip
@@ -469,18 +587,52 @@ class KronosPredictor:
         self.tokenizer = self.tokenizer.to(self.device)
         self.model = self.model.to(self.device)
 
-    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose):
+    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose, padding_mask=None, return_samples=False):
 
         x_tensor = torch.from_numpy(np.array(x).astype(np.float32)).to(self.device)
         x_stamp_tensor = torch.from_numpy(np.array(x_stamp).astype(np.float32)).to(self.device)
         y_stamp_tensor = torch.from_numpy(np.array(y_stamp).astype(np.float32)).to(self.device)
+        mask_tensor = None
+        if padding_mask is not None:
+            mask_tensor = torch.from_numpy(np.asarray(padding_mask, dtype=bool)).to(self.device)
 
-        preds = auto_regressive_inference(self.tokenizer, self.model, x_tensor, x_stamp_tensor, y_stamp_tensor, self.max_context, pred_len,
-                                          self.clip, T, top_k, top_p, sample_count, verbose)
-        preds = preds[:, -pred_len:, :]
+        if self.autocast_dtype is not None:
+            autocast = torch.autocast(device_type=torch.device(self.device).type, dtype=self.autocast_dtype)
+        else:
+            autocast = contextlib.nullcontext()
+        with autocast:
+            preds = auto_regressive_inference(self.tokenizer, self.model, x_tensor, x_stamp_tensor, y_stamp_tensor, self.max_context, pred_len,
+                                              self.clip, T, top_k, top_p, sample_count, verbose, self.use_kv_cache, mask_tensor,
+                                              return_samples)
+        preds = preds[..., -pred_len:, :]
         return preds
 
-    def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
+    def _summarize(self, samples, x_mean, x_std, y_timestamp, quantiles):
+        """
+        De-normalizes the samples of one series ([sample_count, pred_len, d_in]) and summarizes them.
+
+        Returns:
+            Tuple[pd.DataFrame, Dict[float, pd.DataFrame]]: mean prediction and one DataFrame per quantile.
+        """
+        columns = self.price_cols + [self.vol_col, self.amt_vol]
+        samples = samples * (x_std + 1e-5) + x_mean
+        pred_df = pd.DataFrame(samples.mean(axis=0), columns=columns, index=y_timestamp)
+        bands = np.quantile(samples, quantiles, axis=0)
+        quantile_dfs = {q: pd.DataFrame(band, columns=columns, index=y_timestamp) for q, band in zip(quantiles, bands)}
+        return pred_df, quantile_dfs
+
+    def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True, quantiles=None):
+        """
+        Predicts `pred_len` future bars of a single series.
+
+        Args:
+            quantiles (List[float], optional): Quantile levels in [0, 1]. When given, the `sample_count` samples
+                                               (drawn in one batched pass) are also summarized into quantile bands.
+
+        Returns:
+            pd.DataFrame: Mean prediction indexed by `y_timestamp`, or a tuple (mean DataFrame, {quantile: DataFrame})
+                          when `quantiles` is given.
+        """
 
         if not isinstance(df, pd.DataFrame):
             raise ValueError("Input must be a pandas DataFrame.")
@@ -514,6 +666,10 @@ class KronosPredictor:
         x_stamp = x_stamp[np.newaxis, :]
         y_stamp = y_stamp[np.newaxis, :]
 
+        if quantiles is not None:
+            samples = self.generate(x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose, return_samples=True)
+            return self._summarize(samples[0], x_mean, x_std, y_timestamp, quantiles)
+
         preds = self.generate(x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose)
 
         preds = preds.squeeze(0)
@@ -523,9 +679,10 @@ class KronosPredictor:
         return pred_df
 
 
-    def predict_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
+    def predict_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True, quantiles=None):
         """
-        Perform parallel (batch) prediction on multiple time series. All series must have the same historical length and prediction length (pred_len).
+        Perform parallel (batch) prediction on multiple time series. All series must share the same prediction length (pred_len).
+        Series with different historical lengths are left-padded to the longest one and the padded positions are masked out.
 
         Args:
             df_list (List[pd.DataFrame]): List of input DataFrames, each containing price columns and optional volume/amount columns.
@@ -537,10 +694,12 @@ class KronosPredictor:
             top_p (float): Top-p (nucleus sampling) threshold.
             sample_count (int): Number of parallel samples per series, automatically averaged internally.
             verbose (bool): Whether to display autoregressive progress.
+            quantiles (List[float], optional): Quantile levels in [0, 1] to summarize the samples of each series into.
 
         Returns:
             List[pd.DataFrame]: List of prediction results in the same order as input, each DataFrame contains
                                 `open, high, low, close, volume, amount` columns, indexed by corresponding `y_timestamp`.
+                                With `quantiles`, each element is a tuple (mean DataFrame, {quantile: DataFrame}).
         """
         # Basic validation
         if not isinstance(df_list, (list, tuple)) or not isinstance(x_timestamp_list, (list, tuple)) or not isinstance(y_timestamp_list, (list, tuple)):
@@ -603,17 +762,32 @@ class KronosPredictor:
             seq_lens.append(x_norm.shape[0])
             y_lens.append(y_stamp.shape[0])
 
-        # Require all series to have consistent historical and prediction lengths for batch processing
-        if len(set(seq_lens)) != 1:
-            raise ValueError(f"Parallel prediction requires all series to have consistent historical lengths, got: {seq_lens}")
+        # Require all series to have consistent prediction lengths for batch processing
         if len(set(y_lens)) != 1:
             raise ValueError(f"Parallel prediction requires all series to have consistent prediction lengths, got: {y_lens}")
 
+        # Left-pad shorter histories so that every series ends at the last position
+        max_len = max(seq_lens)
+        padding_mask = None
+        if len(set(seq_lens)) != 1:
+            padding_mask = np.zeros((num_series, max_len), dtype=bool)
+            for i in range(num_series):
+                pad = max_len - seq_lens[i]
+                if pad:
+                    x_list[i] = np.pad(x_list[i], ((pad, 0), (0, 0)))
+                    x_stamp_list[i] = np.pad(x_stamp_list[i], ((pad, 0), (0, 0)))
+                    padding_mask[i, :pad] = True
+
         x_batch = np.stack(x_list, axis=0).astype(np.float32)           # (B, seq_len, feat)
         x_stamp_batch = np.stack(x_stamp_list, axis=0).astype(np.float32) # (B, seq_len, time_feat)
         y_stamp_batch = np.stack(y_stamp_list, axis=0).astype(np.float32) # (B, pred_len, time_feat)
 
-        preds = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, T, top_k, top_p, sample_count, verbose)
+        if quantiles is not None:
+            samples = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, T, top_k, top_p, sample_count, verbose, padding_mask,
+                                    return_samples=True)
+            return [self._summarize(samples[i], means[i], stds[i], y_timestamp_list[i], quantiles) for i in range(num_series)]
+
+        preds = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, T, top_k, top_p, sample_count, verbose, padding_mask)
         # preds: (B, pred_len, feat)
 
         pred_dfs = []
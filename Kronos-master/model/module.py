@@ -288,7 +288,7 @@ class RotaryPositionalEmbedding(nn.Module):
         self.sin_cached = None
 
     def _update_cos_sin_cache(self, x, seq_len):
-        if seq_len != self.seq_len_cached:
+        if self.seq_len_cached is None or seq_len > self.seq_len_cached or self.cos_cached.device != x.device:
             self.seq_len_cached = seq_len
             t = torch.arange(seq_len, device=x.device).type_as(self.inv_freq)
             freqs = torch.einsum('i,j->ij', t, self.inv_freq)
@@ -297,8 +297,12 @@ class RotaryPositionalEmbedding(nn.Module):
             self.sin_cached = emb.sin()[None, None, :, :]
         return self.cos_cached, self.sin_cached
 
-    def forward(self, q, k):
-        cos, sin = self._update_cos_sin_cache(q, q.shape[-2])
+    def forward(self, q, k, offset=0):
+        """Rotate q and k. Positions start at `offset` (the number of tokens already in the KV cache)."""
+        seq_len = q.shape[-2]
+        cos, sin = self._update_cos_sin_cache(q, offset + seq_len)
+        cos = cos[:, :, offset:offset + seq_len, :]
+        sin = sin[:, :, offset:offset + seq_len, :]
         return (
             (q * cos) + (self._rotate_half(q) * sin),
             (k * cos) + (self._rotate_half(k) * sin),
@@ -336,6 +340,113 @@ def scaled_dot_product_attention(query, key, value, attn_mask=None, dropout_p=0.
     return attn_weight @ value
 
 
+class LayerKVCache:
+    """
+    Key/value cache of a single attention layer for incremental decoding.
+
+    Keys are stored already rotated, so RoPE is applied exactly once per token. When `max_len`
+    is set the cache acts as a sliding window and only the most recent `max_len` positions are kept;
+    `offset` keeps counting absolute positions, which is sufficient because RoPE attention scores
+    depend only on relative distances.
+    """
+
+    def __init__(self, max_len=None):
+        self.max_len = max_len
+        self.k = None
+        self.v = None
+        self.mask = None
+        self.offset = 0
+
+    def __len__(self):
+        return 0 if self.k is None else self.k.size(-2)
+
+    def update(self, k, v, key_padding_mask=None):
+        """
+        Append new keys/values ([batch, n_heads, new_len, head_dim]) and return the windowed cache.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]: keys, values and key padding mask
+            ([batch, cached_len], True for padded positions) covering every cached position.
+        """
+        new_len = k.size(-2)
+        if key_padding_mask is None and self.mask is not None:
+            key_padding_mask = torch.zeros(k.size(0), new_len, dtype=torch.bool, device=k.device)
+        if key_padding_mask is not None and self.mask is None and self.k is not None:
+            self.mask = torch.zeros(k.size(0), self.k.size(-2), dtype=torch.bool, device=k.device)
+
+        if self.k is None:
+            self.k, self.v = k, v
+            self.mask = key_padding_mask
+        else:
+            self.k = torch.cat([self.k, k], dim=-2)
+            self.v = torch.cat([self.v, v], dim=-2)
+            if key_padding_mask is not None:
+                self.mask = torch.cat([self.mask, key_padding_mask.bool()], dim=-1)
+
+        if self.max_len is not None and self.k.size(-2) > self.max_len:
+            self.k = self.k[:, :, -self.max_len:]
+            self.v = self.v[:, :, -self.max_len:]
+            if self.mask is not None:
+                self.mask = self.mask[:, -self.max_len:]
+
+        self.offset += new_len
+        if self.mask is not None:
+            self.mask = self.mask.bool()
+        return self.k, self.v, self.mask
+
+    def repeat_interleave(self, repeats):
+        """Repeat every cached sequence `repeats` times along the batch dimension (b -> b * repeats + r)."""
+        if self.k is not None:
+            self.k = self.k.repeat_interleave(repeats, dim=0)
+            self.v = self.v.repeat_interleave(repeats, dim=0)
+        if self.mask is not None:
+            self.mask = self.mask.repeat_interleave(repeats, dim=0)
+
+
+class KVCache:
+    """
+    KV cache for the Kronos decoder: one `LayerKVCache` per transformer block plus one for the
+    cross-attention of the dependency-aware layer (which attends over the decode_s1 context).
+    """
+
+    def __init__(self, n_layers, max_len=None):
+        self.max_len = max_len
+        self.layers = [LayerKVCache(max_len) for _ in range(n_layers)]
+        self.dep = LayerKVCache(max_len)
+
+    @property
+    def seen_tokens(self):
+        return self.layers[0].offset if self.layers else 0
+
+    def repeat_interleave(self, repeats):
+        """Broadcast a shared prefix to `repeats` samples per sequence."""
+        for layer in self.layers:
+            layer.repeat_interleave(repeats)
+        self.dep.repeat_interleave(repeats)
+
+
+def _build_attn_mask(key_padding_mask, q_len, k_len, n_heads, device):
+    """
+    Boolean attention mask (True = masked) for q_len queries that are the last q_len positions of k_len keys.
+
+    Combines the causal mask with the key padding mask. A padded query would otherwise have every key
+    masked and produce NaN (which leaks into real positions through `attn_weight @ value`), so each
+    query is always allowed to attend to its own position.
+    """
+    attn_mask = None
+    if q_len > 1:
+        # Causal within the new tokens; every earlier cached key is visible
+        causal = torch.ones(q_len, k_len, dtype=torch.bool, device=device).triu(diagonal=k_len - q_len + 1)
+        attn_mask = causal[None, None, :, :]
+    if key_padding_mask is not None:
+        pad = key_padding_mask.bool()[:, None, None, :].expand(-1, n_heads, q_len, -1)
+        self_pos = torch.zeros(q_len, k_len, dtype=torch.bool, device=device)
+        self_pos[torch.arange(q_len, device=device), torch.arange(k_len - q_len, k_len, device=device)] = True
+        pad = pad & ~self_pos[None, None, :, :]
+        attn_mask = pad if attn_mask is None else (attn_mask | pad)
+    return attn_mask
+
+
 class MultiHeadAttentionWithRoPE(nn.Module):
     def __init__(self, d_model, n_heads, attn_dropout_p=0.0, resid_dropout_p=0.0):
         super().__init__()
@@ -351,28 +462,43 @@ class MultiHeadAttentionWithRoPE(nn.Module):
         self.attn_dropout_p = attn_dropout_p
         self.resid_dropout = nn.Dropout(resid_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    def forward(self, x, key_padding_mask=None, kv_cache=None):
         batch_size, seq_len, _ = x.shape
 
         q = self.q_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
         k = self.k_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
         v = self.v_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
 
+        if kv_cache is not None:
+            # Incremental decoding: x only holds the new tokens, earlier keys/values come from the cache
+            q, k = self.rotary(q, k, offset=kv_cache.offset)
+            k, v, key_padding_mask = kv_cache.update(k, v, key_padding_mask)
+            attn_output = scaled_dot_product_attention(
+                q, k, v,
+                attn_mask=_build_attn_mask(key_padding_mask, seq_len, k.size(-2), self.n_heads, x.device),
+                dropout_p=self.attn_dropout_p,
+                training=self.training
+            )
+            attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, seq_len, self.d_model)
+            return self.resid_dropout(self.out_proj(attn_output))
+
         q, k = self.rotary(q, k)
 
         if key_padding_mask is not None:
-            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)  # [batch, 1, 1, seq_len]
-            attn_mask = attn_mask.expand(-1, self.n_heads, seq_len, -1)  # [batch, n_heads, q_len, k_len]
+            # Causal + padding mask [batch, n_heads, q_len, k_len]
+            attn_output = scaled_dot_product_attention(
+                q, k, v,
+                attn_mask=_build_attn_mask(key_padding_mask, seq_len, seq_len, self.n_heads, x.device),
+                dropout_p=self.attn_dropout_p,
+                training=self.training
+            )
         else:
-            attn_mask = None
-
-        attn_output = scaled_dot_product_attention(
-            q, k, v,
-            attn_mask=attn_mask,
-            dropout_p=self.attn_dropout_p,
-            is_causal=True,
-            training=self.training
-        )
+            attn_output = scaled_dot_product_attention(
+                q, k, v,
+                dropout_p=self.attn_dropout_p,
+                is_causal=True,
+                training=self.training
+            )
 
         attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, seq_len, self.d_model)
         return self.resid_dropout(self.out_proj(attn_output))
@@ -393,7 +519,7 @@ class MultiHeadCrossAttentionWithRoPE(nn.Module):
         self.attn_dropout_p = attn_dropout_p
         self.resid_dropout = nn.Dropout(resid_dropout)
 
-    def forward(self, query, key, value, key_padding_mask=None):
+    def forward(self, query, key, value, key_padding_mask=None, kv_cache=None):
         batch_size, q_len, _ = query.shape
         _, seq_len, _ = key.shape
 
@@ -401,6 +527,24 @@ class MultiHeadCrossAttentionWithRoPE(nn.Module):
         k = self.k_proj(key).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
         v = self.v_proj(value).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
 
+        if kv_cache is not None:
+            # Inference only: key/value hold the new context rows. The rotary table is sized by the
+            # query length, so (as in the uncached path) a single query rotates every key by position 0.
+            assert q_len == 1 and not self.training, "cached cross attention expects a single query at inference"
+            q, k = self.rotary(q, k)
+            k, v, key_padding_mask = kv_cache.update(k, v, key_padding_mask)
+            attn_mask = None
+            if key_padding_mask is not None:
+                attn_mask = key_padding_mask[:, None, None, :].expand(-1, self.n_heads, q_len, -1)
+            attn_output = scaled_dot_product_attention(
+                q, k, v,
+                attn_mask=attn_mask,
+                dropout_p=self.attn_dropout_p,
+                training=self.training
+            )
+            attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, q_len, self.d_model)
+            return self.resid_dropout(self.out_proj(attn_output))
+
         q, k = self.rotary(q, k)
 
         if key_padding_mask is not None:
@@ -460,16 +604,21 @@ class DependencyAwareLayer(nn.Module):
         self.cross_attn = MultiHeadCrossAttentionWithRoPE(d_model, n_heads, attn_dropout_p, resid_dropout)
         self.norm = RMSNorm(d_model)
 
-    def forward(self, hidden_states, sibling_embed, key_padding_mask=None):
+    def forward(self, hidden_states, sibling_embed, key_padding_mask=None, kv_cache=None):
         """hidden_states: [batch, seq_len, d_model]
         sibling_embed: Embedding from another subtoken
+        kv_cache: optional LayerKVCache; hidden_states then only holds the new context rows
+                  and only the last position is returned
         """
         attn_out = self.cross_attn(
             query=sibling_embed,
             key=hidden_states,
             value=hidden_states,
-            key_padding_mask=key_padding_mask
+            key_padding_mask=key_padding_mask,
+            kv_cache=kv_cache
         )
+        if kv_cache is not None:
+            hidden_states = hidden_states[:, -1:, :]
         return self.norm(hidden_states + attn_out)
 
 
@@ -481,10 +630,10 @@ class TransformerBlock(nn.Module):
         self.norm2 = RMSNorm(d_model)
         self.ffn = FeedForward(d_model, ff_dim, ffn_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    def forward(self, x, key_padding_mask=None, kv_cache=None):
         residual = x
         x = self.norm1(x)
-        attn_out = self.self_attn(x, key_padding_mask=key_padding_mask)
+        attn_out = self.self_attn(x, key_padding_mask=key_padding_mask, kv_cache=kv_cache)
         x = residual + attn_out
 
         residual = x
@@ -1,20 +1,21 @@
 import os
 import json
+import hashlib
+import importlib.util
 import threading
-import queue
 import logging
 import time
 import datetime as dt
 from pathlib import Path
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from pydantic import BaseModel, Field, field_validator
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import re
-import math
 from dotenv import load_dotenv
 import pandas as pd
 
@@ -23,8 +24,16 @@ load_dotenv()
 
 # 导入配置和工具模块
 from core.config import settings
+from core.cache_manager import cache_manager
+from core.cache_strategy import smart_cache
 from core.rate_limiter import get_tushare_limiter
-from core.utils import setup_logger, clean_nan_values
+from core.utils import setup_logger
+from core.serialization import FastJSONResponse, dumps as fast_dumps
+from core.price_series import PriceSeries
+from core.stream_hub import stream_hub, PipelineCancelled
+from core.pipeline_metrics import pipeline_metrics
+from core.deadline import deadline_scope
+from core.log_broadcaster import get_log_broadcaster
 
 from core.analyze_optimized import resolve_by_name
 from core.market import fetch_market_overview
@@ -33,29 +42,46 @@ from core.market_ai_analyzer import get_enhanced_market_ai_analyzer
 from core.stock_picker import get_top_picks
 from core.professional_report_generator_v2 import ProfessionalReportGeneratorV2
 from core.advanced_data_client import advanced_client
-from core.kronos_predictor import get_kronos_service
+from core.kronos_predictor import get_kronos_service, is_kronos_available, resolve_device
 from nlp.ollama_client import OLLAMA_URL, OLLAMA_MODEL, OLLAMA_NUM_PREDICT, OLLAMA_TIMEOUT
 import requests
 
 
-# 简单的内存缓存
+# 简单的内存缓存（访问频率由智能缓存跟踪，冷键降级到磁盘）
 _api_cache = {}
 _cache_lock = threading.Lock()
+_RESPONSE_NAMESPACE = 'api_response'
 
 def get_cached_response(key: str, ttl_seconds: int = 60):
     """获取缓存的响应"""
     with _cache_lock:
-        if key in _api_cache:
-            data, timestamp = _api_cache[key]
-            if time.time() - timestamp < ttl_seconds:
-                return data
-    return None
+        entry = _api_cache.get(key)
+    if entry is None:
+        # 已降级的响应从磁盘取回
+        entry = cache_manager.get(key, namespace=_RESPONSE_NAMESPACE, max_age=ttl_seconds)
+    data = None
+    if entry is not None and time.time() - entry[1] < ttl_seconds:
+        data = entry[0]
+    smart_cache.record_access('response', key, data is not None, ttl_seconds,
+                              stored_at=lambda: entry[1])
+    return data
 
 def set_cached_response(key: str, data: Any):
     """设置缓存的响应"""
     with _cache_lock:
         _api_cache[key] = (data, time.time())
 
+def _demote_cached_response(key: str):
+    """冷响应移出内存，保留磁盘副本（含原始时间戳）"""
+    with _cache_lock:
+        entry = _api_cache.pop(key, None)
+    if entry is not None:
+        cache_manager.set(key, entry, namespace=_RESPONSE_NAMESPACE)
+
+smart_cache.register_source('response', demote=_demote_cached_response)
+smart_cache.register_loader('response', 'market_overview',
+                            lambda: set_cached_response('market_overview', fetch_market_overview()))
+
 
 # 业务异常类
 class BusinessException(Exception):
@@ -93,9 +119,21 @@ app = FastAPI(
     description="基于TuShare数据和Ollama AI的A股智能分析平台，提供个股分析、热点概念追踪、专业报告生成等功能",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
+@app.on_event("startup")
+def preload_kronos():
+    """启动时在后台线程加载并预热Kronos模型，就绪状态见 /health/detailed"""
+    if not settings.KRONOS_PRELOAD or not is_kronos_available():
+        return
+    try:
+        get_kronos_service(device=resolve_device()).start_background_load()
+    except Exception as e:
+        logger.warning(f"Kronos预加载启动失败: {e}")
+
+
 # 全局异常处理器
 @app.exception_handler(BusinessException)
 async def business_exception_handler(request, exc: BusinessException):
@@ -142,9 +180,10 @@ app.add_middleware(
 )
 
 # 配置日志系统（使用工具模块）
+_LOG_PATH = settings.BASE_DIR / settings.LOG_FILE
 logger = setup_logger(
     name="qsl",
-    log_file=str(settings.BASE_DIR / settings.LOG_FILE),
+    log_file=str(_LOG_PATH),
     level=settings.LOG_LEVEL,
     max_bytes=settings.LOG_MAX_BYTES,
     backup_count=settings.LOG_BACKUP_COUNT
@@ -180,6 +219,21 @@ class AnalyzeRequest(BaseModel):
         return v
 
 
+class BatchAnalyzeRequest(BaseModel):
+    names: List[str] = Field(..., min_length=1, max_length=settings.BATCH_ANALYSIS_MAX_STOCKS, description="自选股名称或代码列表")
+    force: bool = Field(False, description="是否忽略当日分析缓存")
+
+    @field_validator('names')
+    @classmethod
+    def validate_names(cls, v):
+        names = list(dict.fromkeys(n.strip() for n in v if n and n.strip()))
+        if not names:
+            raise ValueError('股票列表不能为空')
+        if any(len(n) > 20 for n in names):
+            raise ValueError('股票名称格式不正确')
+        return names
+
+
 class HotspotRequest(BaseModel):
     keyword: str = Field(..., min_length=1, max_length=10, description="概念关键词")
     force: bool = Field(False, description="是否强制刷新数据")
@@ -210,6 +264,7 @@ class KLineRequest(BaseModel):
     temperature: float = Field(default=1.0, ge=0.1, le=2.0, description="温度参数(0.1-2.0)")
     top_p: float = Field(default=0.9, ge=0.1, le=1.0, description="Nucleus采样概率(0.1-1.0)")
     sample_count: int = Field(default=3, ge=1, le=5, description="样本数量(1-5)")
+    quantiles: Optional[List[float]] = Field(default=None, max_length=9, description="预测区间分位数(如[0.1, 0.9])，默认取配置")
 
     @field_validator('name')
     @classmethod
@@ -219,17 +274,22 @@ class KLineRequest(BaseModel):
             raise ValueError('股票名称不能为空')
         return v
 
+    @field_validator('quantiles')
+    @classmethod
+    def validate_quantiles(cls, v):
+        if v is not None and any(not 0 < q < 1 for q in v):
+            raise ValueError('分位数必须在(0, 1)之间')
+        return v
+
 
 # SSE辅助函数
 def _sse_event(event: str, data: Any) -> str:
-    """生成SSE事件格式字符串"""
-    import json
-    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    """生成SSE事件格式字符串（编码时将NaN/Inf转为null）"""
+    return f"event: {event}\ndata: {fast_dumps(data)}\n\n"
 
 def _sse_log(event: str, data: str) -> str:
     """生成SSE日志格式字符串"""
-    import json
-    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\ndata: {fast_dumps(data)}\n\n"
 
 
 @app.get("/health",
@@ -264,6 +324,25 @@ def health_detailed():
         }
 
 
+@app.get("/metrics/pipeline",
+    summary="分析流程阶段指标",
+    description="各阶段（technical/news/professional_data/score/summary等）的耗时直方图、Tushare调用次数、缓存命中与状态统计",
+    tags=["系统监控"])
+def metrics_pipeline(reset: bool = False):
+    snapshot = pipeline_metrics.snapshot()
+    if reset:
+        pipeline_metrics.reset()
+    return FastJSONResponse(snapshot)
+
+
+@app.get("/metrics",
+    summary="Prometheus指标",
+    description="分析流程阶段指标的Prometheus文本格式导出",
+    tags=["系统监控"])
+def metrics_prometheus():
+    return Response(pipeline_metrics.to_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/resolve",
     summary="股票名称解析",
     description="根据股票名称或代码解析出完整的股票信息",
@@ -300,11 +379,10 @@ def market():
             return cached
 
         result = fetch_market_overview()
-        result = clean_nan_values(result)
 
         # 缓存结果
         set_cached_response(cache_key, result)
-        return result
+        return FastJSONResponse(result)
     except Exception as e:
         logger.exception("获取市场数据失败: %s", e)
         raise DataSourceException("市场数据获取失败，请稍后重试")
@@ -398,11 +476,10 @@ def market_enhanced_analysis():
             "market_data": market_data,
             "insight_report": insight_report
         }
-        result = clean_nan_values(result)
 
         # 缓存结果
         set_cached_response(cache_key, result)
-        return result
+        return FastJSONResponse(result)
     except Exception as e:
         logger.error(f"增强版市场分析失败: {e}")
         raise HTTPException(500, detail=f"增强版分析失败: {str(e)}")
@@ -430,11 +507,10 @@ def get_fear_greed_index():
             "timestamp": time.time(),
             "fear_greed_index": fear_greed_data
         }
-        result = clean_nan_values(result)
 
         # 缓存结果
         set_cached_response(cache_key, result)
-        return result
+        return FastJSONResponse(result)
     except Exception as e:
         logger.error(f"恐慌贪婪指数获取失败: {e}")
         raise HTTPException(500, detail=f"恐慌贪婪指数获取失败: {str(e)}")
@@ -458,13 +534,28 @@ def get_market_alerts():
             "alert_count": len(alerts),
             "high_priority_count": len([a for a in alerts if a.get("level") == "high"])
         }
-        return clean_nan_values(result)
+        return FastJSONResponse(result)
     except Exception as e:
         logger.error(f"市场预警获取失败: {e}")
         raise HTTPException(500, detail=f"市场预警获取失败: {str(e)}")
 
 
 
+@app.get("/market/heat")
+def get_market_heat(ts_code: Optional[str] = None, top: int = Query(50, ge=1, le=500)):
+    """检视全市场热度/事件表（动态缓存TTL的决策依据）"""
+    from core.market_heat import market_heat
+    market_heat.ensure_fresh()
+    if ts_code:
+        return FastJSONResponse({
+            "success": True,
+            "ts_code": ts_code,
+            "entry": market_heat.lookup(ts_code),
+            "volatility": market_heat.volatility(),
+        })
+    return FastJSONResponse({"success": True, **market_heat.snapshot(top=top)})
+
+
 @app.post("/analyze")
 def analyze(req: AnalyzeRequest):
     """股票分析 - 直接返回专业分析报告（默认使用实时数据）"""
@@ -486,34 +577,38 @@ def analyze(req: AnalyzeRequest):
 
 
 @app.get("/analyze/stream")
-def analyze_stream(name: str, force: bool = False):
-    """股票分析流式接口 - 实时返回进度和结果"""
+async def analyze_stream(request: Request, name: str, force: bool = False):
+    """股票分析流式接口 - 实时返回进度和结果（同一股票的并发请求共享一次分析）"""
     if not name:
         raise HTTPException(400, detail="name 不能为空")
-    
-    q: "queue.Queue[tuple[str, dict]]" = queue.Queue()
-    done = {"v": False}
-    result_box: dict = {"result": None}
-    
-    def _progress(step: str, payload):
-        try:
-            q.put(("progress", {"step": step, "payload": payload or {}}))
-        except Exception:
-            pass
-    
-    def _worker():
+
+    # 以ts_code去重，"600000"与"浦发银行"共享同一次分析
+    stock_info = await run_in_threadpool(resolve_by_name, name)
+    stream_key = f"analyze:{stock_info['ts_code'] if stock_info else name.strip()}:{int(force)}"
+
+    def _worker(emit, cancel_event: threading.Event):
+        result_box: dict = {"result": None}
+
+        def _progress(step: str, payload):
+            try:
+                emit("progress", {"step": step, "payload": payload or {}})
+            except Exception:
+                pass
+
         try:
             # 执行分析流程 - 使用优化版分析模块，包含RGTI深度分析
             print(f"[WORKER] 开始导入分析模块", flush=True)
             from core.analyze_optimized import run_pipeline_optimized as run_pipeline
             print(f"[WORKER] 开始执行分析: {name}, force={force}", flush=True)
-            result = run_pipeline(name, force=force, progress=_progress)
-            print(f"[WORKER] 分析完成，结果类型: {type(result)}", flush=True)
+            # 整个请求共享一个截止时间（含旧缓存重新分析），客户端全部断开即视为到期
+            with deadline_scope(settings.REQUEST_TIMEOUT, cancel_event, label=name):
+                result = run_pipeline(name, force=force, progress=_progress, cancel_event=cancel_event)
+                print(f"[WORKER] 分析完成，结果类型: {type(result)}", flush=True)
 
-            # 检测旧版缓存（没有score或summary字段），强制重新分析
-            if isinstance(result, dict) and (not result.get('score') or not result.get('summary')) and not force:
-                print(f"[WARNING] 检测到旧版缓存数据（缺少score或summary），强制重新分析")
-                result = run_pipeline(name, force=True, progress=_progress)
+                # 检测旧版缓存（没有score或summary字段），强制重新分析
+                if isinstance(result, dict) and (not result.get('score') or not result.get('summary')) and not force:
+                    print(f"[WARNING] 检测到旧版缓存数据（缺少score或summary），强制重新分析")
+                    result = run_pipeline(name, force=True, progress=_progress, cancel_event=cancel_event)
 
             # 辅助函数：安全获取嵌套字典值
             def safe_get(data, *keys, default=None):
@@ -529,23 +624,6 @@ def analyze_stream(name: str, force: bool = False):
                         return default
                 return data if data is not None else default
 
-            # 清理NaN值的函数
-            def clean_nan_values(obj):
-                """递归清理NaN值，保持None不变"""
-                import math
-                if isinstance(obj, dict):
-                    return {k: clean_nan_values(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [clean_nan_values(item) for item in obj]
-                elif isinstance(obj, float):
-                    if math.isnan(obj) or math.isinf(obj):
-                        return None
-                    return obj
-                return obj
-
-            # 清理结果中的NaN值
-            result = clean_nan_values(result)
-
             # 提取prices数据到顶层（从technical中提取）
             if isinstance(result, dict) and 'technical' in result and isinstance(result['technical'], dict):
                 tech_data = result['technical']
@@ -671,30 +749,54 @@ def analyze_stream(name: str, force: bool = False):
             if isinstance(result, dict) and "predictions" in result:
                 enhanced_result["predictions"] = result["predictions"]  # type: ignore
 
-            # 再次清理整个结果
-            enhanced_result = clean_nan_values(enhanced_result)  # type: ignore
-
+            # NaN/Inf 在 _sse_event 编码时统一转为null
             result_box["result"] = enhanced_result
-            
+
+        except PipelineCancelled:
+            raise
         except Exception as e:
-            q.put(("error", {"message": str(e)}))
-        finally:
-            q.put(("result", result_box.get("result", {})))
-            q.put(("done", {}))
-            done["v"] = True
-    
-    threading.Thread(target=_worker, daemon=True).start()
-    
-    def _gen():
+            emit("error", {"message": str(e)})
+        emit("result", result_box.get("result") or {})
+        emit("done", {})
+
+    async def _gen():
         yield _sse_event("start", {"name": name, "force": force})
-        while not done["v"] or not q.empty():
+        async for ev, data in stream_hub.stream(stream_key, _worker, request.is_disconnected):
+            yield _sse_event(ev, data)
+        yield _sse_event("end", {})
+
+    return StreamingResponse(_gen(), media_type="text/event-stream")
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request, req: BatchAnalyzeRequest):
+    """批量股票分析流式接口 - 共享市场与截面数据，每完成一只推送一只（相同列表的并发请求共享一次分析）"""
+    digest = hashlib.md5(",".join(sorted(req.names)).encode()).hexdigest()[:16]
+    stream_key = f"analyze_batch:{digest}:{int(req.force)}"
+
+    def _worker(emit, cancel_event: threading.Event):
+        from core.batch_analysis import run_batch_analysis
+
+        def _on_result(name: str, result: dict):
+            emit("item", {"name": name, "result": result})
+
+        def _progress(step: str, payload):
             try:
-                ev, data = q.get(timeout=0.5)
-                yield _sse_event(ev, data)
-            except queue.Empty:
-                yield _sse_event("ping", {})
+                emit("progress", {"step": step, "payload": payload or {}})
+            except Exception:
+                pass
+
+        summary = run_batch_analysis(req.names, force=req.force, on_result=_on_result,
+                                     progress=_progress, cancel_event=cancel_event)
+        emit("summary", summary)
+        emit("done", {})
+
+    async def _gen():
+        yield _sse_event("start", {"names": req.names, "force": req.force})
+        async for ev, data in stream_hub.stream(stream_key, _worker, request.is_disconnected):
+            yield _sse_event(ev, data)
         yield _sse_event("end", {})
-    
+
     return StreamingResponse(_gen(), media_type="text/event-stream")
 
 
@@ -709,7 +811,7 @@ def analyze_professional(name: str, force: bool = True):
         from core.analyze_optimized import run_pipeline_optimized as run_pipeline
 
         # 获取完整分析数据（使用优化版本，自动包含深度分析）
-        result = run_pipeline(name, force=force)
+        result = run_pipeline(name, force=force, timeout_seconds=settings.REQUEST_TIMEOUT)
 
         # 辅助函数：安全获取嵌套字典值
         def safe_get(data, *keys, default=None):
@@ -725,23 +827,6 @@ def analyze_professional(name: str, force: bool = True):
                     return default
             return data if data is not None else default
 
-        # 清理NaN值的函数
-        def clean_nan_values(obj):
-            """递归清理NaN值，保持None不变"""
-            import math
-            if isinstance(obj, dict):
-                return {k: clean_nan_values(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_nan_values(item) for item in obj]
-            elif isinstance(obj, float):
-                if math.isnan(obj) or math.isinf(obj):
-                    return None
-                return obj
-            return obj
-
-        # 清理结果中的NaN值
-        result = clean_nan_values(result)
-
         # 提取prices数据到顶层（从technical中提取）
         if isinstance(result, dict) and 'technical' in result and isinstance(result['technical'], dict):
             tech_data = result['technical']
@@ -878,10 +963,8 @@ def analyze_professional(name: str, force: bool = True):
         if isinstance(result, dict) and "predictions" in result:
             enhanced_result["predictions"] = result["predictions"]  # type: ignore
 
-        # 再次清理整个结果
-        enhanced_result = clean_nan_values(enhanced_result)
-
-        return enhanced_result
+        # 直接返回响应对象，编码时一次性将NaN/Inf转为null
+        return FastJSONResponse(enhanced_result)
         
     except Exception as e:
         logger.error(f"专业版分析失败: {e}")
@@ -920,21 +1003,7 @@ def _generate_report_task(task_id: str, report_type: str):
 
         report_tasks[task_id]['progress'] = 90
 
-        # 清理NaN值
-        import math
-        def clean_nan_values(obj):
-            if isinstance(obj, dict):
-                return {k: clean_nan_values(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_nan_values(item) for item in obj]
-            elif isinstance(obj, float):
-                if math.isnan(obj) or math.isinf(obj):
-                    return None
-                return obj
-            return obj
-
-        report = clean_nan_values(report)
-
+        # NaN/Inf 在 get_report_task_status 响应编码时统一转为null
         report_tasks[task_id]['status'] = 'completed'
         report_tasks[task_id]['progress'] = 100
         report_tasks[task_id]['result'] = report
@@ -1000,7 +1069,7 @@ def get_report_task_status(task_id: str):
     elif task['status'] == 'failed':
         response['error'] = task.get('error', 'Unknown error')
 
-    return response
+    return FastJSONResponse(response)
 
 
 @app.get("/reports/history")
@@ -1175,11 +1244,11 @@ def get_report(report_type: str, date: str | None = None):
         if not report:
             raise HTTPException(404, detail=f"未找到{date or '最新'}的{report_type}报告")
 
-        return {
+        return FastJSONResponse({
             "success": True,
             "report": report,
             "type": report_type
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -1284,7 +1353,7 @@ def hotspot(req: HotspotRequest):
         # 生成简单摘要
         result["llm_summary"] = f"概念「{req.keyword}」综合评分 {result.get('comprehensive_score', 0)}/100，共发现{len(result.get('related_stocks', []))}只相关股票。"
 
-        return clean_nan_values(result)
+        return FastJSONResponse(result)
     except ValidationException:
         raise
     except Exception as e:
@@ -1343,27 +1412,27 @@ def chat(req: ChatRequest):
 
 
 @app.get("/hotspot/stream")
-def hotspot_stream(keyword: str, force: bool = False):
-    """热点概念分析流式接口 - 实时返回进度"""
+async def hotspot_stream(request: Request, keyword: str, force: bool = False):
+    """热点概念分析流式接口 - 实时返回进度（同一关键词的并发请求共享一次分析）"""
     if not keyword:
         raise ValidationException("关键词不能为空")
 
-    q: "queue.Queue[tuple[str, dict]]" = queue.Queue()
-    done = {"v": False}
-    result_box: dict = {"result": None}
+    stream_key = f"hotspot:{keyword.strip()}:{int(force)}"
+
+    def _worker(emit, cancel_event: threading.Event):
+        result_box: dict = {"result": None}
+
+        def _progress_callback(progress: int, message: str, payload: Optional[Dict[str, Any]] = None):
+            """进度回调函数"""
+            try:
+                emit("progress", {
+                    "progress": progress,
+                    "message": message,
+                    "payload": payload or {}
+                })
+            except Exception:
+                pass
 
-    def _progress_callback(progress: int, message: str, payload: Optional[Dict[str, Any]] = None):
-        """进度回调函数"""
-        try:
-            q.put(("progress", {
-                "progress": progress,
-                "message": message,
-                "payload": payload or {}
-            }))
-        except Exception:
-            pass
-
-    def _worker():
         try:
             # 使用增强版热点分析器
             from core.enhanced_hotspot_analyzer import enhanced_hotspot_analyzer
@@ -1374,7 +1443,8 @@ def hotspot_stream(keyword: str, force: bool = False):
                 keyword,
                 days=5,
                 progress_callback=_progress_callback,
-                force=force
+                force=force,
+                cancel_event=cancel_event
             )
 
             # 跳过基础分析和LLM总结以提高速度（前端直接使用增强分析结果）
@@ -1390,38 +1460,29 @@ def hotspot_stream(keyword: str, force: bool = False):
                 result["llm_summary"] = f"概念「{keyword}」综合评分 {result.get('comprehensive_score', 0)}/100，共发现{len(result.get('related_stocks', []))}只相关股票。"
                 logger.warning("使用简单摘要（LLM报告未生成）")
 
-            q.put(("progress", {
+            emit("progress", {
                 "progress": 100,
                 "message": "分析完成",
                 "payload": {"score": result.get('comprehensive_score', 0)}
-            }))
+            })
 
             result_box["result"] = result
             logger.info(f"热点分析完成，综合评分: {result.get('comprehensive_score', 0)}")
+        except PipelineCancelled:
+            raise
         except Exception as e:
             logger.error(f"热点分析失败: {e}", exc_info=True)
-            q.put(("error", {"message": str(e)}))
-        finally:
-            final_result = result_box.get("result")
-            # 清理NaN值避免JSON序列化错误
-            cleaned_result: Dict[str, Any] = {}
-            if final_result:
-                final_result = clean_nan_values(final_result)
-                cleaned_result = final_result if isinstance(final_result, dict) else {}
-            q.put(("result", cleaned_result))
-            q.put(("done", {}))
-            done["v"] = True
-
-    threading.Thread(target=_worker, daemon=True).start()
-
-    def _gen():
+            emit("error", {"message": str(e)})
+
+        final_result = result_box.get("result")
+        # NaN/Inf 在 _sse_event 编码时统一转为null
+        emit("result", final_result if isinstance(final_result, dict) else {})
+        emit("done", {})
+
+    async def _gen():
         yield _sse_event("start", {"keyword": keyword, "force": force})
-        while not done["v"] or not q.empty():
-            try:
-                ev, data = q.get(timeout=0.5)
-                yield _sse_event(ev, data)
-            except queue.Empty:
-                yield _sse_event("ping", {})
+        async for ev, data in stream_hub.stream(stream_key, _worker, request.is_disconnected):
+            yield _sse_event(ev, data)
         yield _sse_event("end", {})
 
     return StreamingResponse(_gen(), media_type="text/event-stream")
@@ -1554,33 +1615,15 @@ def hotspot_history(keyword: str, days: int = 30):
 
 
 @app.get("/logs/stream")
-def logs_stream():
-    """SSE 持续输出 server.log 的追加内容，同时先回放末尾若干行。"""
-    log_path = _LOG_PATH
-    tail_lines = 200
+async def logs_stream(request: Request, tail: int = 200):
+    """SSE 持续输出 server.log 的追加内容，同时先回放末尾若干行（所有订阅者共享一个跟随线程）。"""
+    broadcaster = get_log_broadcaster(_LOG_PATH)
 
-    def _gen():
+    async def _gen():
         try:
-            # 先输出最后 N 行作为上下文
-            if log_path.exists():
-                with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-                    lines = f.readlines()[-tail_lines:]
-                for ln in lines:
-                    yield _sse_log("log", ln.rstrip("\n"))
-
-            # 跟随新增
-            with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-                f.seek(0, os.SEEK_END)
-                while True:
-                    where = f.tell()
-                    line = f.readline()
-                    if not line:
-                        time.sleep(0.5)
-                        f.seek(where)
-                    else:
-                        yield _sse_log("log", line.rstrip("\n"))
-        except GeneratorExit:
-            return
+            async for line in broadcaster.subscribe(tail=min(max(tail, 0), 2000),
+                                                    is_disconnected=request.is_disconnected):
+                yield _sse_log("log", line)
         except Exception as e:
             yield _sse_log("error", str(e))
 
@@ -1619,15 +1662,26 @@ def get_realtime_indicators(ts_code: str):
 
 @app.get("/realtime/kline/{ts_code}",
     summary="获取实时K线数据",
-    description="获取单只股票的实时分钟K线数据",
+    description="获取单只股票的实时分钟K线数据。默认format=records返回逐根K线列表；"
+                "可选columns返回列式JSON，arrow返回Arrow IPC二进制流（需安装pyarrow）",
     tags=["实时数据"])
-def get_realtime_kline(ts_code: str, freq: str = "1min", count: int = 60):
+def get_realtime_kline(ts_code: str, freq: str = "1min", count: int = 60, format: str = "records"):
     """获取实时K线数据"""
+    if format not in ("columns", "records", "arrow"):
+        raise ValidationException(f"不支持的格式: {format}")
+    if format == "arrow" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(501, detail="format=arrow 需要服务端安装 pyarrow，请改用 records 或 columns")
     try:
         df = advanced_client.get_realtime_kline(ts_code, freq, count)
         if df.empty:
             return {"error": "无法获取K线数据"}
-        return df.to_dict('records')
+        if format == "records":
+            return FastJSONResponse(df.to_dict('records'))
+
+        series = PriceSeries.from_frame(df)
+        if format == "arrow":
+            return Response(content=series.to_arrow_ipc(), media_type="application/vnd.apache.arrow.stream")
+        return FastJSONResponse(series.to_columns())
     except Exception as e:
         logger.error(f"获取实时K线失败: {e}")
         raise HTTPException(500, detail="实时K线获取失败")
@@ -1658,17 +1712,8 @@ def predict_kline(req: KLineRequest):
 
         logger.info(f"开始K线预测: {stock_name} ({ts_code}), 预测{req.pred_len}天")
 
-        # 2. 获取Kronos服务
-        # 检测是否有GPU可用
-        import torch
-        if torch.cuda.is_available():
-            device = "cuda:0"
-        elif torch.backends.mps.is_available():
-            device = "mps"
-        else:
-            device = "cpu"
-
-        kronos = get_kronos_service(device=device)
+        # 2. 获取Kronos服务（自动检测GPU）
+        kronos = get_kronos_service(device=resolve_device())
 
         # 3. 执行预测
         result = kronos.predict_kline(
@@ -1677,7 +1722,8 @@ def predict_kline(req: KLineRequest):
             lookback=req.lookback,
             T=req.temperature,
             top_p=req.top_p,
-            sample_count=req.sample_count
+            sample_count=req.sample_count,
+            quantiles=req.quantiles
         )
 
         if result is None:
@@ -1692,7 +1738,7 @@ def predict_kline(req: KLineRequest):
         }
 
         logger.info(f"K线预测完成: {stock_name} ({ts_code})")
-        return result
+        return FastJSONResponse(result)
 
     except HTTPException:
         raise
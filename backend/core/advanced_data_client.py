@@ -874,13 +874,14 @@ class AdvancedDataClient:
             print(f"新闻分析数据获取失败: {e}")
             return {'has_data': False}
 
-    def get_full_professional_data(self, ts_code: str) -> Dict[str, Any]:
+    def get_full_professional_data(self, ts_code: str, moneyflow: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         获取股票的全部专业数据（5000积分接口）
         包含：筹码分析、机构数据、股东分析、基金持仓、融资融券、大宗交易等
 
         Args:
             ts_code: 股票代码
+            moneyflow: 已从全市场截面预取的资金流向结果（批量分析使用），None时按股票查询
 
         Returns:
             包含所有专业数据的字典
@@ -910,23 +911,26 @@ class AdvancedDataClient:
                 result['holders_analysis'] = {'has_data': False}
 
             # 2. 获取资金流向数据
-            try:
-                moneyflow = self.pro.moneyflow(ts_code=ts_code, start_date=start_date, end_date=end_date)
-                if moneyflow is not None and not moneyflow.empty:
-                    latest = moneyflow.iloc[0]
-                    result['moneyflow'] = {
-                        'net_amount': float(latest.get('net_amount', 0)),
-                        'net_amount_xl': float(latest.get('net_amount_xl', 0)),
-                        'net_amount_l': float(latest.get('net_amount_l', 0)),
-                        'net_amount_m': float(latest.get('net_amount_m', 0)),
-                        'net_amount_s': float(latest.get('net_amount_s', 0)),
-                        'has_data': True
-                    }
-                else:
+            if moneyflow is not None:
+                result['moneyflow'] = moneyflow
+            else:
+                try:
+                    moneyflow = self.pro.moneyflow(ts_code=ts_code, start_date=start_date, end_date=end_date)
+                    if moneyflow is not None and not moneyflow.empty:
+                        latest = moneyflow.iloc[0]
+                        result['moneyflow'] = {
+                            'net_amount': float(latest.get('net_amount', 0)),
+                            'net_amount_xl': float(latest.get('net_amount_xl', 0)),
+                            'net_amount_l': float(latest.get('net_amount_l', 0)),
+                            'net_amount_m': float(latest.get('net_amount_m', 0)),
+                            'net_amount_s': float(latest.get('net_amount_s', 0)),
+                            'has_data': True
+                        }
+                    else:
+                        result['moneyflow'] = {'has_data': False}
+                except Exception as e:
+                    print(f"获取资金流向失败: {e}")
                     result['moneyflow'] = {'has_data': False}
-            except Exception as e:
-                print(f"获取资金流向失败: {e}")
-                result['moneyflow'] = {'has_data': False}
 
             # 3. 获取融资融券数据
             try:
@@ -2,13 +2,19 @@
 优化版分析模块 - 解决超时问题
 """
 from typing import Dict, Any, Optional, Callable, Tuple, List
-from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
+import threading
 import time
 from datetime import datetime
 import json
 import os
 
 from .cache_manager import cache_manager, cache_stock_data
+from .price_series import PriceSeries
+from .stream_hub import PipelineCancelled
+from .pipeline_metrics import PipelineTrace, STATUS_CANCELLED, STATUS_ERROR, STATUS_TIMEOUT, pipeline_metrics
+from .deadline import DeadlineExceeded, current_deadline, deadline_scope
 from .chart_generator import (
     generate_kline_svg,
     generate_price_predictions,
@@ -17,6 +23,25 @@ from .chart_generator import (
     embed_chart_in_markdown
 )
 
+# 单股分析结果缓存时间（秒）
+ANALYSIS_CACHE_TTL = 1800
+
+# 各数据阶段的预算（秒），从阶段开始执行时计算，同时受整体截止时间约束；新闻匹配需要更长时间
+STAGE_BUDGETS = {'news': 30}
+DEFAULT_STAGE_BUDGET = 10
+# 等待数据阶段时检查超时与取消的间隔（秒）
+STAGE_POLL_SECONDS = 0.5
+
+
+def stage_budget(stage: str) -> float:
+    """数据阶段的预算（秒）"""
+    return STAGE_BUDGETS.get(stage, DEFAULT_STAGE_BUDGET)
+
+
+def _analysis_cache_key(ts_code: str) -> str:
+    """单股分析结果的当日缓存键"""
+    return f"analysis_{ts_code}_{datetime.now().strftime('%Y%m%d')}"
+
 
 def resolve_by_name(name_keyword: str, force: bool = False) -> Optional[dict]:
     """通过股票名称解析股票信息（优先使用本地完整映射）"""
@@ -80,27 +105,57 @@ def run_pipeline_optimized(
     name_keyword: str,
     force: bool = False,
     progress: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None,
-    timeout_seconds: int = 180
+    timeout_seconds: int = 180,
+    cancel_event: Optional[threading.Event] = None
 ) -> Dict[str, Any]:
     """
     优化版分析流程 - 带超时保护和并发执行
 
+    总预算作为截止时间向下传递：各数据阶段、_call_api 与 LLM 调用的超时不超过剩余预算，
+    到期后未开始的阶段取消、进行中的阶段在下一次API调用时跳过，流程不再等待其结束
+
     Args:
         name_keyword: 股票名称或代码
         force: 是否强制刷新
         progress: 进度回调函数
-        timeout_seconds: 总超时时间（秒）
+        timeout_seconds: 总超时时间（秒），外层已有更早的截止时间（如HTTP请求）时以外层为准
+        cancel_event: 取消信号，置位后在下一个检查点中止流程
 
     Returns:
-        分析结果字典
+        分析结果字典（timings 字段为各阶段耗时、API调用与缓存命中统计）
+
+    Raises:
+        PipelineCancelled: cancel_event 被置位
     """
-    start_time = time.time()
+    with deadline_scope(timeout_seconds, cancel_event, label=name_keyword):
+        return _run_pipeline(name_keyword, force, progress, cancel_event)
+
+
+def _run_pipeline(
+    name_keyword: str,
+    force: bool,
+    progress: Optional[Callable[[str, Optional[Dict[str, Any]]], None]],
+    cancel_event: Optional[threading.Event]
+) -> Dict[str, Any]:
+    """run_pipeline_optimized 的实现（在截止时间作用域内执行）"""
+    deadline = current_deadline()
+    trace = PipelineTrace(name_keyword)
 
     def _progress(step: str, data: Any = None):
         if progress:
             progress(step, data)
         print(f"[分析] {step}")
 
+    def _check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"[分析] 已取消: {name_keyword}")
+            if trace.spans:
+                for name, span in trace.spans.items():
+                    if span.elapsed is None:
+                        trace.mark(name, STATUS_CANCELLED)
+                pipeline_metrics.observe(trace)
+            raise PipelineCancelled(name_keyword)
+
     _progress("开始分析")
 
     # 1. 解析股票代码（快速）
@@ -114,12 +169,13 @@ def run_pipeline_optimized(
 
     # 检查缓存
     if not force:
-        cache_key = f"analysis_{ts_code}_{datetime.now().strftime('%Y%m%d')}"
-        cached_result = cache_manager.get(cache_key, namespace='analysis', max_age=1800)
+        cached_result = cache_manager.get(_analysis_cache_key(ts_code), namespace='analysis', max_age=ANALYSIS_CACHE_TTL)
         if cached_result:
             _progress("使用缓存数据")
             return cached_result
 
+    _check_cancelled()
+
     # 2. 并发获取数据
     result = {
         "basic": stock_info,
@@ -139,36 +195,87 @@ def run_pipeline_optimized(
         'professional_data': _fetch_professional_data  # 新增5000积分数据获取
     }
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = {}
-
-        # 提交所有任务
-        for task_name, task_func in tasks.items():
-            future = executor.submit(task_func, ts_code, stock_name)
-            futures[future] = task_name
-
-        # 等待完成（带超时）
-        remaining_time = timeout_seconds
-        for future in as_completed(futures, timeout=remaining_time):
-            task_name = futures[future]
-            try:
-                # 新闻匹配需要更长时间，给予30秒超时，其他任务10秒
-                task_timeout = 30 if task_name == 'news' else 10
-                task_result = future.result(timeout=task_timeout)
-                result[task_name] = task_result or {}
-                _progress(f"完成: {task_name}")
-            except TimeoutError:
-                print(f"[警告] {task_name} 超时")
-                result[task_name] = {"error": "timeout"}
-            except Exception as e:
-                print(f"[错误] {task_name}: {e}")
-                result[task_name] = {"error": str(e)}
-
-            # 更新剩余时间
-            elapsed = time.time() - start_time
-            remaining_time = max(1, timeout_seconds - elapsed)
-
-    # 3. 提取prices数据到顶层（兼容前端）
+    def _run_stage(task_name: str, task_func: Callable) -> Dict[str, Any]:
+        # 阶段预算从开始执行时计算，阶段内的API调用继承该截止时间
+        with deadline_scope(stage_budget(task_name)):
+            return trace.run(task_name, task_func, ts_code, stock_name)
+
+    def _timed_out(task_name: str):
+        print(f"[警告] {task_name} 超时")
+        trace.mark(task_name, STATUS_TIMEOUT)
+        result[task_name] = {"error": "timeout"}
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        # 提交所有任务（复制上下文以传递截止时间）
+        futures = {
+            executor.submit(contextvars.copy_context().run, _run_stage, task_name, task_func): task_name
+            for task_name, task_func in tasks.items()
+        }
+        pending = set(futures)
+
+        while pending:
+            done, _ = wait(pending, timeout=min(STAGE_POLL_SECONDS, max(deadline.remaining(), 0.05)),
+                           return_when=FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                # 未开始的任务直接取消，不再消耗API配额
+                for future in pending:
+                    future.cancel()
+                _check_cancelled()
+
+            for future in done:
+                pending.discard(future)
+                task_name = futures[future]
+                try:
+                    task_result = future.result()
+                    result[task_name] = task_result or {}
+                    # 数据函数内部捕获异常后返回 {'error': ...}
+                    if isinstance(task_result, dict) and task_result.get('error'):
+                        trace.mark(task_name, STATUS_ERROR, str(task_result['error']))
+                    _progress(f"完成: {task_name}")
+                except DeadlineExceeded:
+                    _timed_out(task_name)
+                except Exception as e:
+                    print(f"[错误] {task_name}: {e}")
+                    result[task_name] = {"error": str(e)}
+
+            # 超出阶段预算或整体截止时间的任务不再等待：未开始的取消，进行中的在下一次API调用时跳过
+            now = time.time()
+            for future in list(pending):
+                task_name = futures[future]
+                span = trace.spans.get(task_name)
+                if deadline.expired() or (span is not None and now - span.started > stage_budget(task_name)):
+                    future.cancel()
+                    pending.discard(future)
+                    _timed_out(task_name)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    _check_cancelled()
+
+    # 3. 整合数据、评分并生成摘要
+    _finalize_result(result, trace)
+    result['timings'] = pipeline_metrics.observe(trace)
+
+    # 保存缓存
+    cache_manager.set(_analysis_cache_key(ts_code), result, namespace='analysis')
+
+    _progress("分析完成")
+    return result
+
+
+def _finalize_result(result: Dict[str, Any], trace: Optional[PipelineTrace] = None) -> Dict[str, Any]:
+    """
+    整合各数据源结果并计算评分、生成摘要（单股流程与批量流程共用）
+
+    Args:
+        result: 已填充 technical/fundamental/news/market/professional_data 的结果字典，原地更新
+        trace: 计时记录，评分与摘要分别记为 score、summary 阶段
+
+    Returns:
+        result 本身
+    """
+    # 1. 提取prices数据到顶层（兼容前端）
     if 'technical' in result and result['technical']:
         tech_data = result['technical']
         # 将prices数据提取到顶层
@@ -181,7 +288,7 @@ def run_pipeline_optimized(
         if 'latest_price' in tech_data:
             result['latest_price'] = tech_data['latest_price']
 
-    # 4. 计算综合评分（整合5000积分数据）
+    # 2. 计算综合评分（整合5000积分数据）
     # 将professional_data合并到result中
     if 'professional_data' in result and result['professional_data']:
         prof_data = result['professional_data']
@@ -212,18 +319,15 @@ def run_pipeline_optimized(
         if prof_data.get('realtime_indicators'):
             result['realtime_indicators'] = prof_data['realtime_indicators']
 
-    result['score'] = _calculate_score(result)
+    trace = trace or PipelineTrace()
+    with trace.span('score'):
+        result['score'] = _calculate_score(result)
 
-    # 4. 生成摘要和预测数据
-    summary, predictions = _generate_summary(result)
+    # 3. 生成摘要和预测数据
+    with trace.span('summary'):
+        summary, predictions = _generate_summary(result)
     result['summary'] = summary
     result['predictions'] = predictions
-
-    # 保存缓存
-    cache_key = f"analysis_{ts_code}_{datetime.now().strftime('%Y%m%d')}"
-    cache_manager.set(cache_key, result, namespace='analysis')
-
-    _progress("分析完成")
     return result
 
 
@@ -302,7 +406,6 @@ def _fetch_technical_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
 
         # 如果专业版失败，回退到普通版
         print(f"[技术数据] 专业版不可用，使用普通版计算")
-        from .indicators import compute_indicators
         from .tushare_client import daily, daily_basic
 
         # 获取价格数据（获取最近120天的数据）
@@ -325,12 +428,12 @@ def _fetch_technical_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
         # 获取最新的每日指标（尝试多个日期以应对T+1延迟）
         latest_basic = {}
         try:
-            # 由于T+1延迟，尝试最近几个交易日的数据
-            from datetime import timedelta
-            for days_ago in range(5):  # 尝试最近5天
-                check_date = (datetime.now() - timedelta(days=days_ago)).strftime('%Y%m%d')
+            # 由于T+1延迟，从登记的最新有数据交易日开始尝试
+            from .trading_calendar import data_dates
+            for check_date in data_dates.candidates('daily_basic', 5):
                 latest_daily_basic = daily_basic(ts_code=ts_code, trade_date=check_date)
                 if latest_daily_basic is not None and not latest_daily_basic.empty:
+                    data_dates.record('daily_basic', check_date)
                     latest_basic = latest_daily_basic.iloc[0].to_dict()
                     print(f"[技术数据] 获取到daily_basic数据 ({check_date}): PE={latest_basic.get('pe_ttm', 0):.2f}")
                     break
@@ -341,68 +444,7 @@ def _fetch_technical_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
             print(f"[技术数据] 获取daily_basic失败: {e}")
             latest_basic = {}
 
-        # 计算指标
-        df_with_indicators = compute_indicators(df)
-
-        # 提取关键指标
-        if df_with_indicators is not None and not df_with_indicators.empty:
-            latest = df_with_indicators.iloc[-1]
-            indicators = {
-                'RSI': float(latest.get('rsi14', 50)) if 'rsi14' in latest else 50,
-                'MACD': float(latest.get('macd', 0)) if 'macd' in latest else 0,
-                'DIF': float(latest.get('dif', 0)) if 'dif' in latest else 0,
-                'DEA': float(latest.get('dea', 0)) if 'dea' in latest else 0,
-                'KDJ_K': float(latest.get('kdj_k', 50)) if 'kdj_k' in latest else 50,
-                'KDJ_D': float(latest.get('kdj_d', 50)) if 'kdj_d' in latest else 50,
-                'MA5': float(latest.get('ma5', 0)) if 'ma5' in latest else 0,
-                'MA10': float(latest.get('ma10', 0)) if 'ma10' in latest else 0,
-                'MA20': float(latest.get('ma20', 0)) if 'ma20' in latest else 0,
-                'BOLL_UP': float(latest.get('boll_up', 0)) if 'boll_up' in latest else 0,
-                'BOLL_DN': float(latest.get('boll_dn', 0)) if 'boll_dn' in latest else 0
-            }
-        else:
-            indicators = {}
-
-        # 最新价格
-        latest = df.iloc[0]
-        price_info = {
-            'close': float(latest['close']),
-            'open': float(latest.get('open', 0)),
-            'high': float(latest.get('high', 0)),
-            'low': float(latest.get('low', 0)),
-            'change': float(latest.get('pct_chg', 0)),
-            'volume': float(latest.get('vol', 0)),
-            'amount': float(latest.get('amount', 0)) * 1000,  # 转换为元
-            'turnover_rate': float(latest_basic.get('turnover_rate', 0)) if latest_basic and 'turnover_rate' in latest_basic else 0,
-            'pe_ttm': float(latest_basic.get('pe_ttm', 0)) if latest_basic and 'pe_ttm' in latest_basic else 0,
-            'pb': float(latest_basic.get('pb', 0)) if latest_basic and 'pb' in latest_basic else 0,
-            'volume_ratio': float(latest_basic.get('volume_ratio', 0)) if latest_basic and 'volume_ratio' in latest_basic else 0,
-            'trade_date': str(latest.get('trade_date', ''))
-        }
-
-        # 准备价格历史数据（前端需要的）
-        prices = []
-        for _, row in df.iterrows():
-            prices.append({
-                'trade_date': str(row['trade_date']),
-                'open': float(row['open']),
-                'high': float(row['high']),
-                'low': float(row['low']),
-                'close': float(row['close']),
-                'volume': float(row.get('vol', 0)),
-                'amount': float(row.get('amount', 0)) * 1000,  # 转换为元
-                'pct_chg': float(row.get('pct_chg', 0))
-            })
-
-        return {
-            'prices': prices,  # 添加prices字段供前端使用
-            'price': price_info,
-            'latest_price': float(latest['close']),  # 添加latest_price字段
-            'latest_price_info': price_info,  # 完整的价格信息(含PE/PB)
-            'indicators': indicators,
-            'trend': _analyze_trend(df),
-            'latest_basic': latest_basic if isinstance(latest_basic, dict) else {}
-        }
+        return _build_technical_data(df, latest_basic)
     except Exception as e:
         print(f"[技术数据] 错误: {e}")
         import traceback
@@ -417,6 +459,72 @@ def _fetch_technical_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
         }
 
 
+def _build_technical_data(df, latest_basic: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    由日线数据与每日指标计算技术面结果（单股流程与批量流程共用）
+
+    Args:
+        df: 日线数据（按交易日倒序）
+        latest_basic: 最新一日的daily_basic记录，缺失时为空字典
+
+    Returns:
+        技术数据字典
+    """
+    from .indicators import compute_indicators
+
+    # 计算指标
+    df_with_indicators = compute_indicators(df)
+
+    # 提取关键指标
+    if df_with_indicators is not None and not df_with_indicators.empty:
+        latest = df_with_indicators.iloc[-1]
+        indicators = {
+            'RSI': float(latest.get('rsi14', 50)) if 'rsi14' in latest else 50,
+            'MACD': float(latest.get('macd', 0)) if 'macd' in latest else 0,
+            'DIF': float(latest.get('dif', 0)) if 'dif' in latest else 0,
+            'DEA': float(latest.get('dea', 0)) if 'dea' in latest else 0,
+            'KDJ_K': float(latest.get('kdj_k', 50)) if 'kdj_k' in latest else 50,
+            'KDJ_D': float(latest.get('kdj_d', 50)) if 'kdj_d' in latest else 50,
+            'MA5': float(latest.get('ma5', 0)) if 'ma5' in latest else 0,
+            'MA10': float(latest.get('ma10', 0)) if 'ma10' in latest else 0,
+            'MA20': float(latest.get('ma20', 0)) if 'ma20' in latest else 0,
+            'BOLL_UP': float(latest.get('boll_up', 0)) if 'boll_up' in latest else 0,
+            'BOLL_DN': float(latest.get('boll_dn', 0)) if 'boll_dn' in latest else 0
+        }
+    else:
+        indicators = {}
+
+    # 最新价格
+    latest = df.iloc[0]
+    price_info = {
+        'close': float(latest['close']),
+        'open': float(latest.get('open', 0)),
+        'high': float(latest.get('high', 0)),
+        'low': float(latest.get('low', 0)),
+        'change': float(latest.get('pct_chg', 0)),
+        'volume': float(latest.get('vol', 0)),
+        'amount': float(latest.get('amount', 0)) * 1000,  # 转换为元
+        'turnover_rate': float(latest_basic.get('turnover_rate', 0)) if latest_basic and 'turnover_rate' in latest_basic else 0,
+        'pe_ttm': float(latest_basic.get('pe_ttm', 0)) if latest_basic and 'pe_ttm' in latest_basic else 0,
+        'pb': float(latest_basic.get('pb', 0)) if latest_basic and 'pb' in latest_basic else 0,
+        'volume_ratio': float(latest_basic.get('volume_ratio', 0)) if latest_basic and 'volume_ratio' in latest_basic else 0,
+        'trade_date': str(latest.get('trade_date', ''))
+    }
+
+    # 准备价格历史数据（前端需要的）- 列式结构，向量化转换
+    prices = PriceSeries.from_daily(df)
+
+    return {
+        'prices': prices,  # 添加prices字段供前端使用（序列化为列式载荷）
+        'price': price_info,
+        'latest_price': float(latest['close']),  # 添加latest_price字段
+        'latest_price_info': price_info,  # 完整的价格信息(含PE/PB)
+        'indicators': indicators,
+        'trend': _analyze_trend(df),
+        'latest_basic': latest_basic if isinstance(latest_basic, dict) else {}
+    }
+
+
 @cache_stock_data(ttl=300)  # 缩短到5分钟缓存
 def _fetch_fundamental_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
     """获取基本面数据（带缓存）"""
@@ -429,44 +537,17 @@ def _fetch_fundamental_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
         fundamental_data = fetch_fundamentals(ts_code) or {}
 
         # 获取最新的每日基本面指标（尝试多个日期以应对T+1延迟）
-        from datetime import timedelta
+        from .trading_calendar import data_dates
         latest = None
-        for days_ago in range(5):  # 尝试最近5天
-            check_date = (datetime.now() - timedelta(days=days_ago)).strftime('%Y%m%d')
+        for check_date in data_dates.candidates('daily_basic', 5):
             latest_basic = daily_basic(ts_code=ts_code, trade_date=check_date)
             if latest_basic is not None and not latest_basic.empty:
+                data_dates.record('daily_basic', check_date)
                 latest = latest_basic.iloc[0]
                 break
 
         if latest is not None:
-            # 将PE、PB等指标直接添加到fina_indicator_latest中，确保前端能获取
-            if 'fina_indicator_latest' not in fundamental_data:
-                fundamental_data['fina_indicator_latest'] = {}
-
-            # 更新PE、PB到财务指标中（优先使用daily_basic的实时数据）
-            pe_value = float(latest.get('pe_ttm', 0)) if 'pe_ttm' in latest else None
-            pb_value = float(latest.get('pb', 0)) if 'pb' in latest else None
-            ps_value = float(latest.get('ps_ttm', 0)) if 'ps_ttm' in latest else None
-
-            if pe_value and pe_value > 0:
-                fundamental_data['fina_indicator_latest']['pe'] = pe_value
-                fundamental_data['fina_indicator_latest']['pe_ttm'] = pe_value
-
-            if pb_value and pb_value > 0:
-                fundamental_data['fina_indicator_latest']['pb'] = pb_value
-
-            if ps_value and ps_value > 0:
-                fundamental_data['fina_indicator_latest']['ps_ttm'] = ps_value
-
-            # 保留其他每日指标
-            fundamental_data['latest_daily'] = {
-                'pe_ttm': pe_value or 0,
-                'pb': pb_value or 0,
-                'ps_ttm': float(latest.get('ps_ttm', 0)) if 'ps_ttm' in latest else 0,
-                'dv_ttm': float(latest.get('dv_ttm', 0)) if 'dv_ttm' in latest else 0,
-                'total_mv': float(latest.get('total_mv', 0)) if 'total_mv' in latest else 0,
-                'circ_mv': float(latest.get('circ_mv', 0)) if 'circ_mv' in latest else 0
-            }
+            _merge_daily_basic(fundamental_data, latest)
 
         return fundamental_data
     except Exception as e:
@@ -474,6 +555,44 @@ def _fetch_fundamental_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
         return {}
 
 
+def _merge_daily_basic(fundamental_data: Dict[str, Any], latest) -> None:
+    """
+    将最新一日的daily_basic指标合并到基本面数据（单股流程与批量流程共用）
+
+    Args:
+        fundamental_data: fetch_fundamentals 的结果，原地更新
+        latest: daily_basic 的一行（Series或dict）
+    """
+    # 将PE、PB等指标直接添加到fina_indicator_latest中，确保前端能获取
+    if 'fina_indicator_latest' not in fundamental_data:
+        fundamental_data['fina_indicator_latest'] = {}
+
+    # 更新PE、PB到财务指标中（优先使用daily_basic的实时数据）
+    pe_value = float(latest.get('pe_ttm', 0)) if 'pe_ttm' in latest else None
+    pb_value = float(latest.get('pb', 0)) if 'pb' in latest else None
+    ps_value = float(latest.get('ps_ttm', 0)) if 'ps_ttm' in latest else None
+
+    if pe_value and pe_value > 0:
+        fundamental_data['fina_indicator_latest']['pe'] = pe_value
+        fundamental_data['fina_indicator_latest']['pe_ttm'] = pe_value
+
+    if pb_value and pb_value > 0:
+        fundamental_data['fina_indicator_latest']['pb'] = pb_value
+
+    if ps_value and ps_value > 0:
+        fundamental_data['fina_indicator_latest']['ps_ttm'] = ps_value
+
+    # 保留其他每日指标
+    fundamental_data['latest_daily'] = {
+        'pe_ttm': pe_value or 0,
+        'pb': pb_value or 0,
+        'ps_ttm': float(latest.get('ps_ttm', 0)) if 'ps_ttm' in latest else 0,
+        'dv_ttm': float(latest.get('dv_ttm', 0)) if 'dv_ttm' in latest else 0,
+        'total_mv': float(latest.get('total_mv', 0)) if 'total_mv' in latest else 0,
+        'circ_mv': float(latest.get('circ_mv', 0)) if 'circ_mv' in latest else 0
+    }
+
+
 def _fetch_news_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
     """获取新闻数据（使用增强匹配器）"""
     try:
@@ -1747,13 +1866,14 @@ def _generate_summary(result: Dict) -> tuple[str, list]:
     return "\n".join(report_parts), all_predictions
 
 
-def _fetch_professional_data(ts_code: str, stock_name: str) -> Dict[str, Any]:
-    """获取5000积分专属数据"""
+def _fetch_professional_data(ts_code: str, stock_name: str,
+                             moneyflow: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """获取5000积分专属数据（moneyflow 为批量流程预取的当日资金流向，None时单独查询）"""
     try:
         from .advanced_data_client import advanced_client
 
         # 获取完整专业数据
-        professional_data = advanced_client.get_full_professional_data(ts_code)
+        professional_data = advanced_client.get_full_professional_data(ts_code, moneyflow=moneyflow)
 
         # 获取实时数据
         realtime_quote = advanced_client.get_realtime_quote(ts_code)
@@ -0,0 +1,360 @@
+"""
+批量股票分析（自选股）
+- 市场环境、交易日以及全市场截面数据（daily_basic、moneyflow）整批只获取一次
+- 日线按多股票代码批量预取，技术面直接由预取数据计算
+- 各股票的基本面/新闻/专业数据与评分并发执行，完成一只回调一只
+- 单股结果写入与 run_pipeline_optimized 相同的缓存键，单股接口可直接复用
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .analyze_optimized import (
+    ANALYSIS_CACHE_TTL,
+    STAGE_POLL_SECONDS,
+    _analysis_cache_key,
+    _build_technical_data,
+    _fetch_market_context,
+    _fetch_news_data,
+    _fetch_professional_data,
+    _fetch_technical_data,
+    _finalize_result,
+    _merge_daily_basic,
+    resolve_by_name,
+    stage_budget,
+)
+from .cache_manager import cache_manager
+from .config import settings
+from .deadline import check_deadline, deadline_scope
+from .pipeline_metrics import PipelineTrace, STATUS_ERROR, pipeline_metrics
+from .stream_hub import PipelineCancelled
+from .trading_calendar import data_dates, trading_calendar
+
+logger = logging.getLogger(__name__)
+
+# 日线回看窗口（自然日），与单股技术面取数一致
+BARS_LOOKBACK_DAYS = 180
+# Tushare daily 接口单次返回的行数上限
+DAILY_ROW_LIMIT = 6000
+
+
+class BatchInputs:
+    """整批共享的输入数据"""
+
+    def __init__(self):
+        self.market: Dict[str, Any] = {}
+        self.basic_date: Optional[str] = None
+        self.daily_basic: Dict[str, Dict[str, Any]] = {}
+        self.moneyflow_date: Optional[str] = None
+        self.moneyflow: Dict[str, Dict[str, Any]] = {}
+        self.bars: Dict[str, pd.DataFrame] = {}
+
+    def moneyflow_for(self, ts_code: str) -> Optional[Dict[str, Any]]:
+        """
+        单只股票的资金流向摘要（与 get_full_professional_data 的结构一致）
+
+        Returns:
+            截面未获取到时为None（由单股流程自行查询）
+        """
+        if self.moneyflow_date is None:
+            return None
+        row = self.moneyflow.get(ts_code)
+        if not row:
+            return {'has_data': False}
+        return {
+            'net_amount': float(row.get('net_amount', 0) or 0),
+            'net_amount_xl': float(row.get('net_amount_xl', 0) or 0),
+            'net_amount_l': float(row.get('net_amount_l', 0) or 0),
+            'net_amount_m': float(row.get('net_amount_m', 0) or 0),
+            'net_amount_s': float(row.get('net_amount_s', 0) or 0),
+            'has_data': True
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'daily_basic_date': self.basic_date,
+            'moneyflow_date': self.moneyflow_date,
+            'bars_prefetched': len(self.bars),
+        }
+
+
+def _rows_by_code(df: Optional[pd.DataFrame], ts_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """从全市场截面中取出指定股票的记录 {ts_code: row}"""
+    if df is None or df.empty or 'ts_code' not in df.columns:
+        return {}
+    subset = df[df['ts_code'].isin(ts_codes)].drop_duplicates('ts_code')
+    return subset.set_index('ts_code', drop=False).to_dict('index')
+
+
+def _prefetch_bars(ts_codes: List[str], start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+    """
+    按多股票代码批量获取日线（每次请求的股票数受行数上限约束）
+
+    Returns:
+        {ts_code: 按交易日倒序的日线}；获取失败的股票不在结果中，由调用方单独获取
+    """
+    from .tushare_client import _call_api
+
+    rows_per_stock = max(1, len(trading_calendar.range(start_date, end_date)))
+    chunk_size = max(1, DAILY_ROW_LIMIT // rows_per_stock)
+    bars: Dict[str, pd.DataFrame] = {}
+    for i in range(0, len(ts_codes), chunk_size):
+        chunk = ts_codes[i:i + chunk_size]
+        try:
+            df = _call_api('daily', ts_code=','.join(chunk), start_date=start_date, end_date=end_date)
+        except Exception as e:
+            logger.warning(f"批量日线获取失败({len(chunk)}只): {e}")
+            continue
+        if df is None or df.empty:
+            continue
+        df = df.sort_values(['ts_code', 'trade_date'], ascending=[True, False])
+        for ts_code, frame in df.groupby('ts_code', sort=False):
+            bars[ts_code] = frame.reset_index(drop=True)
+    return bars
+
+
+def prepare_batch_inputs(ts_codes: List[str], trace: Optional[PipelineTrace] = None) -> BatchInputs:
+    """
+    获取整批共享的输入：市场环境、最新截面交易日、daily_basic/moneyflow 截面与批量日线
+
+    任一部分失败只记录日志，对应数据由单股流程回退获取
+
+    Args:
+        ts_codes: 需要分析的股票代码
+        trace: 计时记录，各部分分别记为 batch_market、batch_daily_basic、batch_moneyflow、batch_bars 阶段
+    """
+    from .tushare_client import daily_basic, moneyflow
+
+    trace = trace or PipelineTrace()
+    inputs = BatchInputs()
+
+    # 市场环境与个股无关，整批一次
+    with trace.span('batch_market'):
+        inputs.market = _fetch_market_context('', '') or {}
+
+    with trace.span('batch_daily_basic'):
+        try:
+            inputs.basic_date = data_dates.resolve('daily_basic', daily_basic, max_attempts=5)
+            if inputs.basic_date:
+                inputs.daily_basic = _rows_by_code(daily_basic(trade_date=inputs.basic_date), ts_codes)
+        except Exception as e:
+            logger.warning(f"daily_basic截面获取失败: {e}")
+            trace.mark('batch_daily_basic', STATUS_ERROR, str(e))
+
+    with trace.span('batch_moneyflow'):
+        try:
+            inputs.moneyflow_date = data_dates.resolve('moneyflow', moneyflow, max_attempts=5)
+            if inputs.moneyflow_date:
+                inputs.moneyflow = _rows_by_code(moneyflow(trade_date=inputs.moneyflow_date), ts_codes)
+        except Exception as e:
+            logger.warning(f"moneyflow截面获取失败: {e}")
+            trace.mark('batch_moneyflow', STATUS_ERROR, str(e))
+            inputs.moneyflow_date = None
+
+    end_date = datetime.now().strftime('%Y%m%d')
+    start_date = (datetime.now() - timedelta(days=BARS_LOOKBACK_DAYS)).strftime('%Y%m%d')
+    with trace.span('batch_bars'):
+        inputs.bars = _prefetch_bars(ts_codes, start_date, end_date)
+    return inputs
+
+
+def _section(trace: PipelineTrace, name: str, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> Dict[str, Any]:
+    """在计时阶段与阶段预算内执行单个数据源，异常转为 {'error': ...}（与单股流程一致）"""
+    with deadline_scope(stage_budget(name)), trace.span(name):
+        try:
+            result = func(*args, **kwargs) or {}
+        except Exception as e:
+            print(f"[批量分析] {name} 失败: {e}")
+            result = {'error': str(e)}
+    if isinstance(result, dict) and result.get('error'):
+        trace.mark(name, STATUS_ERROR, str(result['error']))
+    return result
+
+
+def _fundamental_from_inputs(ts_code: str, inputs: BatchInputs) -> Dict[str, Any]:
+    from .fundamentals import fetch_fundamentals
+
+    fundamental_data = fetch_fundamentals(ts_code) or {}
+    latest = inputs.daily_basic.get(ts_code)
+    if latest:
+        _merge_daily_basic(fundamental_data, latest)
+    return fundamental_data
+
+
+def _analyze_one(stock_info: Dict[str, Any], inputs: BatchInputs) -> Dict[str, Any]:
+    """使用共享输入分析单只股票，并写入单股分析缓存"""
+    # 排队期间整批已到期/取消时直接跳过
+    check_deadline(stock_info['ts_code'])
+    ts_code = stock_info['ts_code']
+    stock_name = stock_info['name']
+    trace = PipelineTrace(ts_code)
+
+    bars = inputs.bars.get(ts_code)
+    if bars is not None:
+        technical = _section(trace, 'technical', _build_technical_data, bars, inputs.daily_basic.get(ts_code, {}))
+    else:
+        technical = _section(trace, 'technical', _fetch_technical_data, ts_code, stock_name)
+
+    result = {
+        "basic": stock_info,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "technical": technical,
+        "fundamental": _section(trace, 'fundamental', _fundamental_from_inputs, ts_code, inputs),
+        "news": _section(trace, 'news', _fetch_news_data, ts_code, stock_name),
+        "market": inputs.market,
+        "professional_data": _section(trace, 'professional_data', _fetch_professional_data, ts_code, stock_name,
+                                      moneyflow=inputs.moneyflow_for(ts_code))
+    }
+    _finalize_result(result, trace)
+    result['timings'] = pipeline_metrics.observe(trace)
+    cache_manager.set(_analysis_cache_key(ts_code), result, namespace='analysis')
+    return result
+
+
+def _ranking_entry(name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    basic = result.get('basic', {}) if isinstance(result, dict) else {}
+    score = result.get('score', {}) if isinstance(result, dict) else {}
+    return {
+        'name': basic.get('name', name),
+        'ts_code': basic.get('ts_code'),
+        'score': score.get('total', 0) if isinstance(score, dict) else 0,
+        'rating': score.get('rating', 'N/A') if isinstance(score, dict) else 'N/A',
+        'latest_price': result.get('latest_price', 0) if isinstance(result, dict) else 0,
+    }
+
+
+def run_batch_analysis(
+    names: List[str],
+    force: bool = False,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    progress: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    max_workers: Optional[int] = None,
+    timeout_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    批量分析自选股
+
+    Args:
+        names: 股票名称或代码列表（按ts_code去重）
+        force: 是否忽略当日分析缓存
+        on_result: 单只股票完成回调 (输入名称, 分析结果)，按完成顺序调用；未找到的股票结果为 {'error': ...}
+        progress: 进度回调函数
+        cancel_event: 取消信号，置位后不再提交新的股票分析
+        max_workers: 并发分析的股票数，默认取配置
+        timeout_seconds: 整批截止时间（秒），默认取配置；到期后未完成的股票以 {'error': 'timeout'} 返回
+
+    Returns:
+        汇总：数量统计、共享数据日期与按评分排序的结果列表
+
+    Raises:
+        PipelineCancelled: cancel_event 被置位
+    """
+    start_time = time.time()
+    max_workers = max_workers or settings.BATCH_ANALYSIS_WORKERS
+
+    def _progress(step: str, data: Any = None):
+        if progress:
+            progress(step, data)
+        print(f"[批量分析] {step}")
+
+    def _emit(name: str, result: Dict[str, Any]):
+        if on_result:
+            on_result(name, result)
+
+    def _check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"[批量分析] 已取消")
+            raise PipelineCancelled(','.join(names))
+
+    summary: Dict[str, Any] = {'total': len(names), 'completed': 0, 'cached': 0, 'failed': 0, 'not_found': []}
+    ranking: List[Dict[str, Any]] = []
+
+    # 1. 解析并按ts_code去重（保持输入顺序）
+    stocks: Dict[str, Any] = {}
+    for name in names:
+        stock_info = resolve_by_name(name, force)
+        if not stock_info:
+            summary['not_found'].append(name)
+            _emit(name, {"error": f"未找到股票: {name}"})
+        elif stock_info['ts_code'] not in stocks:
+            stocks[stock_info['ts_code']] = (name, stock_info)
+    _progress(f"解析完成: {len(stocks)}只股票", {'resolved': len(stocks), 'not_found': summary['not_found']})
+
+    # 2. 当日已有分析结果的直接返回
+    pending = []
+    for ts_code, (name, stock_info) in stocks.items():
+        cached_result = None if force else cache_manager.get(
+            _analysis_cache_key(ts_code), namespace='analysis', max_age=ANALYSIS_CACHE_TTL)
+        if cached_result:
+            summary['cached'] += 1
+            summary['completed'] += 1
+            ranking.append(_ranking_entry(name, cached_result))
+            _emit(name, cached_result)
+        else:
+            pending.append((name, stock_info))
+
+    if pending:
+        _check_cancelled()
+
+        with deadline_scope(timeout_seconds or settings.BATCH_ANALYSIS_TIMEOUT, cancel_event,
+                            label='批量分析') as deadline:
+            # 3. 整批共享数据
+            batch_trace = PipelineTrace('batch')
+            inputs = prepare_batch_inputs([stock_info['ts_code'] for _, stock_info in pending], batch_trace)
+            summary.update(inputs.summary())
+            summary['timings'] = pipeline_metrics.observe(batch_trace, total_stage='batch_inputs')
+            _progress("共享数据获取完成", inputs.summary())
+
+            # 4. 并发分析（复制上下文以传递截止时间；到期后不再等待未完成的股票）
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                futures = {
+                    executor.submit(contextvars.copy_context().run, _analyze_one, stock_info, inputs): name
+                    for name, stock_info in pending
+                }
+                waiting = set(futures)
+                while waiting:
+                    done, _ = wait(waiting, timeout=min(STAGE_POLL_SECONDS, max(deadline.remaining(), 0.05)),
+                                   return_when=FIRST_COMPLETED)
+                    if cancel_event is not None and cancel_event.is_set():
+                        for other in waiting:
+                            other.cancel()
+                        _check_cancelled()
+
+                    for future in done:
+                        waiting.discard(future)
+                        name = futures[future]
+                        try:
+                            result = future.result()
+                            summary['completed'] += 1
+                            ranking.append(_ranking_entry(name, result))
+                        except Exception as e:
+                            print(f"[批量分析] {name} 失败: {e}")
+                            summary['failed'] += 1
+                            result = {"error": str(e)}
+                        _emit(name, result)
+                        _progress(f"完成: {name} ({summary['completed'] + summary['failed']}/{len(stocks)})")
+
+                    if deadline.expired() and waiting:
+                        print(f"[批量分析] 截止时间已到，{len(waiting)}只股票未完成")
+                        for future in waiting:
+                            future.cancel()
+                            summary['failed'] += 1
+                            _emit(futures[future], {"error": "timeout"})
+                        summary['timed_out'] = len(waiting)
+                        waiting.clear()
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    ranking.sort(key=lambda item: item['score'] or 0, reverse=True)
+    summary['ranking'] = ranking
+    summary['elapsed'] = round(time.time() - start_time, 2)
+    _progress("批量分析完成", {'elapsed': summary['elapsed']})
+    return summary
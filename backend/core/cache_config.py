@@ -120,9 +120,14 @@ def get_dynamic_ttl(data_type: str, context: Optional[Dict[str, Any]] = None) ->
     # 初始化调整系数
     multiplier = 1.0
 
-    # 1. 自动判断热门股票（如果提供了ts_code但没有is_hot）
-    if context and 'ts_code' in context and 'is_hot' not in context:
-        context['is_hot'] = is_hot_stock(context['ts_code'])
+    # 1. 自动补全热门/事件/波动标记（查全市场热度表，O(1)，不发起数据请求）
+    if context and 'ts_code' in context:
+        if 'is_hot' not in context:
+            context['is_hot'] = is_hot_stock(context['ts_code'])
+        if 'has_event' not in context:
+            context['has_event'] = has_major_event(context['ts_code'])
+    if context and 'market_volatile' not in context:
+        context['market_volatile'] = is_market_volatile()
 
     # 2. 交易时间调整（基础调整）
     if is_trading_hours():
@@ -228,152 +233,26 @@ def is_after_hours() -> bool:
 def is_hot_stock(ts_code: str) -> bool:
     """
     判断是否为热门股票
-    基于多个维度：成交量、涨跌幅、换手率等
+    基于多个维度：成交额、换手率、量比、同花顺热榜、涨跌停，由全市场热度表预先计算
     """
-    try:
-        from .tushare_client import daily
-
-        # 获取最近交易数据（注意：daily返回的数据已经包含了基本指标）
-        daily_df = daily(ts_code)
-        if daily_df is None or daily_df.empty:
-            return False
-
-        # 只取最近5天数据
-        recent = daily_df.head(5)
-
-        # 从daily数据中直接获取指标（5000积分数据更丰富）
-        # 计算平均成交额（亿元）
-        avg_amount = recent['amount'].mean() / 10000 if 'amount' in recent.columns else 0
-
-        # 平均换手率（turn_over字段）
-        avg_turnover = recent['turn_over'].mean() if 'turn_over' in recent.columns else 0
-
-        # 平均涨跌幅
-        avg_change = recent['pct_change'].abs().mean() if 'pct_change' in recent.columns else 0
-
-        # 最新量比
-        latest_vol_ratio = daily_df.iloc[0].get('vol_ratio', 0) if not daily_df.empty else 0
-
-        # 总市值（亿）
-        total_mv = daily_df.iloc[0].get('total_mv', 0) if not daily_df.empty else 0
-
-        # 热门股判断标准（适配5000积分数据特点）
-        is_hot = False
-
-        # 1. 高成交额（根据实际数据调整）
-        # 超大盘股（市值>5000亿）：成交额>30亿
-        # 大盘股（市值1000-5000亿）：成交额>20亿
-        # 中小盘股：成交额>10亿
-        if total_mv > 5000 and avg_amount > 30:
-            is_hot = True
-        elif total_mv > 1000 and avg_amount > 20:
-            is_hot = True
-        elif avg_amount > 10:
-            is_hot = True
-
-        # 2. 高换手率（超过2%为活跃）
-        if avg_turnover > 2:
-            is_hot = True
-
-        # 3. 高量比（超过1.5为放量）
-        if latest_vol_ratio > 1.5:
-            is_hot = True
-
-        # 4. 剧烈波动（平均涨跌幅超过2%）
-        if avg_change > 2:
-            is_hot = True
-
-        # 5. 连续大涨大跌（3天涨跌幅绝对值都超过2%）
-        if len(recent) >= 3:
-            recent_changes = recent.head(3)['pct_change'].abs() if 'pct_change' in recent.columns else None
-            if recent_changes is not None and (recent_changes > 2).all():
-                is_hot = True
-
-        return is_hot
-
-    except Exception as e:
-        # 如果获取数据失败，返回False
-        import logging
-        logging.error(f"判断热门股失败 {ts_code}: {e}")
-        return False
+    from .market_heat import market_heat
+    return market_heat.is_hot(ts_code)
 
 def has_major_event(ts_code: str) -> bool:
     """
     判断股票是否有重大事件
-    基于：重大公告、异常波动、停复牌等
+    基于：近3日公告关键词、涨跌停及量价异动，由全市场热度表预先计算
     """
-    try:
-        # 尝试使用智能事件检测器
-        from .event_detector import has_major_event_smart
-        from .tushare_client import anns, daily
-        from .news import fetch_recent_news
-
-        # 获取实时数据传入事件检测器
-        announcements = None
-        news = None
-        price_data = None
-
-        try:
-            # 获取最近公告（限制数量避免太慢）
-            ann_df = anns(ts_code, limit=10)
-            if ann_df is not None and not ann_df.empty:
-                announcements = []
-                for _, row in ann_df.iterrows():
-                    announcements.append({
-                        'title': row.get('title', ''),
-                        'ann_date': row.get('ann_date', '')
-                    })
-        except:
-            pass
-
-        try:
-            # 获取最近新闻
-            news_data = fetch_recent_news(days_back=1)
-            if news_data:
-                # 只保留包含股票代码的新闻
-                stock_code_short = ts_code.split('.')[0]
-                news = [n for n in news_data if stock_code_short in str(n.get('content', ''))][:10]
-        except:
-            pass
-
-        try:
-            # 获取最新价格数据
-            daily_df = daily(ts_code)
-            if daily_df is not None and not daily_df.empty:
-                row = daily_df.iloc[0]
-                price_data = {
-                    'pct_chg': row.get('pct_chg', 0),
-                    'volume_ratio': row.get('vol', 0) / row.get('vol', 1),  # 简化的量比
-                    'turnover_rate': row.get('turnover_rate', 0),
-                    'amplitude': row.get('high', 0) - row.get('low', 0),
-                }
-        except:
-            pass
-
-        # 调用事件检测器
-        return has_major_event_smart(ts_code, announcements, news, price_data)
-
-    except Exception as e:
-        # 如果事件检测器不可用，使用简单规则
-        # 可以维护一个已知的重大事件列表
-        major_event_stocks = {
-            # 示例：最近有重大事件的股票
-            # '002594.SZ': '新车型发布',
-            # '600519.SH': '业绩预告',
-        }
-        return ts_code in major_event_stocks
+    from .market_heat import market_heat
+    return market_heat.has_event(ts_code)
 
 def get_market_volatility() -> float:
     """
     获取市场波动率
-    可以基于：指数涨跌幅、成交量、VIX指数等
+    基于涨跌停家数、跌停家数与全市场换手率中位数，随热度表定期计算
     """
-    # 这里简化处理，实际可以计算：
-    # 1. 主要指数的日内波动
-    # 2. 成交量相对历史均值的比例
-    # 3. 涨跌停数量
-
-    return 0.5  # 返回0-1的波动率，0.5表示正常
+    from .market_heat import market_heat
+    return market_heat.volatility()  # 返回0-1的波动率，0.5表示正常
 
 def is_market_volatile() -> bool:
     """判断市场是否剧烈波动"""
@@ -389,5 +268,6 @@ __all__ = [
     'is_after_hours',
     'is_hot_stock',
     'has_major_event',
+    'get_market_volatility',
     'is_market_volatile'
 ]
\ No newline at end of file
@@ -1,27 +1,154 @@
 """
 统一缓存管理器 - 提高系统性能
+
+两级缓存：
+- 内存层：按命名空间划分的线程安全LRU（O(1)命中/淘汰），按序列化字节数计入内存预算
+- 磁盘层：每个命名空间一个清单索引（_manifest.json），统计无需遍历目录；
+  多个worker共享清单：落盘时在文件锁内与磁盘上的清单合并，只写入本进程自上次落盘以来的增删；
+  清理过期时扫描目录对账，崩溃遗留的未登记文件也会被清理；
+  写入采用临时文件+重命名，读者不会读到写了一半的pickle
 """
 import json
 import os
 import time
 import pickle
 import hashlib
-from typing import Any, Optional, Callable, Dict
+import tempfile
+from collections import OrderedDict
+from typing import Any, Optional, Callable, Dict, Tuple
 from functools import wraps
 from datetime import datetime, timedelta
 import threading
+import atexit
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows：无文件锁，合并仍可减少覆盖
+    fcntl = None
+
+from .config import settings
+from .pipeline_metrics import record_cache
+
+# 各命名空间默认内存预算（字节）
+DEFAULT_MEMORY_BUDGETS = {
+    'analysis': 64 * 1024 * 1024,
+    'stock': 64 * 1024 * 1024,
+    'news': 16 * 1024 * 1024,
+    'market': 16 * 1024 * 1024,
+    'hotspot': 16 * 1024 * 1024,
+}
+DEFAULT_NAMESPACE_BUDGET = 16 * 1024 * 1024
+
+MANIFEST_FILE = '_manifest.json'
+MANIFEST_LOCK_FILE = '_manifest.lock'
+# 启动时创建的命名空间目录
+DEFAULT_NAMESPACES = ('analysis', 'news', 'stock', 'market', 'hotspot', 'technical')
+MANIFEST_FLUSH_INTERVAL = 5.0  # 清单最短落盘间隔（秒）
+
+
+def parse_memory_budgets(spec: str) -> Dict[str, int]:
+    """
+    解析内存预算配置
+
+    Args:
+        spec: 形如 "analysis=64,stock=32" 的字符串（单位MB）
+
+    Returns:
+        命名空间 -> 字节数
+    """
+    budgets = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        namespace, _, mb = item.partition('=')
+        try:
+            budgets[namespace.strip()] = int(float(mb) * 1024 * 1024)
+        except ValueError:
+            print(f"[缓存] 忽略无效的内存预算配置: {item}")
+    return budgets
+
+
+def _atomic_write(path: str, payload: bytes) -> None:
+    """写入临时文件后原子重命名"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class _MemoryLRU:
+    """单个命名空间的内存LRU（调用方持有锁）"""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, int]]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, data: Any, timestamp: float, size: int) -> None:
+        self.pop(key)
+        if size > self.budget_bytes:
+            # 单项超过预算时只保留在磁盘层
+            return
+        self.entries[key] = (data, timestamp, size)
+        self.total_bytes += size
+        while self.total_bytes > self.budget_bytes and self.entries:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def pop(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.total_bytes = 0
 
 
 class CacheManager:
-    """统一缓存管理器"""
+    """统一缓存管理器（内存LRU + 磁盘清单索引）"""
 
-    def __init__(self, base_dir: str = ".cache"):
+    def __init__(self, base_dir: str = ".cache",
+                 memory_budgets: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            base_dir: 磁盘缓存根目录
+            memory_budgets: 各命名空间内存预算（字节），未配置的命名空间使用默认预算
+        """
         self.base_dir = base_dir
+        self.memory_budgets = dict(DEFAULT_MEMORY_BUDGETS)
+        if memory_budgets:
+            self.memory_budgets.update(memory_budgets)
         self.ensure_cache_dir()
-        self._lock = threading.Lock()
-        self._memory_cache = {}  # 内存缓存
+        self._lock = threading.RLock()
+        self._memory: Dict[str, _MemoryLRU] = {}
+        # 命名空间 -> {cache_key: [mtime, size]}
+        self._manifests: Dict[str, Dict[str, list]] = {}
+        self._manifest_dirty: Dict[str, bool] = {}
+        # 命名空间 -> 自上次落盘以来的变更 {cache_key: [mtime, size] 或 None(删除)}
+        self._manifest_changes: Dict[str, Dict[str, Optional[list]]] = {}
+        self._manifest_flushed_at: Dict[str, float] = {}
         self._cache_stats = {
             'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
             'misses': 0,
             'saves': 0
         }
@@ -32,7 +159,7 @@ class CacheManager:
             os.makedirs(self.base_dir, exist_ok=True)
 
         # 创建子目录
-        for subdir in ['news', 'stock', 'market', 'hotspot', 'technical']:
+        for subdir in DEFAULT_NAMESPACES:
             path = os.path.join(self.base_dir, subdir)
             if not os.path.exists(path):
                 os.makedirs(path, exist_ok=True)
@@ -47,6 +174,125 @@ class CacheManager:
         """获取缓存文件路径"""
         return os.path.join(self.base_dir, namespace, f"{cache_key}.cache")
 
+    # ------------------------------------------------------------------ 内部：内存层
+
+    def _memory_for(self, namespace: str) -> _MemoryLRU:
+        lru = self._memory.get(namespace)
+        if lru is None:
+            budget = self.memory_budgets.get(namespace, DEFAULT_NAMESPACE_BUDGET)
+            lru = self._memory[namespace] = _MemoryLRU(budget)
+        return lru
+
+    # ------------------------------------------------------------------ 内部：磁盘清单
+
+    def _manifest_path(self, namespace: str) -> str:
+        return os.path.join(self.base_dir, namespace, MANIFEST_FILE)
+
+    @contextmanager
+    def _manifest_file_lock(self, namespace: str):
+        """跨进程的清单文件锁（无fcntl时退化为进程内锁）"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.join(self.base_dir, namespace), exist_ok=True)
+        with open(os.path.join(self.base_dir, namespace, MANIFEST_LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self, namespace: str) -> Optional[Dict[str, list]]:
+        """读取磁盘上的清单；缺失或损坏时返回None"""
+        try:
+            with open(self._manifest_path(namespace), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[缓存] 清单损坏，重建 {namespace}: {e}")
+            return None
+
+    def _manifest_for(self, namespace: str) -> Dict[str, list]:
+        """加载命名空间清单；清单缺失或损坏时扫描一次目录重建（调用方持有锁）"""
+        manifest = self._manifests.get(namespace)
+        if manifest is not None:
+            return manifest
+
+        manifest = self._read_manifest(namespace)
+        if manifest is None:
+            manifest = self._rebuild_manifest(namespace)
+            # 重建结果整体写回
+            self._manifest_changes[namespace] = dict(manifest)
+            self._manifest_dirty[namespace] = True
+
+        self._manifests[namespace] = manifest
+        return manifest
+
+    def _record_change(self, namespace: str, cache_key: str, entry: Optional[list]) -> None:
+        """登记一条清单变更（entry为None表示删除，调用方持有锁）"""
+        manifest = self._manifest_for(namespace)
+        if entry is None:
+            manifest.pop(cache_key, None)
+        else:
+            manifest[cache_key] = entry
+        self._manifest_changes.setdefault(namespace, {})[cache_key] = entry
+        self._manifest_dirty[namespace] = True
+
+    def _rebuild_manifest(self, namespace: str) -> Dict[str, list]:
+        manifest = {}
+        namespace_dir = os.path.join(self.base_dir, namespace)
+        if not os.path.isdir(namespace_dir):
+            return manifest
+        with os.scandir(namespace_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.cache'):
+                    try:
+                        st = entry.stat()
+                        manifest[entry.name[:-len('.cache')]] = [st.st_mtime, st.st_size]
+                    except OSError:
+                        pass
+        return manifest
+
+    def _flush_manifest(self, namespace: str, force: bool = False) -> None:
+        """
+        清单落盘（节流，调用方持有锁）
+
+        在文件锁内读取磁盘上的清单，应用本进程的增删后写回，其他worker登记的条目不会被覆盖
+        """
+        if not self._manifest_dirty.get(namespace):
+            return
+        now = time.time()
+        if not force and now - self._manifest_flushed_at.get(namespace, 0) < MANIFEST_FLUSH_INTERVAL:
+            return
+        try:
+            os.makedirs(os.path.join(self.base_dir, namespace), exist_ok=True)
+            changes = self._manifest_changes.get(namespace, {})
+            with self._manifest_file_lock(namespace):
+                merged = self._read_manifest(namespace)
+                if merged is None:
+                    merged = dict(self._manifests.get(namespace, {}))
+                for cache_key, entry in changes.items():
+                    if entry is None:
+                        merged.pop(cache_key, None)
+                    else:
+                        merged[cache_key] = entry
+                _atomic_write(self._manifest_path(namespace), json.dumps(merged).encode('utf-8'))
+            self._manifests[namespace] = merged
+            self._manifest_changes[namespace] = {}
+            self._manifest_dirty[namespace] = False
+            self._manifest_flushed_at[namespace] = now
+        except Exception as e:
+            print(f"[缓存] 清单保存失败 {namespace}: {e}")
+
+    def flush(self) -> None:
+        """将所有命名空间的清单立即落盘"""
+        with self._lock:
+            for namespace in list(self._manifests):
+                self._flush_manifest(namespace, force=True)
+
+    # ------------------------------------------------------------------ 公共接口
+
     def get(self, key: str, namespace: str = 'default',
             max_age: int = 3600) -> Optional[Any]:
         """
@@ -61,33 +307,40 @@ class CacheManager:
             缓存的数据，如果不存在或过期返回None
         """
         cache_key = self._get_cache_key(key, namespace)
+        now = time.time()
 
         # 先检查内存缓存
-        memory_key = f"{namespace}:{cache_key}"
-        if memory_key in self._memory_cache:
-            data, timestamp = self._memory_cache[memory_key]
-            if time.time() - timestamp < max_age:
+        with self._lock:
+            entry = self._memory_for(namespace).get(cache_key)
+            if entry is not None and now - entry[1] < max_age:
                 self._cache_stats['hits'] += 1
-                return data
+                self._cache_stats['memory_hits'] += 1
+                record_cache(True)
+                return entry[0]
 
-        # 检查文件缓存
+        # 检查文件缓存（文件通过原子重命名写入，读取无需持锁）
         cache_path = self._get_cache_path(cache_key, namespace)
-
-        if os.path.exists(cache_path):
-            try:
-                mtime = os.path.getmtime(cache_path)
-                if time.time() - mtime < max_age:
-                    with open(cache_path, 'rb') as f:
-                        data = pickle.load(f)
-
-                    # 存入内存缓存
-                    self._memory_cache[memory_key] = (data, mtime)
+        try:
+            st = os.stat(cache_path)
+            if now - st.st_mtime < max_age:
+                with open(cache_path, 'rb') as f:
+                    data = pickle.load(f)
+
+                # 存入内存缓存
+                with self._lock:
+                    self._memory_for(namespace).put(cache_key, data, st.st_mtime, st.st_size)
                     self._cache_stats['hits'] += 1
-                    return data
-            except Exception as e:
-                print(f"[缓存] 读取失败 {key}: {e}")
+                    self._cache_stats['disk_hits'] += 1
+                record_cache(True)
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[缓存] 读取失败 {key}: {e}")
 
-        self._cache_stats['misses'] += 1
+        with self._lock:
+            self._cache_stats['misses'] += 1
+        record_cache(False)
         return None
 
     def set(self, key: str, data: Any, namespace: str = 'default') -> bool:
@@ -111,23 +364,16 @@ class CacheManager:
             if not os.path.exists(cache_dir):
                 os.makedirs(cache_dir, exist_ok=True)
 
-            # 存入文件缓存
-            with self._lock:
-                with open(cache_path, 'wb') as f:
-                    pickle.dump(data, f)
-
-                # 同时存入内存缓存
-                memory_key = f"{namespace}:{cache_key}"
-                self._memory_cache[memory_key] = (data, time.time())
+            # 锁外完成序列化和写盘
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            _atomic_write(cache_path, payload)
+            now = time.time()
 
-                # 限制内存缓存大小
-                if len(self._memory_cache) > 100:
-                    # 删除最旧的项
-                    oldest = min(self._memory_cache.items(),
-                                 key=lambda x: x[1][1])
-                    del self._memory_cache[oldest[0]]
-
-            self._cache_stats['saves'] += 1
+            with self._lock:
+                self._memory_for(namespace).put(cache_key, data, now, len(payload))
+                self._record_change(namespace, cache_key, [now, len(payload)])
+                self._flush_manifest(namespace)
+                self._cache_stats['saves'] += 1
             return True
         except Exception as e:
             print(f"[缓存] 保存失败 {key}: {e}")
@@ -138,90 +384,146 @@ class CacheManager:
         cache_key = self._get_cache_key(key, namespace)
         cache_path = self._get_cache_path(cache_key, namespace)
 
-        # 删除内存缓存
-        memory_key = f"{namespace}:{cache_key}"
-        if memory_key in self._memory_cache:
-            del self._memory_cache[memory_key]
+        with self._lock:
+            self._memory_for(namespace).pop(cache_key)
+            if cache_key in self._manifest_for(namespace):
+                self._record_change(namespace, cache_key, None)
+                self._flush_manifest(namespace)
 
         # 删除文件缓存
-        if os.path.exists(cache_path):
-            try:
-                os.remove(cache_path)
-                return True
-            except Exception:
-                pass
+        try:
+            os.remove(cache_path)
+            return True
+        except OSError:
+            return False
+
+    def stored_at(self, key: str, namespace: str = 'default') -> Optional[float]:
+        """条目的写入时间（内存层时间戳或磁盘文件mtime），不存在时返回None"""
+        cache_key = self._get_cache_key(key, namespace)
+        with self._lock:
+            lru = self._memory.get(namespace)
+            entry = lru.entries.get(cache_key) if lru is not None else None
+            if entry is not None:
+                return entry[1]
+        try:
+            return os.stat(self._get_cache_path(cache_key, namespace)).st_mtime
+        except OSError:
+            return None
 
-        return False
+    def demote(self, key: str, namespace: str = 'default') -> None:
+        """将条目移出内存层（磁盘文件保留，下次访问时重新载入内存）"""
+        cache_key = self._get_cache_key(key, namespace)
+        with self._lock:
+            self._memory_for(namespace).pop(cache_key)
 
     def clear_namespace(self, namespace: str) -> int:
         """清空指定命名空间的缓存"""
         count = 0
-        namespace_dir = os.path.join(self.base_dir, namespace)
-
-        if os.path.exists(namespace_dir):
-            for file in os.listdir(namespace_dir):
-                if file.endswith('.cache'):
+        with self._lock:
+            with self._manifest_file_lock(namespace):
+                # 按目录扫描删除，包括其他worker写入和未登记的文件
+                for cache_key in self._rebuild_manifest(namespace):
                     try:
-                        os.remove(os.path.join(namespace_dir, file))
+                        os.remove(self._get_cache_path(cache_key, namespace))
                         count += 1
-                    except Exception:
+                    except OSError:
                         pass
-
-        # 清理内存缓存
-        keys_to_delete = [k for k in self._memory_cache.keys()
-                          if k.startswith(f"{namespace}:")]
-        for key in keys_to_delete:
-            del self._memory_cache[key]
+                self._replace_manifest(namespace, {})
+            self._memory_for(namespace).clear()
 
         return count
 
+    def _replace_manifest(self, namespace: str, manifest: Dict[str, list]) -> None:
+        """以目录对账结果整体替换清单（调用方持有锁与文件锁）"""
+        _atomic_write(self._manifest_path(namespace), json.dumps(manifest).encode('utf-8'))
+        self._manifests[namespace] = manifest
+        self._manifest_changes[namespace] = {}
+        self._manifest_dirty[namespace] = False
+        self._manifest_flushed_at[namespace] = time.time()
+
+    def _known_namespaces(self):
+        """本管理器创建的命名空间（默认目录及含清单的目录；reports等其他子目录不计入）"""
+        namespaces = set(self._manifests) | set(self._memory) | set(DEFAULT_NAMESPACES)
+        try:
+            with os.scandir(self.base_dir) as it:
+                namespaces.update(
+                    e.name for e in it
+                    if e.is_dir() and os.path.exists(os.path.join(e.path, MANIFEST_FILE))
+                )
+        except OSError:
+            pass
+        return namespaces
+
     def clean_expired(self, max_age: int = 86400) -> int:
-        """清理过期缓存"""
+        """
+        清理过期缓存
+
+        按目录扫描结果对账：其他worker写入或崩溃前未及登记的文件同样按修改时间清理，
+        清单随之整体替换为扫描结果
+        """
         count = 0
         current_time = time.time()
 
-        for root, dirs, files in os.walk(self.base_dir):
-            for file in files:
-                if file.endswith('.cache'):
-                    file_path = os.path.join(root, file)
-                    try:
-                        mtime = os.path.getmtime(file_path)
-                        if current_time - mtime > max_age:
-                            os.remove(file_path)
+        with self._lock:
+            for namespace in self._known_namespaces():
+                if not os.path.isdir(os.path.join(self.base_dir, namespace)):
+                    continue
+                with self._manifest_file_lock(namespace):
+                    manifest = self._rebuild_manifest(namespace)
+                    expired = [k for k, (mtime, _) in manifest.items() if current_time - mtime > max_age]
+                    for cache_key in expired:
+                        try:
+                            os.remove(self._get_cache_path(cache_key, namespace))
                             count += 1
-                    except Exception:
-                        pass
+                        except OSError:
+                            pass
+                        del manifest[cache_key]
+                        self._memory_for(namespace).pop(cache_key)
+                    self._replace_manifest(namespace, manifest)
 
         return count
 
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计"""
-        total_size = 0
-        file_count = 0
-
-        for root, dirs, files in os.walk(self.base_dir):
-            for file in files:
-                if file.endswith('.cache'):
-                    file_count += 1
-                    file_path = os.path.join(root, file)
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except Exception:
-                        pass
+        with self._lock:
+            namespaces = {}
+            total_size = 0
+            file_count = 0
+            for namespace in self._known_namespaces():
+                manifest = self._manifest_for(namespace)
+                lru = self._memory_for(namespace)
+                disk_bytes = sum(size for _, size in manifest.values())
+                total_size += disk_bytes
+                file_count += len(manifest)
+                namespaces[namespace] = {
+                    'memory_items': len(lru.entries),
+                    'memory_bytes': lru.total_bytes,
+                    'memory_budget_bytes': lru.budget_bytes,
+                    'evictions': lru.evictions,
+                    'file_count': len(manifest),
+                    'disk_bytes': disk_bytes,
+                }
+
+            stats = dict(self._cache_stats)
 
         return {
-            'hits': self._cache_stats['hits'],
-            'misses': self._cache_stats['misses'],
-            'saves': self._cache_stats['saves'],
-            'hit_rate': self._cache_stats['hits'] / max(1, self._cache_stats['hits'] + self._cache_stats['misses']),
-            'memory_items': len(self._memory_cache),
+            'hits': stats['hits'],
+            'memory_hits': stats['memory_hits'],
+            'disk_hits': stats['disk_hits'],
+            'misses': stats['misses'],
+            'saves': stats['saves'],
+            'hit_rate': stats['hits'] / max(1, stats['hits'] + stats['misses']),
+            'memory_items': sum(ns['memory_items'] for ns in namespaces.values()),
+            'memory_mb': round(sum(ns['memory_bytes'] for ns in namespaces.values()) / 1024 / 1024, 2),
             'file_count': file_count,
-            'total_size_mb': round(total_size / 1024 / 1024, 2)
+            'total_size_mb': round(total_size / 1024 / 1024, 2),
+            'namespaces': namespaces
         }
 
 
 # 全局缓存管理器实例
-cache_manager = CacheManager()
+cache_manager = CacheManager(memory_budgets=parse_memory_budgets(settings.CACHE_MEMORY_BUDGETS_MB))
+atexit.register(cache_manager.flush)
 
 
 def cached(namespace: str = 'default', ttl: int = 3600,
@@ -240,6 +542,16 @@ def cached(namespace: str = 'default', ttl: int = 3600,
             return fetch_from_api(ts_code)
     """
     def decorator(func):
+        # 访问频率交给智能缓存跟踪（延迟导入，cache_strategy 依赖本模块）
+        from .cache_strategy import smart_cache
+        source = f"cache_manager:{namespace}"
+        smart_cache.register_source(source, demote=lambda key: cache_manager.demote(key, namespace))
+
+        def reload(cache_key, args, kwargs):
+            result = func(*args, **kwargs)
+            if result is not None:
+                cache_manager.set(cache_key, result, namespace)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 生成缓存键
@@ -254,6 +566,9 @@ def cached(namespace: str = 'default', ttl: int = 3600,
 
             # 尝试从缓存获取
             cached_data = cache_manager.get(cache_key, namespace, ttl)
+            smart_cache.record_access(source, cache_key, cached_data is not None, ttl,
+                                      loader=lambda: reload(cache_key, args, kwargs),
+                                      stored_at=lambda: cache_manager.stored_at(cache_key, namespace))
             if cached_data is not None:
                 print(f"[缓存命中] {func.__name__}")
                 return cached_data
@@ -0,0 +1,289 @@
+"""
+智能缓存策略
+统一记录 tushare_client、cache_manager 与应用层响应缓存的逐键访问频率（指数衰减计数），
+交易时段内在热点键过期前主动刷新，使高频访问的股票数据常驻缓存；冷键从内存层降级到磁盘。
+命中率、刷新与降级统计供调度器的任务状态展示
+"""
+import logging
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache_manager import cache_manager
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 键提前刷新的时机：剩余有效期不足TTL的该比例时
+REFRESH_AHEAD_RATIO = 0.2
+# 衰减后得分低于该值的键视为冷键（降级），低于FORGET_SCORE时不再跟踪
+COLD_SCORE = 0.5
+FORGET_SCORE = 0.05
+
+
+class _Entry:
+    """单个缓存键的访问记录"""
+
+    __slots__ = ('score', 'touched_at', 'stored_at', 'ttl', 'loader', 'demoted', 'refreshes')
+
+    def __init__(self, ttl: int):
+        self.score = 0.0
+        self.touched_at = time.time()
+        self.stored_at = 0.0  # 最近一次写入时间（未知时为0，视为即将过期）
+        self.ttl = ttl
+        self.loader: Optional[Callable[[], Any]] = None
+        self.demoted = False
+        self.refreshes = 0
+
+
+class SmartCache:
+    """跨缓存层的访问频率跟踪、热点预刷新与冷键降级"""
+
+    def __init__(self, half_life: int = 3600, hot_keys: int = 200, hot_score: float = 2.0,
+                 max_entries: int = 20000):
+        """
+        Args:
+            half_life: 访问得分的半衰期（秒）
+            hot_keys: 每轮最多预刷新的热点键数量
+            hot_score: 参与预刷新的最低得分
+            max_entries: 最多跟踪的键数量，超出时淘汰得分最低的键
+        """
+        self.half_life = half_life
+        self.hot_keys = hot_keys
+        self.hot_score = hot_score
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._demoters: Dict[str, Callable[[str], None]] = {}
+        self._loaders: Dict[Tuple[str, str], Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._source_stats: Dict[str, Dict[str, int]] = {}
+        self._stats = {'refreshes': 0, 'refresh_failures': 0, 'demotions': 0, 'forgotten': 0,
+                       'last_refresh': None, 'last_refresh_seconds': 0.0}
+
+    # ------------------------------------------------------------------ 注册
+
+    def register_source(self, source: str, demote: Optional[Callable[[str], None]] = None) -> None:
+        """
+        注册缓存来源
+
+        Args:
+            source: 来源名（如 tushare / cache_manager:stock / response）
+            demote: 冷键降级函数（接收键），None表示该来源无内存层可降级
+        """
+        if demote is not None:
+            self._demoters[source] = demote
+
+    def register_loader(self, source: str, key: str, loader: Callable[[], Any]) -> None:
+        """为固定键注册刷新函数（应用层响应缓存等无法从访问推断加载方式的来源）"""
+        self._loaders[(source, key)] = loader
+
+    # ------------------------------------------------------------------ 记录
+
+    def _decayed(self, entry: _Entry, now: float) -> float:
+        return entry.score * math.pow(0.5, (now - entry.touched_at) / self.half_life)
+
+    def record_access(self, source: str, key: str, hit: bool, ttl: int = 3600,
+                      loader: Optional[Callable[[], Any]] = None,
+                      stored_at: Optional[Callable[[], Optional[float]]] = None) -> None:
+        """
+        记录一次缓存访问
+
+        Args:
+            source: 来源名
+            key: 缓存键
+            hit: 是否命中
+            ttl: 该键的有效期（秒）
+            loader: 重新加载并写回缓存的函数（未命中后调用方会写入新值，因此未命中同时视为一次写入）
+            stored_at: 返回该键实际写入时间的函数（如文件mtime），首次见到即命中时调用，
+                避免重启后把已有缓存一律视为即将过期
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._source_stats.setdefault(source, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+
+            entry = self._entries.get((source, key))
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self._evict_coldest(now)
+                entry = self._entries[(source, key)] = _Entry(ttl)
+                if hit and stored_at is not None:
+                    try:
+                        entry.stored_at = stored_at() or 0.0
+                    except Exception:
+                        entry.stored_at = 0.0
+            entry.score = self._decayed(entry, now) + 1.0
+            entry.touched_at = now
+            entry.ttl = ttl
+            entry.demoted = False
+            if not hit:
+                entry.stored_at = now
+            if loader is not None:
+                entry.loader = loader
+
+    def _evict_coldest(self, now: float) -> None:
+        """淘汰得分最低的十分之一（持锁调用）"""
+        ranked = sorted(self._entries.items(), key=lambda item: self._decayed(item[1], now))
+        for key, _ in ranked[:max(1, len(ranked) // 10)]:
+            del self._entries[key]
+        self._stats['forgotten'] += max(1, len(ranked) // 10)
+
+    # ------------------------------------------------------------------ 维护
+
+    def hot_entries(self, limit: Optional[int] = None) -> List[Tuple[str, str, float]]:
+        """按衰减得分排序的热点键 [(来源, 键, 得分)]"""
+        now = time.time()
+        with self._lock:
+            ranked = sorted(
+                ((source, key, self._decayed(entry, now)) for (source, key), entry in self._entries.items()),
+                key=lambda item: item[2], reverse=True
+            )
+        return ranked[:limit or self.hot_keys]
+
+    def refresh_hot(self, max_seconds: float = 45.0) -> Dict[str, int]:
+        """
+        预刷新即将过期的热点键（按得分从高到低，最多hot_keys个）
+
+        Args:
+            max_seconds: 本轮刷新的时间上限，超出后剩余键留到下一轮
+
+        Returns:
+            本轮统计 {'candidates', 'refreshed', 'failed'}
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return {'candidates': 0, 'refreshed': 0, 'failed': 0}
+        try:
+            started = now = time.time()
+            with self._lock:
+                candidates = []
+                for (source, key), entry in self._entries.items():
+                    loader = entry.loader or self._loaders.get((source, key))
+                    score = self._decayed(entry, now)
+                    expires_in = entry.stored_at + entry.ttl - now
+                    if loader and score >= self.hot_score and expires_in < entry.ttl * REFRESH_AHEAD_RATIO:
+                        candidates.append((score, source, key, entry, loader))
+            candidates.sort(key=lambda item: item[0], reverse=True)
+            candidates = candidates[:self.hot_keys]
+
+            refreshed = failed = 0
+            for _, source, key, entry, loader in candidates:
+                if time.time() - started > max_seconds:
+                    break
+                try:
+                    loader()
+                    entry.stored_at = time.time()
+                    entry.refreshes += 1
+                    refreshed += 1
+                except Exception as e:
+                    failed += 1
+                    logger.debug(f"预刷新失败 {source}:{key}: {e}")
+
+            with self._lock:
+                self._stats['refreshes'] += refreshed
+                self._stats['refresh_failures'] += failed
+                self._stats['last_refresh'] = time.strftime('%Y-%m-%d %H:%M:%S')
+                self._stats['last_refresh_seconds'] = round(time.time() - started, 2)
+            if refreshed or failed:
+                logger.info(f"热点缓存预刷新: 候选{len(candidates)}个, 成功{refreshed}个, 失败{failed}个")
+            return {'candidates': len(candidates), 'refreshed': refreshed, 'failed': failed}
+        finally:
+            self._refresh_lock.release()
+
+    def demote_cold(self) -> int:
+        """
+        将冷键从内存层降级到磁盘，并停止跟踪长期未访问的键
+
+        Returns:
+            降级的键数量
+        """
+        now = time.time()
+        to_demote = []
+        with self._lock:
+            for (source, key), entry in list(self._entries.items()):
+                score = self._decayed(entry, now)
+                if score < FORGET_SCORE:
+                    del self._entries[(source, key)]
+                    self._stats['forgotten'] += 1
+                elif score < COLD_SCORE and not entry.demoted and source in self._demoters:
+                    entry.demoted = True
+                    to_demote.append((source, key))
+
+        demoted = 0
+        for source, key in to_demote:
+            try:
+                self._demoters[source](key)
+                demoted += 1
+            except Exception as e:
+                logger.debug(f"缓存降级失败 {source}:{key}: {e}")
+        with self._lock:
+            self._stats['demotions'] += demoted
+        return demoted
+
+    def clear_expired(self, max_age: int = 86400) -> Dict[str, int]:
+        """
+        清理过期缓存：cache_manager 过期条目、冷键跟踪记录，以及（SMART_CACHE_DISK_MAX_AGE_DAYS>0 时）
+        tushare 磁盘缓存中长期未更新的文件。tushare过期文件是接口故障时的降级数据来源，默认不清理
+
+        Args:
+            max_age: cache_manager 条目的最大保留时间（秒）
+
+        Returns:
+            各部分清理数量
+        """
+        removed = {'cache_manager': cache_manager.clean_expired(max_age=max_age), 'tushare_files': 0}
+
+        if settings.SMART_CACHE_DISK_MAX_AGE_DAYS > 0:
+            cutoff = time.time() - settings.SMART_CACHE_DISK_MAX_AGE_DAYS * 86400
+            try:
+                from .tushare_client import CACHE_DIR as TUSHARE_CACHE_DIR
+                for path in Path(TUSHARE_CACHE_DIR).glob('*.pkl'):
+                    try:
+                        if path.stat().st_mtime < cutoff:
+                            path.unlink()
+                            removed['tushare_files'] += 1
+                    except OSError:
+                        pass
+            except Exception as e:
+                logger.warning(f"tushare缓存清理失败: {e}")
+
+        removed['demoted'] = self.demote_cold()
+        logger.info(f"过期缓存清理完成: {removed}")
+        return removed
+
+    # ------------------------------------------------------------------ 统计
+
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """命中率、刷新/降级统计与得分最高的键"""
+        with self._lock:
+            sources = {
+                source: {
+                    **stats,
+                    'hit_rate': round(stats['hits'] / max(1, stats['hits'] + stats['misses']), 3),
+                }
+                for source, stats in self._source_stats.items()
+            }
+            tracked = len(self._entries)
+            stats = dict(self._stats)
+        return {
+            **stats,
+            'tracked_keys': tracked,
+            'sources': sources,
+            'hot': [
+                {'source': source, 'key': key, 'score': round(score, 2)}
+                for source, key, score in self.hot_entries(top)
+            ],
+        }
+
+
+smart_cache = SmartCache(
+    half_life=settings.SMART_CACHE_HALF_LIFE,
+    hot_keys=settings.SMART_CACHE_HOT_KEYS,
+)
+
+
+def get_smart_cache() -> SmartCache:
+    """获取全局智能缓存实例"""
+    return smart_cache
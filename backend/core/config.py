@@ -16,6 +16,8 @@ class Settings:
 
     # Tushare配置
     TUSHARE_TOKEN: str = os.getenv("TUSHARE_TOKEN", "")
+    # 账户积分对应的每分钟调用上限（5000积分为500次）
+    TUSHARE_CALLS_PER_MINUTE: int = int(os.getenv("TUSHARE_CALLS_PER_MINUTE", "500"))
 
     # Ollama配置
     OLLAMA_URL: str = os.getenv("OLLAMA_URL", "http://localhost:11434")
@@ -23,6 +25,17 @@ class Settings:
     OLLAMA_NUM_PREDICT: int = int(os.getenv("OLLAMA_NUM_PREDICT", "8192"))
     OLLAMA_TIMEOUT: int = int(os.getenv("OLLAMA_TIMEOUT", "300"))
 
+    # 报告价格预测（非Kronos路径）：ollama / fallback（仅确定性数值预测）
+    PRICE_PREDICTION_PROVIDER: str = os.getenv("PRICE_PREDICTION_PROVIDER", "ollama")
+    PRICE_PREDICTION_MODEL: str = os.getenv("PRICE_PREDICTION_MODEL", OLLAMA_MODEL)
+    # 单次LLM预测请求超时（秒），不超过OLLAMA_TIMEOUT；超时即改用数值预测
+    PRICE_PREDICTION_TIMEOUT: int = min(OLLAMA_TIMEOUT, int(os.getenv("PRICE_PREDICTION_TIMEOUT", "30")))
+    # 批量预测时每个提示包含的股票数
+    PRICE_PREDICTION_BATCH_SIZE: int = int(os.getenv("PRICE_PREDICTION_BATCH_SIZE", "8"))
+    PRICE_PREDICTION_CACHE_TTL: int = int(os.getenv("PRICE_PREDICTION_CACHE_TTL", "86400"))
+    # LLM失败/超时后缓存回退结果的时长（秒），期间同一股票不再等待LLM
+    PRICE_PREDICTION_NEGATIVE_TTL: int = int(os.getenv("PRICE_PREDICTION_NEGATIVE_TTL", "1800"))
+
     # 服务器配置
     SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
     SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8001"))
@@ -40,6 +53,8 @@ class Settings:
     CACHE_TTL_MARKET: int = int(os.getenv("CACHE_TTL_MARKET", "300"))
     CACHE_MAX_SIZE: int = int(os.getenv("CACHE_MAX_SIZE", "1000"))
     CACHE_DIR: Path = BASE_DIR / ".cache"
+    # 各命名空间内存缓存预算（MB），格式: "analysis=64,stock=64,news=16"
+    CACHE_MEMORY_BUDGETS_MB: str = os.getenv("CACHE_MEMORY_BUDGETS_MB", "")
 
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -55,11 +70,56 @@ class Settings:
     MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", "5"))
     REQUEST_TIMEOUT: int = int(os.getenv("REQUEST_TIMEOUT", "180"))
 
+    # SSE流式分析配置
+    STREAM_MAX_JOBS: int = int(os.getenv("STREAM_MAX_JOBS", "8"))
+    STREAM_HEARTBEAT_SECONDS: float = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+    # 批量分析：单次最多股票数、并发分析的股票数、整批截止时间（秒）
+    BATCH_ANALYSIS_MAX_STOCKS: int = int(os.getenv("BATCH_ANALYSIS_MAX_STOCKS", "50"))
+    BATCH_ANALYSIS_WORKERS: int = int(os.getenv("BATCH_ANALYSIS_WORKERS", "4"))
+    BATCH_ANALYSIS_TIMEOUT: int = int(os.getenv("BATCH_ANALYSIS_TIMEOUT", "600"))
+
+    # 智能缓存：访问得分半衰期（秒）、交易时段每轮预刷新的热点键数量
+    SMART_CACHE_HALF_LIFE: int = int(os.getenv("SMART_CACHE_HALF_LIFE", "3600"))
+    SMART_CACHE_HOT_KEYS: int = int(os.getenv("SMART_CACHE_HOT_KEYS", "200"))
+    # tushare磁盘缓存最长保留天数；0表示不清理（过期文件是接口故障时的降级数据来源）
+    SMART_CACHE_DISK_MAX_AGE_DAYS: int = int(os.getenv("SMART_CACHE_DISK_MAX_AGE_DAYS", "0"))
+
+    # 调度器：后台任务线程数（限制后台任务对交互请求的挤占）、交易时段行情刷新的基准/最短/最长间隔（秒）
+    SCHEDULER_MAX_WORKERS: int = int(os.getenv("SCHEDULER_MAX_WORKERS", "2"))
+    MARKET_REFRESH_BASE_SECONDS: int = int(os.getenv("MARKET_REFRESH_BASE_SECONDS", "300"))
+    MARKET_REFRESH_MIN_SECONDS: int = int(os.getenv("MARKET_REFRESH_MIN_SECONDS", "60"))
+    MARKET_REFRESH_MAX_SECONDS: int = int(os.getenv("MARKET_REFRESH_MAX_SECONDS", "900"))
+
+    # 全市场热度/事件表刷新间隔（秒），用于动态缓存TTL
+    MARKET_HEAT_REFRESH_SECONDS: int = int(os.getenv("MARKET_HEAT_REFRESH_SECONDS", "600"))
+
+    # 接口最新数据日期登记表：同一接口两次试探新交易日的最短间隔（秒）
+    DATA_DATE_PROBE_INTERVAL: int = int(os.getenv("DATA_DATE_PROBE_INTERVAL", "600"))
+
+    # 财务报表存储：保留的报告期数量、披露期内报告期的刷新间隔（秒）
+    FINANCIAL_STORE_PERIODS: int = int(os.getenv("FINANCIAL_STORE_PERIODS", "12"))
+    FINANCIAL_STORE_REFRESH_SECONDS: int = int(os.getenv("FINANCIAL_STORE_REFRESH_SECONDS", "43200"))
+
     # Kronos模型配置
     KRONOS_DIR: Path = ROOT_DIR / "Kronos-master"
     KRONOS_TOKENIZER_PATH: str = os.getenv("KRONOS_TOKENIZER_PATH", "NeoQuasar/Kronos-Tokenizer-base")
     KRONOS_MODEL_PATH: str = os.getenv("KRONOS_MODEL_PATH", "NeoQuasar/Kronos-base")
     KRONOS_DEVICE: str = os.getenv("KRONOS_DEVICE", "cpu")  # cpu, cuda:0, mps
+    # CPU推理配置: fp32 / int8（线性层动态量化）/ bf16（autocast）
+    KRONOS_INFERENCE_PROFILE: str = os.getenv("KRONOS_INFERENCE_PROFILE", "fp32")
+    KRONOS_COMPILE: bool = os.getenv("KRONOS_COMPILE", "false").lower() == "true"
+    KRONOS_NUM_THREADS: int = int(os.getenv("KRONOS_NUM_THREADS", "0"))  # 0 = 使用全部可用核心
+    # 启动时后台加载并预热模型；以内存映射方式加载safetensors权重（多worker共享）
+    KRONOS_PRELOAD: bool = os.getenv("KRONOS_PRELOAD", "true").lower() == "true"
+    KRONOS_MMAP_WEIGHTS: bool = os.getenv("KRONOS_MMAP_WEIGHTS", "true").lower() == "true"
+    KRONOS_PREDICTION_CACHE_TTL: int = int(os.getenv("KRONOS_PREDICTION_CACHE_TTL", str(3 * 86400)))
+    KRONOS_PRECOMPUTE_TOP_N: int = int(os.getenv("KRONOS_PRECOMPUTE_TOP_N", "20"))
+    KRONOS_MAX_BATCH_SIZE: int = int(os.getenv("KRONOS_MAX_BATCH_SIZE", "8"))
+    KRONOS_BATCH_WINDOW_MS: int = int(os.getenv("KRONOS_BATCH_WINDOW_MS", "50"))
+    KRONOS_QUEUE_TIMEOUT: float = float(os.getenv("KRONOS_QUEUE_TIMEOUT", "120"))
+    # 多样本预测时默认输出的分位数区间
+    KRONOS_DEFAULT_QUANTILES: str = os.getenv("KRONOS_DEFAULT_QUANTILES", "0.1,0.9")
 
     @classmethod
     def validate(cls) -> bool:
@@ -0,0 +1,110 @@
+"""
+端到端截止时间
+- HTTP请求/分析流程设定总预算，通过 ContextVar 向下传递到各数据阶段、_call_api 与 LLM 调用
+- 子调用的超时取自身默认值与剩余预算的较小者；嵌套作用域只能缩短、不能延长截止时间
+- 截止时间已过或取消信号已置位时，后续调用直接跳过（抛出 DeadlineExceeded），不再占用线程与API配额
+- 线程池中的任务不会自动继承上下文，提交时需使用 contextvars.copy_context().run
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# 剩余预算不足该值（秒）时视为已到期，避免发起注定超时的请求
+MIN_TIMEOUT = 0.5
+
+
+class DeadlineExceeded(TimeoutError):
+    """截止时间已过或流程已取消"""
+
+
+class Deadline:
+    """一个截止时间点及其取消信号"""
+
+    __slots__ = ('expires_at', 'cancel_event', 'label')
+
+    def __init__(self, seconds: float, cancel_event: Optional[threading.Event] = None, label: str = ''):
+        """
+        Args:
+            seconds: 从现在起的预算（秒）
+            cancel_event: 取消信号（如SSE订阅者全部断开），置位即视为到期
+            label: 用于错误信息的名称
+        """
+        self.expires_at = time.time() + seconds
+        self.cancel_event = cancel_event
+        self.label = label
+
+    def remaining(self) -> float:
+        """剩余秒数（已取消时为0）"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return 0.0
+        return max(0.0, self.expires_at - time.time())
+
+    def expired(self) -> bool:
+        return self.remaining() < MIN_TIMEOUT
+
+    def check(self, what: str = '') -> None:
+        """已到期时抛出 DeadlineExceeded"""
+        if self.expired():
+            reason = '已取消' if self.cancel_event is not None and self.cancel_event.is_set() else '已超出截止时间'
+            raise DeadlineExceeded(f"{self.label or '请求'}{reason}，跳过: {what}")
+
+    def timeout(self, default: float) -> float:
+        """子调用的超时：默认值与剩余预算的较小者"""
+        return max(MIN_TIMEOUT, min(default, self.remaining()))
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('deadline', default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前上下文的截止时间（未设定时为None）"""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(seconds: float, cancel_event: Optional[threading.Event] = None,
+                   label: str = '') -> Iterator[Deadline]:
+    """
+    在当前上下文中设定截止时间
+
+    已有外层截止时间时取两者中较早者；未指定取消信号时沿用外层的取消信号
+    """
+    parent = _current.get()
+    deadline = Deadline(seconds, cancel_event, label)
+    if parent is not None:
+        deadline.expires_at = min(deadline.expires_at, parent.expires_at)
+        if deadline.cancel_event is None:
+            deadline.cancel_event = parent.cancel_event
+        deadline.label = deadline.label or parent.label
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def remaining_timeout(default: float, what: str = '') -> float:
+    """
+    子调用应使用的超时（秒）
+
+    Args:
+        default: 调用方自身的默认超时
+        what: 调用描述，到期时写入异常信息
+
+    Raises:
+        DeadlineExceeded: 截止时间已过或已取消
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    deadline.check(what)
+    return deadline.timeout(default)
+
+
+def check_deadline(what: str = '') -> None:
+    """截止时间已过或已取消时抛出 DeadlineExceeded（未设定截止时间时不做任何事）"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(what)
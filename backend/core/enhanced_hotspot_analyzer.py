@@ -14,6 +14,7 @@ from .ths_sector_analysis import (
 )
 from .tushare_client import _call_api, stock_basic
 from .concept_manager import get_concept_manager
+from .stream_hub import PipelineCancelled
 import numpy as np
 
 class EnhancedHotspotAnalyzer:
@@ -23,8 +24,9 @@ class EnhancedHotspotAnalyzer:
         self.concept_mgr = get_concept_manager()
         self.advanced_client = advanced_client
     
-    def comprehensive_hotspot_analysis(self, keyword: str, days: int = 5, progress_callback=None, force: bool = False) -> Dict[str, Any]:
-        """综合热点分析 - 专业级多维度分析（带进度回调和缓存）"""
+    def comprehensive_hotspot_analysis(self, keyword: str, days: int = 5, progress_callback=None, force: bool = False,
+                                       cancel_event=None) -> Dict[str, Any]:
+        """综合热点分析 - 专业级多维度分析（带进度回调和缓存，cancel_event置位时中止）"""
         import hashlib
         from pathlib import Path
 
@@ -94,6 +96,12 @@ class EnhancedHotspotAnalyzer:
             completed_tasks = set()
 
             while len(completed_tasks) < len(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    for future in futures.values():
+                        future.cancel()
+                    print(f"[增强热点] 分析已取消: {keyword}")
+                    raise PipelineCancelled(keyword)
+
                 for key, future in futures.items():
                     if key not in completed_tasks and future.done():
                         try:
@@ -177,7 +185,9 @@ class EnhancedHotspotAnalyzer:
                                 'MACD': stock.get('macd', 0)
                             })
 
-        # 生成LLM智能总结报告
+        # 生成LLM智能总结报告（耗时较长，开始前检查是否已取消）
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled(keyword)
         if progress_callback:
             progress_callback(95, "生成AI智能总结...", {"phase": "generating_summary"})
 
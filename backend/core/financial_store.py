@@ -0,0 +1,423 @@
+"""
+财务报表存储
+- 按报告期调用 VIP 接口（income_vip/balancesheet_vip/cashflow_vip/fina_indicator_vip）一次拉取全市场数据，
+  合并为以 (ts_code, end_date) 为索引的列式表，并持久化到缓存目录
+- 单股报表历史、同比、资产负债率/粗略自由现金流等派生指标均为索引切片与向量化运算，
+  不再逐股请求四张报表、逐行遍历
+- 已过披露截止日的报告期长期有效；仍在披露期内的报告期按 FINANCIAL_STORE_REFRESH_SECONDS 刷新以纳入新公告
+- 请求路径不等待全量加载：数据缺失或过期时在后台线程刷新，调用方回退到逐股接口
+"""
+import logging
+import pickle
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from .cache_manager import _atomic_write
+from .config import settings
+from .tushare_client import AccessDeniedError, _call_api
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE = 'financial_store.pkl'
+DATE_FORMAT = '%Y%m%d'
+# VIP接口单次返回的最大行数，满页时按offset继续翻页
+PAGE_SIZE = 5000
+# 报告期披露截止日（月日，年份偏移）：一季报4月底、半年报8月底、三季报10月底、年报次年4月底
+DISCLOSURE_DEADLINES = {
+    '0331': ('0430', 0),
+    '0630': ('0831', 0),
+    '0930': ('1031', 0),
+    '1231': ('0430', 1),
+}
+# 截止日后仍可能有更正公告，超过该天数后加载的数据视为定稿
+FINAL_GRACE_DAYS = 15
+
+KEY_FIELDS = ['ts_code', 'ann_date', 'end_date', 'update_flag']
+
+# 表名 -> (VIP接口, 额外参数, 数值字段)
+TABLES = {
+    'income': ('income_vip', {'report_type': '1'}, [
+        'revenue', 'total_revenue', 'n_income', 'n_income_attr_p', 'total_profit',
+        'operate_profit', 'basic_eps', 'diluted_eps', 'sell_exp', 'admin_exp', 'fin_exp',
+    ]),
+    'balancesheet': ('balancesheet_vip', {'report_type': '1'}, [
+        'total_assets', 'total_liab', 'money_cap', 'inventories', 'fix_assets', 'goodwill',
+    ]),
+    'cashflow': ('cashflow_vip', {'report_type': '1'}, [
+        'n_cashflow_act', 'procure_fixed_assets', 'c_fr_sale_sg', 'c_paid_goods_s', 'c_paid_to_for_empl',
+    ]),
+    'fina_indicator': ('fina_indicator_vip', {}, [
+        'roe', 'roa', 'grossprofit_margin', 'netprofit_margin', 'asset_turn', 'op_yoy', 'or_yoy',
+        'profit_dedt', 'q_dtprofit', 'q_profit_yoy', 'q_gr_yoy', 'current_ratio', 'quick_ratio', 'debt_to_eqt',
+    ]),
+}
+
+# 基本面摘要使用的同比指标：字段 -> 所在报表
+YOY_FIELDS = {
+    'revenue': 'income',
+    'n_income': 'income',
+    'n_cashflow_act': 'cashflow',
+}
+
+
+def recent_periods(count: int, today: Optional[date] = None) -> List[str]:
+    """
+    最近已结束的若干个报告期（季末日期，降序）
+
+    Args:
+        count: 报告期数量
+        today: 基准日期，默认今天
+    """
+    today = today or date.today()
+    year = today.year
+    periods: List[str] = []
+    while len(periods) < count:
+        for month_day in ('1231', '0930', '0630', '0331'):
+            period = f"{year}{month_day}"
+            if period < today.strftime(DATE_FORMAT) and len(periods) < count:
+                periods.append(period)
+        year -= 1
+    return periods
+
+
+def previous_year_period(periods: pd.Index) -> pd.Index:
+    """同期上年的报告期（YYYYMMDD 减一年；季末日期不涉及闰日）"""
+    return (periods.astype(int) - 10000).astype(str)
+
+
+def _is_final(period: str, loaded_at: float) -> bool:
+    """该报告期数据是否在披露截止日（含宽限期）之后加载，不再需要刷新"""
+    month_day, year_offset = DISCLOSURE_DEADLINES[period[4:]]
+    deadline = datetime.strptime(f"{int(period[:4]) + year_offset}{month_day}", DATE_FORMAT)
+    return datetime.fromtimestamp(loaded_at) >= deadline + timedelta(days=FINAL_GRACE_DAYS)
+
+
+def _derive(table: str, frame: pd.DataFrame) -> pd.DataFrame:
+    """按列计算派生指标"""
+    if table == 'balancesheet' and {'total_assets', 'total_liab'} <= set(frame.columns):
+        assets = frame['total_assets'].where(frame['total_assets'] != 0)
+        frame['debt_ratio'] = frame['total_liab'] / assets
+    elif table == 'cashflow' and {'n_cashflow_act', 'procure_fixed_assets'} <= set(frame.columns):
+        frame['rough_fcf'] = frame['n_cashflow_act'] - frame['procure_fixed_assets']
+    return frame
+
+
+def _to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """转为记录列表，缺失值统一为None"""
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
+
+
+class FinancialStore:
+    """全市场财务报表列式存储"""
+
+    def __init__(self, periods: int = 12, refresh_seconds: int = 43200, path: Optional[str] = None):
+        """
+        Args:
+            periods: 保留的报告期数量（需覆盖同比所需的上年同期）
+            refresh_seconds: 披露期内报告期的刷新间隔（秒）
+            path: 持久化文件路径，默认位于缓存目录
+        """
+        self.periods = periods
+        self.refresh_seconds = refresh_seconds
+        self.path = path or str(settings.CACHE_DIR / STORE_FILE)
+        self._frames: Dict[str, pd.DataFrame] = {}
+        # 表名 -> {报告期: 加载时间戳}
+        self._loaded: Dict[str, Dict[str, float]] = {table: {} for table in TABLES}
+        # 无权限的表 -> 标记时间，刷新间隔内不再重试
+        self._denied: Dict[str, float] = {}
+        self._file_loaded = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------ 持久化
+
+    def _load_file(self) -> None:
+        with self._lock:
+            if self._file_loaded:
+                return
+            self._file_loaded = True
+            try:
+                with open(self.path, 'rb') as f:
+                    data = pickle.load(f)
+                self._frames = data.get('frames', {})
+                for table, periods in data.get('loaded', {}).items():
+                    if table in self._loaded:
+                        self._loaded[table] = dict(periods)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"财务报表存储读取失败，将重新加载: {e}")
+
+    def _save_file(self) -> None:
+        try:
+            settings.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            payload = pickle.dumps({'frames': self._frames, 'loaded': self._loaded},
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            _atomic_write(self.path, payload)
+        except Exception as e:
+            logger.warning(f"财务报表存储保存失败: {e}")
+
+    # ------------------------------------------------------------------ 加载
+
+    def _is_denied(self, table: str, now: Optional[float] = None) -> bool:
+        """该表近期是否因无权限加载失败"""
+        denied_at = self._denied.get(table)
+        return denied_at is not None and (now or time.time()) - denied_at < self.refresh_seconds
+
+    def _stale_periods(self, table: str, now: Optional[float] = None) -> List[str]:
+        """需要(重新)加载的报告期"""
+        now = now or time.time()
+        loaded = self._loaded[table]
+        stale = []
+        for period in recent_periods(self.periods):
+            loaded_at = loaded.get(period)
+            if loaded_at is None or (not _is_final(period, loaded_at) and now - loaded_at >= self.refresh_seconds):
+                stale.append(period)
+        return stale
+
+    def _fetch_period(self, table: str, period: str) -> pd.DataFrame:
+        """分页拉取一个报告期的全市场数据，同一报表多次披露时保留最新一版"""
+        api_name, params, fields = TABLES[table]
+        pages = []
+        offset = 0
+        while True:
+            page = _call_api(api_name, period=period, fields=','.join(KEY_FIELDS + fields),
+                             limit=PAGE_SIZE, offset=offset, **params)
+            if page is None or page.empty:
+                break
+            pages.append(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        if not pages:
+            return pd.DataFrame()
+
+        frame = pd.concat(pages, ignore_index=True)
+        order = [col for col in ('update_flag', 'ann_date') if col in frame.columns]
+        if order:
+            frame = frame.sort_values(order, na_position='first')
+        frame = frame.drop_duplicates(['ts_code', 'end_date'], keep='last')
+        for col in fields:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce') if col in frame.columns else float('nan')
+        frame = _derive(table, frame[['ts_code', 'end_date'] + fields].copy())
+        return frame.set_index(['ts_code', 'end_date'])
+
+    def _merge_period(self, table: str, period: str, frame: pd.DataFrame) -> None:
+        """替换一个报告期的数据并淘汰超出保留范围的报告期"""
+        keep = set(recent_periods(self.periods))
+        current = self._frames.get(table)
+        parts = [frame] if not frame.empty else []
+        if current is not None and not current.empty:
+            end_dates = current.index.get_level_values('end_date')
+            parts.insert(0, current[(end_dates != period) & end_dates.isin(keep)])
+        merged = pd.concat(parts).sort_index() if parts else pd.DataFrame()
+        with self._lock:
+            # 整表替换，读取方拿到的始终是完整的旧表或新表
+            self._frames[table] = merged
+            self._loaded[table] = {p: t for p, t in self._loaded[table].items() if p in keep}
+            self._loaded[table][period] = time.time()
+
+    def refresh(self, force: bool = False) -> Dict[str, Any]:
+        """
+        加载缺失或过期的报告期（阻塞，供后台线程和定时任务调用）
+
+        Args:
+            force: 是否重新加载全部报告期
+
+        Returns:
+            各表本次加载的报告期数与行数
+        """
+        self._load_file()
+        summary: Dict[str, Any] = {}
+        with self._refresh_lock:
+            now = time.time()
+            for table in TABLES:
+                if self._is_denied(table, now):
+                    continue
+                periods = recent_periods(self.periods) if force else self._stale_periods(table, now)
+                rows = 0
+                for period in periods:
+                    try:
+                        frame = self._fetch_period(table, period)
+                    except AccessDeniedError as e:
+                        self._denied[table] = now
+                        self._last_error = str(e)
+                        logger.warning(f"财务报表存储: {TABLES[table][0]} 无权限，改用逐股接口: {e}")
+                        break
+                    except Exception as e:
+                        self._last_error = str(e)
+                        logger.warning(f"财务报表存储: {table} {period} 加载失败: {e}")
+                        continue
+                    self._merge_period(table, period, frame)
+                    rows += len(frame)
+                if periods:
+                    summary[table] = {'periods': len(periods), 'rows': rows}
+            self._last_refresh = time.time()
+            if summary:
+                self._save_file()
+        if summary:
+            logger.info(f"财务报表存储已刷新: {summary}")
+        return summary
+
+    def ensure_fresh(self) -> None:
+        """数据缺失或过期时在后台线程刷新（不阻塞调用方，已有刷新在进行时直接返回）"""
+        self._load_file()
+        if not any(self._stale_periods(table) for table in TABLES if not self._is_denied(table)):
+            return
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self._refresh_quietly, name='financial-store-refresh', daemon=True).start()
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            self._last_error = str(e)
+            logger.warning(f"财务报表存储后台刷新失败: {e}")
+
+    def covers(self, table: str) -> bool:
+        """
+        该表是否可用于单股查询
+
+        除最新报告期（季末后披露很少，可能尚未加载）外的保留报告期均已加载时视为可用
+        """
+        loaded = self._loaded[table]
+        return table in self._frames and all(p in loaded for p in recent_periods(self.periods)[1:])
+
+    # ------------------------------------------------------------------ 查询
+
+    def _stock_frame(self, table: str, ts_code: str) -> Optional[pd.DataFrame]:
+        """单股全部报告期（按end_date升序）；表不可用或无该股票时返回None"""
+        self._load_file()
+        if not self.covers(table):
+            return None
+        frame = self._frames[table]
+        if frame.empty:
+            return None
+        try:
+            return frame.xs(ts_code, level='ts_code')
+        except KeyError:
+            return None
+
+    def history(self, table: str, ts_code: str, n: Optional[int] = None,
+                fields: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        单股报表历史（按end_date降序，end_date为列）
+
+        Args:
+            table: income / balancesheet / cashflow / fina_indicator
+            ts_code: 股票代码
+            n: 最近的报告期数，默认全部
+            fields: 返回的字段，默认全部
+
+        Returns:
+            DataFrame；存储不可用或无该股票时返回None，由调用方回退到逐股接口
+        """
+        stock = self._stock_frame(table, ts_code)
+        if stock is None or stock.empty:
+            return None
+        stock = stock.iloc[::-1]
+        if n is not None:
+            stock = stock.head(n)
+        if fields is not None:
+            stock = stock[[col for col in fields if col in stock.columns]]
+        return stock.reset_index()
+
+    def records(self, table: str, ts_code: str, n: Optional[int] = None,
+                fields: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """同 history，返回记录列表（缺失值为None）"""
+        stock = self.history(table, ts_code, n=n, fields=fields)
+        return None if stock is None else _to_records(stock)
+
+    def yoy(self, table: str, field: str, ts_code: str) -> Optional[pd.Series]:
+        """
+        单股各报告期的同比增速（%，与上年同期比较，按end_date降序）
+
+        Returns:
+            以end_date为索引的Series，上年同期缺失或为0时为NaN；存储不可用时返回None
+        """
+        stock = self._stock_frame(table, ts_code)
+        if stock is None or field not in stock.columns:
+            return None
+        values = stock[field]
+        prior = values.reindex(previous_year_period(values.index))
+        prior.index = values.index
+        prior = prior.where(prior != 0)
+        return ((values - prior) / prior.abs() * 100).iloc[::-1]
+
+    def cross_section_yoy(self, table: str, field: str, period: str) -> Optional[pd.Series]:
+        """
+        某报告期全市场的同比增速（%，以ts_code为索引）
+
+        Returns:
+            Series；该报告期或上年同期未加载时返回None
+        """
+        self._load_file()
+        frame = self._frames.get(table)
+        prior_period = previous_year_period(pd.Index([period]))[0]
+        loaded = self._loaded[table]
+        if frame is None or field not in frame.columns or period not in loaded or prior_period not in loaded:
+            return None
+        try:
+            current = frame.xs(period, level='end_date')[field]
+            prior = frame.xs(prior_period, level='end_date')[field].reindex(current.index)
+        except KeyError:
+            return None
+        prior = prior.where(prior != 0)
+        return (current - prior) / prior.abs() * 100
+
+    def latest_yoy(self, ts_code: str) -> Dict[str, Any]:
+        """
+        基本面摘要使用的同比指标：各字段最近一个有上年同期数据的报告期
+
+        Returns:
+            {字段: {"end_date": 报告期, "value": 同比%}}，无数据的字段不出现
+        """
+        out: Dict[str, Any] = {}
+        for field, table in YOY_FIELDS.items():
+            series = self.yoy(table, field, ts_code)
+            if series is None:
+                continue
+            series = series.dropna()
+            if not series.empty:
+                out[field] = {'end_date': series.index[0], 'value': round(float(series.iloc[0]), 4)}
+        return out
+
+    def get_stats(self) -> Dict[str, Any]:
+        """存储状态"""
+        self._load_file()
+        tables = {}
+        for table in TABLES:
+            frame = self._frames.get(table)
+            loaded = self._loaded[table]
+            tables[table] = {
+                'rows': 0 if frame is None else len(frame),
+                'stocks': 0 if frame is None or frame.empty else frame.index.get_level_values('ts_code').nunique(),
+                'periods': sorted(loaded, reverse=True),
+                'available': self.covers(table),
+                'denied': self._is_denied(table),
+            }
+        return {
+            'tables': tables,
+            'refreshing': self._refresh_lock.locked(),
+            'last_refresh': datetime.fromtimestamp(self._last_refresh).isoformat() if self._last_refresh else None,
+            'last_error': self._last_error,
+        }
+
+
+# 全局实例
+financial_store = FinancialStore(
+    periods=settings.FINANCIAL_STORE_PERIODS,
+    refresh_seconds=settings.FINANCIAL_STORE_REFRESH_SECONDS,
+)
+
+
+def get_financial_store() -> FinancialStore:
+    """获取全局财务报表存储实例"""
+    return financial_store
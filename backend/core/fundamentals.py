@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import datetime as dt
 import pandas as pd
 from .tushare_client import (
@@ -7,11 +7,58 @@ from .tushare_client import (
     # 5000积分VIP接口
     income_vip, balancesheet_vip, cashflow_vip
 )
+from .financial_store import get_financial_store, _derive, _to_records
+
+FINA_INDICATOR_FIELDS = [
+    "end_date",
+    "roe",
+    "roa",
+    "grossprofit_margin",
+    "netprofit_margin",
+    "asset_turn",
+    "op_yoy",
+    "or_yoy",
+    "profit_dedt",
+    "q_dtprofit",
+    "q_profit_yoy",
+    "q_gr_yoy",
+    "current_ratio",  # 新增流动比率
+    "quick_ratio",    # 新增速动比率
+    "debt_to_eqt",    # 新增产权比率
+]
+INCOME_FIELDS = [
+    "end_date", "revenue", "n_income", "n_income_attr_p",
+    "total_profit", "operate_profit", "basic_eps", "diluted_eps",
+    # VIP接口额外字段
+    "total_revenue", "grossprofit_margin", "sell_exp", "admin_exp", "fin_exp"
+]
+
+BALANCE_FIELDS = [
+    "end_date", "total_assets", "total_liab", "debt_ratio",
+    # VIP接口额外数据
+    "money_cap",  # 货币资金
+    "inventories",  # 存货
+    "fix_assets",  # 固定资产
+    "goodwill",  # 商誉
+]
+CASHFLOW_FIELDS = [
+    "end_date", "n_cashflow_act", "procure_fixed_assets", "rough_fcf",
+    # VIP接口额外数据
+    "c_fr_sale_sg",  # 销售商品、提供劳务收到的现金
+    "c_paid_goods_s",  # 购买商品、接受劳务支付的现金
+    "c_paid_to_for_empl",  # 支付给职工以及为职工支付的现金
+]
 
 
 def fetch_fundamentals(ts_code: str, force: bool = False) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
 
+    # 财务报表优先取自全市场批量加载的存储（索引查询），不可用时回退到逐股接口；
+    # 数据缺失或过期时存储在后台刷新，本次请求不等待。强制刷新时直接走逐股接口
+    store = None if force else get_financial_store()
+    if store is not None:
+        store.ensure_fresh()
+
     # 获取每日指标（估值）
     today = dt.date.today().strftime("%Y%m%d")
     db = daily_basic(ts_code=ts_code, force=force)
@@ -60,29 +107,64 @@ def fetch_fundamentals(ts_code: str, force: bool = False) -> Dict[str, Any]:
             "eps": latest_exp.get("eps"),
         }
 
+    fi_records = _from_store(store, "fina_indicator", ts_code, 1, FINA_INDICATOR_FIELDS) \
+        or _fetch_fina_indicator(ts_code, force)
+    if fi_records:
+        out["fina_indicator_latest"] = {k: v for k, v in fi_records[0].items() if v is not None}
+
+    income_recent = _from_store(store, "income", ts_code, 6, INCOME_FIELDS) or _fetch_income(ts_code, force)
+    if income_recent:
+        out["income_recent"] = income_recent
+
+    balance_recent = _from_store(store, "balancesheet", ts_code, None, BALANCE_FIELDS) \
+        or _fetch_balancesheet(ts_code, force)
+    if balance_recent:
+        out["balance_recent"] = balance_recent
+
+    cashflow_recent = _from_store(store, "cashflow", ts_code, None, CASHFLOW_FIELDS) \
+        or _fetch_cashflow(ts_code, force)
+    if cashflow_recent:
+        out["cashflow_recent"] = cashflow_recent
+
+    if store is not None:
+        # 与上年同期比较的同比；逐股接口路径由 insight_builder 按相邻两期估算
+        yoy = store.latest_yoy(ts_code)
+        if yoy:
+            out["yoy"] = yoy
+
+    return out
+
+
+def _from_store(store, table: str, ts_code: str, n: Optional[int], fields: List[str]) -> Optional[List[Dict[str, Any]]]:
+    """从财务报表存储读取单股最近n期（存储不可用或无该股票时返回None）"""
+    if store is None:
+        return None
+    return store.records(table, ts_code, n=n, fields=fields)
+
+
+def _select(df: pd.DataFrame, table: str, fields: List[str], n: Optional[int] = None) -> List[Dict[str, Any]]:
+    """逐股接口结果：按报告期降序，计算派生列并保留存在的字段"""
+    df = df.sort_values("end_date", ascending=False)
+    numeric = [col for col in df.columns if col not in ("ts_code", "ann_date", "f_ann_date", "end_date")]
+    df = df.copy()
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce")
+    df = _derive(table, df)
+    # 只选择存在的列
+    available_cols = [col for col in fields if col in df.columns]
+    df = df[available_cols]
+    if n is not None:
+        df = df.head(n)
+    return _to_records(df)
+
+
+def _fetch_fina_indicator(ts_code: str, force: bool = False) -> List[Dict[str, Any]]:
     fi = fina_indicator(ts_code, force=force)
-    if not fi.empty:
-        fi = fi.sort_values("end_date", ascending=False).reset_index(drop=True)
-        latest = fi.iloc[0].to_dict()
-        keep = [
-            "end_date",
-            "roe",
-            "roa",
-            "grossprofit_margin",
-            "netprofit_margin",
-            "asset_turn",
-            "op_yoy",
-            "or_yoy",
-            "profit_dedt",
-            "q_dtprofit",
-            "q_profit_yoy",
-            "q_gr_yoy",
-            "current_ratio",  # 新增流动比率
-            "quick_ratio",    # 新增速动比率
-            "debt_to_eqt",    # 新增产权比率
-        ]
-        out["fina_indicator_latest"] = {k: latest.get(k) for k in keep if latest.get(k) is not None}
+    if fi.empty:
+        return []
+    return _select(fi, "fina_indicator", FINA_INDICATOR_FIELDS, n=1)
+
 
+def _fetch_income(ts_code: str, force: bool = False) -> List[Dict[str, Any]]:
     # 尝试使用5000积分VIP接口获取更详细的利润表数据
     try:
         inc = income_vip(ts_code=ts_code, force=force)
@@ -91,18 +173,12 @@ def fetch_fundamentals(ts_code: str, force: bool = False) -> Dict[str, Any]:
         print(f"[基本面] VIP接口失败，使用普通接口: {e}")
         inc = income(ts_code, force=force)
 
-    if not inc.empty:
-        inc = inc.sort_values("end_date", ascending=False)
-        cols = [
-            "end_date", "revenue", "n_income", "n_income_attr_p",
-            "total_profit", "operate_profit", "basic_eps", "diluted_eps",
-            # VIP接口额外字段
-            "total_revenue", "grossprofit_margin", "sell_exp", "admin_exp", "fin_exp"
-        ]
-        # 只选择存在的列
-        available_cols = [col for col in cols if col in inc.columns]
-        out["income_recent"] = inc[available_cols].head(6).to_dict(orient="records")
+    if inc.empty:
+        return []
+    return _select(inc, "income", INCOME_FIELDS, n=6)
 
+
+def _fetch_balancesheet(ts_code: str, force: bool = False) -> List[Dict[str, Any]]:
     # 尝试使用5000积分VIP接口获取资产负债表数据
     try:
         bal = balancesheet_vip(ts_code=ts_code, force=force)
@@ -111,32 +187,12 @@ def fetch_fundamentals(ts_code: str, force: bool = False) -> Dict[str, Any]:
         print(f"[基本面] 资产负债表VIP接口失败，使用普通接口: {e}")
         bal = balancesheet(ts_code, force=force)
 
-    if not bal.empty:
-        bal = bal.sort_values("end_date", ascending=False)
-        rows: List[Dict[str, Any]] = []
-        for _, r in bal.iterrows():
-            ta = r.get("total_assets")
-            tl = r.get("total_liab")
-            lev = (
-                float(tl) / float(ta)
-                if pd.notna(ta) and pd.notna(tl) and float(ta) != 0
-                else None
-            )
-            rows.append(
-                {
-                    "end_date": r.get("end_date"),
-                    "total_assets": ta,
-                    "total_liab": tl,
-                    "debt_ratio": lev,
-                    # VIP接口额外数据
-                    "money_cap": r.get("money_cap"),  # 货币资金
-                    "inventories": r.get("inventories"),  # 存货
-                    "fix_assets": r.get("fix_assets"),  # 固定资产
-                    "goodwill": r.get("goodwill"),  # 商誉
-                }
-            )
-        out["balance_recent"] = rows
+    if bal.empty:
+        return []
+    return _select(bal, "balancesheet", BALANCE_FIELDS)
+
 
+def _fetch_cashflow(ts_code: str, force: bool = False) -> List[Dict[str, Any]]:
     # 尝试使用5000积分VIP接口获取现金流量表数据
     try:
         cf = cashflow_vip(ts_code=ts_code, force=force)
@@ -145,29 +201,6 @@ def fetch_fundamentals(ts_code: str, force: bool = False) -> Dict[str, Any]:
         print(f"[基本面] 现金流量表VIP接口失败，使用普通接口: {e}")
         cf = cashflow(ts_code, force=force)
 
-    if not cf.empty:
-        cf = cf.sort_values("end_date", ascending=False)
-        rows: List[Dict[str, Any]] = []
-        for _, r in cf.iterrows():
-            cfo = r.get("n_cashflow_act")
-            capex = r.get("procure_fixed_assets")
-            fcf = (
-                float(cfo) - float(capex) if pd.notna(cfo) and pd.notna(capex) else None
-            )
-            rows.append(
-                {
-                    "end_date": r.get("end_date"),
-                    "n_cashflow_act": cfo,
-                    "procure_fixed_assets": capex,
-                    "rough_fcf": fcf,
-                    # VIP接口额外数据
-                    "c_fr_sale_sg": r.get("c_fr_sale_sg"),  # 销售商品、提供劳务收到的现金
-                    "c_paid_goods_s": r.get("c_paid_goods_s"),  # 购买商品、接受劳务支付的现金
-                    "c_paid_to_for_empl": r.get("c_paid_to_for_empl"),  # 支付给职工以及为职工支付的现金
-                }
-            )
-        out["cashflow_recent"] = rows
-
-    return out
-
-
+    if cf.empty:
+        return []
+    return _select(cf, "cashflow", CASHFLOW_FIELDS)
@@ -103,6 +103,22 @@ class HealthChecker:
         except Exception as e:
             return HealthCheckResult("cache", "unhealthy", f"缓存系统错误: {str(e)}")
     
+    def check_kronos_model(self) -> HealthCheckResult:
+        """检查Kronos预测模型就绪状态"""
+        try:
+            from .kronos_predictor import get_kronos_service, resolve_device
+            readiness = get_kronos_service(device=resolve_device()).get_readiness()
+            status = readiness['status']
+
+            if status == "ready":
+                return HealthCheckResult("kronos", "healthy", "模型已就绪", readiness['load_seconds'] or 0.0)
+            if status == "failed":
+                return HealthCheckResult("kronos", "unhealthy", f"模型加载失败: {readiness['error']}")
+            return HealthCheckResult("kronos", "degraded", f"模型未就绪: {status}")
+
+        except Exception as e:
+            return HealthCheckResult("kronos", "unhealthy", f"模型检查失败: {str(e)}")
+
     def run_all_checks(self) -> Dict[str, Any]:
         """运行所有健康检查"""
         start_time = time.time()
@@ -112,6 +128,11 @@ class HealthChecker:
             self.check_ollama_service(), 
             self.check_cache_system()
         ]
+
+        # 预测模型仅在Kronos可用时检查
+        from .kronos_predictor import is_kronos_available
+        if is_kronos_available():
+            checks.append(self.check_kronos_model())
         
         self.checks = checks
         self.last_check_time = datetime.now()
@@ -38,6 +38,13 @@ def _calc_yoy(records: List[Dict[str, Any]], field: str) -> Optional[float]:
     return (values[0] - values[1]) / abs(values[1]) * 100
 
 
+def _pick_yoy(same_period_yoy: Dict[str, Any], records: List[Dict[str, Any]], field: str) -> Optional[float]:
+    entry = same_period_yoy.get(field)
+    if entry and entry.get("value") is not None:
+        return entry["value"]
+    return _calc_yoy(records, field) if records else None
+
+
 def _latest_record(records: List[Dict[str, Any]], *fields: str) -> Dict[str, Any]:
     if not records:
         return {}
@@ -118,9 +125,11 @@ def build_stock_insights(payload: Dict[str, Any]) -> Dict[str, Any]:
     if valuation.get("ps_ttm"):
         fundamental_points.append(f"PS(TTM)：{_fmt_number(valuation['ps_ttm'], 2)}倍")
 
-    revenue_yoy = _calc_yoy(income_recent, "revenue") if income_recent else None
-    profit_yoy = _calc_yoy(income_recent, "n_income") if income_recent else None
-    cashflow_yoy = _calc_yoy(cashflow_recent, "n_cashflow_act") if cashflow_recent else None
+    # 优先使用财务报表存储按上年同期计算的同比，缺失时按最近两期估算
+    same_period_yoy = fundamental.get("yoy", {})
+    revenue_yoy = _pick_yoy(same_period_yoy, income_recent, "revenue")
+    profit_yoy = _pick_yoy(same_period_yoy, income_recent, "n_income")
+    cashflow_yoy = _pick_yoy(same_period_yoy, cashflow_recent, "n_cashflow_act")
 
     growth_points: List[str] = []
     if revenue_yoy is not None:
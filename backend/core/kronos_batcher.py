@@ -0,0 +1,187 @@
+"""
+Kronos推理微批处理模块
+在短时间窗口内收集并发的预测请求，按分组键合并为一次批量推理，再将结果分发回各调用方。
+模型只在单个工作线程中运行，避免多个请求线程同时抢占CPU/GPU
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# run_batch(group_key, payloads) -> 与payloads一一对应的结果列表
+BatchRunner = Callable[[Hashable, List[Any]], List[Any]]
+
+
+class QueueDeadlineExceeded(TimeoutError):
+    """请求在队列中等待超过截止时间，未被执行"""
+
+
+class _PendingRequest:
+    """队列中等待批处理的单个请求"""
+
+    __slots__ = ('group_key', 'payload', 'future', 'enqueued_at', 'deadline')
+
+    def __init__(self, group_key: Hashable, payload: Any, deadline: float):
+        self.group_key = group_key
+        self.payload = payload
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+
+
+class MicroBatchWorker:
+    """动态微批处理工作线程"""
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: int = 8,
+        batch_window: float = 0.05,
+        queue_timeout: float = 60.0,
+        name: str = "kronos-batcher"
+    ):
+        """
+        Args:
+            run_batch: 批量执行函数，接收分组键和请求载荷列表，返回等长结果列表
+            max_batch_size: 单批最大请求数
+            batch_window: 收到第一个请求后继续等待合批的时间（秒）
+            queue_timeout: 请求在队列中的最长等待时间（秒），超时直接失败
+            name: 工作线程名
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = batch_window
+        self.queue_timeout = queue_timeout
+        self.name = name
+
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        # 已出队但因分组不同尚未执行的请求
+        self._carry: List[_PendingRequest] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'batched_requests': 0,
+            'max_batch': 0,
+            'expired': 0,
+            'failed': 0,
+        }
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, group_key: Hashable, payload: Any) -> Future:
+        """
+        提交请求
+
+        Args:
+            group_key: 分组键，只有分组键相同的请求才会合并为一批
+            payload: 传给run_batch的请求载荷
+
+        Returns:
+            Future，结果为run_batch返回的对应元素
+        """
+        self._ensure_running()
+        request = _PendingRequest(group_key, payload, time.monotonic() + self.queue_timeout)
+        with self._lock:
+            self._stats['requests'] += 1
+        self._queue.put(request)
+        return request.future
+
+    def run(self, group_key: Hashable, payload: Any, timeout: Optional[float] = None) -> Any:
+        """提交请求并阻塞等待结果"""
+        return self.submit(group_key, payload).result(timeout=timeout)
+
+    # ------------------------------------------------------------------ 工作线程
+
+    def _next_request(self, timeout: Optional[float]) -> Optional[_PendingRequest]:
+        if self._carry:
+            return self._carry.pop(0)
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        """以第一个请求的分组键为准，在窗口期内收集同组请求"""
+        first = self._next_request(timeout=None)
+        batch = [first]
+        window_end = time.monotonic() + self.batch_window
+
+        # 先从上一轮遗留的请求中取同组的
+        remaining = []
+        for req in self._carry:
+            if req.group_key == first.group_key and len(batch) < self.max_batch_size:
+                batch.append(req)
+            else:
+                remaining.append(req)
+        self._carry = remaining
+
+        while len(batch) < self.max_batch_size:
+            wait = window_end - time.monotonic()
+            if wait <= 0:
+                break
+            try:
+                req = self._queue.get(timeout=wait)
+            except queue.Empty:
+                break
+            if req.group_key == first.group_key:
+                batch.append(req)
+            else:
+                self._carry.append(req)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect_batch()
+
+            now = time.monotonic()
+            live = []
+            for req in batch:
+                if now > req.deadline:
+                    req.future.set_exception(QueueDeadlineExceeded(
+                        f"排队超时（等待{now - req.enqueued_at:.1f}秒）"))
+                    with self._lock:
+                        self._stats['expired'] += 1
+                elif req.future.set_running_or_notify_cancel():
+                    live.append(req)
+            if not live:
+                continue
+
+            group_key = live[0].group_key
+            started = time.monotonic()
+            try:
+                results = self.run_batch(group_key, [req.payload for req in live])
+                if len(results) != len(live):
+                    raise RuntimeError(f"批量结果数量({len(results)})与请求数量({len(live)})不一致")
+                for req, result in zip(live, results):
+                    req.future.set_result(result)
+            except Exception as e:
+                logger.error(f"批量推理失败 {group_key}: {e}", exc_info=True)
+                with self._lock:
+                    self._stats['failed'] += len(live)
+                for req in live:
+                    req.future.set_exception(e)
+
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['batched_requests'] += len(live)
+                self._stats['max_batch'] = max(self._stats['max_batch'], len(live))
+            logger.info(f"批量推理完成: 分组={group_key}, 批大小={len(live)}, "
+                        f"耗时={time.monotonic() - started:.2f}秒")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取批处理统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize() + len(self._carry)
+        stats['avg_batch_size'] = round(stats['batched_requests'] / max(1, stats['batches']), 2)
+        return stats
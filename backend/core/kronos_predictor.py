@@ -5,11 +5,13 @@ Kronos K线预测服务模块
 import sys
 import os
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import logging
+import threading
+import time
 
 # 添加Kronos模块路径
 KRONOS_PATH = Path(__file__).parent.parent.parent / "Kronos-master"
@@ -21,10 +23,12 @@ if not KRONOS_PATH.exists():
     Kronos = None
     KronosTokenizer = None
     KronosPredictor = None
+    apply_inference_profile = None
 else:
     sys.path.insert(0, str(KRONOS_PATH))
     try:
         from model import Kronos, KronosTokenizer, KronosPredictor
+        from model.inference_profile import apply_inference_profile
         logging.info(f"Kronos model loaded successfully from {KRONOS_PATH}")
     except ImportError as e:
         logging.error(f"Failed to import Kronos model: {e}")
@@ -32,11 +36,38 @@ else:
         Kronos = None
         KronosTokenizer = None
         KronosPredictor = None
+        apply_inference_profile = None
 
 from .tushare_client import daily
+from .price_series import PriceSeries
+from .kronos_batcher import MicroBatchWorker
+from .prediction_cache import prediction_cache, bars_fingerprint
+from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# 预测结果载荷中输出的K线字段
+PAYLOAD_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def parse_quantiles(spec: str) -> List[float]:
+    """
+    解析分位数配置，如 "0.1,0.9"
+
+    Args:
+        spec: 逗号分隔的分位数字符串
+
+    Returns:
+        分位数列表（忽略无法解析的项）
+    """
+    quantiles = []
+    for part in (spec or '').split(','):
+        try:
+            quantiles.append(float(part))
+        except ValueError:
+            continue
+    return quantiles
+
 
 def is_kronos_available() -> bool:
     """
@@ -63,11 +94,26 @@ class KronosPredictorService:
         self.tokenizer = None
         self.predictor = None
         self._initialized = False
+        self._load_lock = threading.Lock()
+
+        # 就绪状态: not_loaded / loading / warming_up / ready / failed
+        self.status = "not_loaded"
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+
+        # 推理微批处理：并发请求在短窗口内合并为一次批量推理
+        self.batcher = MicroBatchWorker(
+            self._run_batch,
+            max_batch_size=settings.KRONOS_MAX_BATCH_SIZE,
+            batch_window=settings.KRONOS_BATCH_WINDOW_MS / 1000.0,
+            queue_timeout=settings.KRONOS_QUEUE_TIMEOUT
+        )
 
         # 模型路径配置 - 使用HuggingFace Hub或本地路径
         # 优先使用HuggingFace Hub上的预训练模型
-        self.tokenizer_path = "NeoQuasar/Kronos-Tokenizer-base"
-        self.model_path = "NeoQuasar/Kronos-base"
+        self.tokenizer_path = settings.KRONOS_TOKENIZER_PATH
+        self.model_path = settings.KRONOS_MODEL_PATH
 
         logger.info(f"KronosPredictorService initialized with device: {device}")
 
@@ -76,6 +122,23 @@ class KronosPredictorService:
         if self._initialized:
             return
 
+        with self._load_lock:
+            if self._initialized:
+                return
+            self._load()
+
+    def _load_weights(self, model_cls, path: str):
+        """加载权重：优先内存映射safetensors（多worker共享物理内存），失败时回退from_pretrained"""
+        if settings.KRONOS_MMAP_WEIGHTS:
+            try:
+                from .mmap_weights import load_pretrained_mmap
+                return load_pretrained_mmap(model_cls, path)
+            except Exception as e:
+                logger.warning(f"Memory-mapped loading failed for {path}, falling back to from_pretrained: {e}")
+        return model_cls.from_pretrained(path)
+
+    def _load(self):
+        """加载tokenizer和模型（调用方需持有 _load_lock）"""
         if not is_kronos_available():
             raise RuntimeError(
                 "Kronos模型未正确安装或Kronos-master目录不存在。\n"
@@ -85,28 +148,142 @@ class KronosPredictorService:
                 "预测功能将不可用。"
             )
 
+        self.status = "loading"
+        started = time.time()
         try:
             logger.info("Loading Kronos tokenizer...")
-            self.tokenizer = KronosTokenizer.from_pretrained(self.tokenizer_path)
+            self.tokenizer = self._load_weights(KronosTokenizer, self.tokenizer_path)
 
             logger.info("Loading Kronos model...")
-            self.model = Kronos.from_pretrained(self.model_path)
+            self.model = self._load_weights(Kronos, self.model_path)
+
+            autocast_dtype = None
+            if self.device == "cpu":
+                # CPU推理配置：int8动态量化 / bf16 autocast / 编译解码步骤 / 固定线程数
+                logger.info(f"Applying CPU inference profile: {settings.KRONOS_INFERENCE_PROFILE}, "
+                            f"compile={settings.KRONOS_COMPILE}, threads={settings.KRONOS_NUM_THREADS or 'auto'}")
+                self.model, self.tokenizer, autocast_dtype = apply_inference_profile(
+                    self.model,
+                    self.tokenizer,
+                    profile=settings.KRONOS_INFERENCE_PROFILE,
+                    compile=settings.KRONOS_COMPILE,
+                    num_threads=settings.KRONOS_NUM_THREADS
+                )
 
             logger.info("Creating Kronos predictor...")
             self.predictor = KronosPredictor(
                 self.model,
                 self.tokenizer,
                 device=self.device,
-                max_context=512
+                max_context=512,
+                autocast_dtype=autocast_dtype
             )
 
             self._initialized = True
-            logger.info("Kronos model loaded successfully")
+            self.load_seconds = round(time.time() - started, 2)
+            self.status = "ready"
+            logger.info(f"Kronos model loaded successfully in {self.load_seconds}s")
 
         except Exception as e:
+            self.status = "failed"
+            self.load_error = str(e)
             logger.error(f"Failed to load Kronos model: {e}")
             raise RuntimeError(f"Kronos模型加载失败: {str(e)}")
 
+    def warm_up(self, lookback: int = 400, pred_len: int = 5):
+        """
+        用合成序列执行一次推理，提前完成首次调用开销（算子初始化、内存分配、编译等）
+
+        Args:
+            lookback: 合成历史长度
+            pred_len: 预测步数
+        """
+        rng = np.random.default_rng(0)
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.01, lookback)))
+        open_ = close * (1 + rng.normal(0, 0.003, lookback))
+        x_df = pd.DataFrame({
+            'open': open_,
+            'high': np.maximum(open_, close) * 1.01,
+            'low': np.minimum(open_, close) * 0.99,
+            'close': close,
+            'volume': rng.uniform(1e6, 5e6, lookback),
+            'amount': rng.uniform(1e7, 5e7, lookback),
+        })
+        dates = pd.bdate_range(end=datetime.now().date(), periods=lookback + pred_len)
+        inputs = {
+            'ts_code': '__warmup__',
+            'x_df': x_df,
+            'x_timestamp': pd.Series(dates[:lookback]),
+            'y_timestamp': pd.Series(dates[lookback:]),
+        }
+        started = time.time()
+        # 经由批处理线程执行，避免与并发到达的请求同时使用模型内部缓存
+        self._infer(inputs, pred_len=pred_len, T=1.0, top_p=0.9, sample_count=1)
+        self.warmup_seconds = round(time.time() - started, 2)
+        logger.info(f"Kronos warm-up finished in {self.warmup_seconds}s")
+
+    def startup_load(self):
+        """启动时加载模型并预热（在后台线程中运行，完成后 status 置为 ready）"""
+        try:
+            with self._load_lock:
+                if not self._initialized:
+                    self._load()
+                self.status = "warming_up"
+                try:
+                    self.warm_up()
+                except Exception as e:
+                    # 预热失败不影响模型可用
+                    logger.warning(f"Kronos warm-up failed: {e}")
+                self.status = "ready"
+        except Exception as e:
+            logger.error(f"Kronos startup load failed: {e}")
+
+    def start_background_load(self) -> threading.Thread:
+        """在后台线程中启动加载与预热"""
+        thread = threading.Thread(target=self.startup_load, name="kronos-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """获取模型就绪状态"""
+        return {
+            'ready': self.status == "ready",
+            'status': self.status,
+            'device': self.device,
+            'model': self.model_path,
+            'mmap_weights': settings.KRONOS_MMAP_WEIGHTS,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'error': self.load_error,
+        }
+
+    @property
+    def model_version(self) -> str:
+        """模型版本标识（权重路径 + 推理配置），作为预测缓存键的一部分"""
+        profile = settings.KRONOS_INFERENCE_PROFILE if self.device == "cpu" else self.device
+        return f"{self.tokenizer_path}|{self.model_path}|{profile}"
+
+    def _cache_key(self, inputs: Dict[str, Any], pred_len: int, lookback: int, T: float,
+                   top_p: float, sample_count: int, quantiles: Tuple[float, ...] = ()) -> str:
+        return prediction_cache.make_key(
+            inputs['ts_code'], inputs['fingerprint'], pred_len, lookback, T, top_p, sample_count,
+            self.model_version, quantiles
+        )
+
+    @staticmethod
+    def _resolve_quantiles(quantiles: Optional[List[float]], sample_count: int) -> Tuple[float, ...]:
+        """
+        整理分位数参数：未指定时使用配置默认值；单样本无法估计分布，不输出区间
+
+        Returns:
+            升序去重的分位数元组
+        """
+        if sample_count <= 1:
+            return ()
+        if quantiles is None:
+            quantiles = parse_quantiles(settings.KRONOS_DEFAULT_QUANTILES)
+        return tuple(sorted({round(float(q), 4) for q in quantiles if 0 < q < 1}))
+
     def fetch_kline_data(
         self,
         ts_code: str,
@@ -167,6 +344,133 @@ class KronosPredictorService:
             logger.error(f"Error fetching data for {ts_code}: {e}")
             return None
 
+    def _prepare_inputs(
+        self,
+        ts_code: str,
+        pred_len: int,
+        lookback: int,
+        end_date: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取历史数据并生成预测输入（在调用方线程中执行，不占用推理线程）
+
+        Returns:
+            包含 df / x_df / x_timestamp / y_timestamp 的字典，数据不足时返回None
+        """
+        df = self.fetch_kline_data(ts_code, lookback, end_date)
+        if df is None or len(df) < 50:
+            logger.error(f"Insufficient data for {ts_code}")
+            return None
+
+        x_timestamp = df['timestamps']
+
+        # 生成未来日期序列（仅工作日）
+        last_date = x_timestamp.iloc[-1]
+        future_dates = []
+        current_date = last_date
+
+        while len(future_dates) < pred_len:
+            current_date += timedelta(days=1)
+            # 跳过周末
+            if current_date.weekday() < 5:  # 0-4代表周一到周五
+                future_dates.append(current_date)
+
+        x_df = df[['open', 'high', 'low', 'close', 'volume', 'amount']]
+        return {
+            'ts_code': ts_code,
+            'df': df,
+            'x_df': x_df,
+            'x_timestamp': x_timestamp,
+            'y_timestamp': pd.Series(future_dates),
+            'fingerprint': bars_fingerprint(x_df, x_timestamp),
+            'slot': prediction_cache.make_slot(lookback, end_date),
+        }
+
+    def _run_batch(self, group_key: tuple, items: List[Dict[str, Any]]) -> List[Tuple[pd.DataFrame, Dict]]:
+        """
+        批处理工作线程回调：同组请求合并为一次 KronosPredictor.predict_batch 调用
+
+        Args:
+            group_key: (pred_len, T, top_p, sample_count, quantiles)
+            items: _prepare_inputs 生成的输入列表
+
+        Returns:
+            与items一一对应的 (预测均值DataFrame, {分位数: DataFrame}) 列表
+        """
+        pred_len, T, top_p, sample_count, quantiles = group_key
+        # 多个样本在模型内共享编码与前缀计算，一次解码得到全部样本
+        quantiles = list(quantiles) or None
+        if len(items) == 1:
+            item = items[0]
+            outputs = [self.predictor.predict(
+                df=item['x_df'],
+                x_timestamp=item['x_timestamp'],
+                y_timestamp=item['y_timestamp'],
+                pred_len=pred_len,
+                T=T,
+                top_p=top_p,
+                sample_count=sample_count,
+                verbose=False,
+                quantiles=quantiles
+            )]
+        else:
+            outputs = self.predictor.predict_batch(
+                df_list=[item['x_df'] for item in items],
+                x_timestamp_list=[item['x_timestamp'] for item in items],
+                y_timestamp_list=[item['y_timestamp'] for item in items],
+                pred_len=pred_len,
+                T=T,
+                top_p=top_p,
+                sample_count=sample_count,
+                verbose=False,
+                quantiles=quantiles
+            )
+
+        if quantiles is None:
+            return [(pred_df, {}) for pred_df in outputs]
+        return outputs
+
+    def _infer(self, inputs: Dict[str, Any], pred_len: int, T: float, top_p: float,
+               sample_count: int, quantiles: Tuple[float, ...] = ()) -> Tuple[pd.DataFrame, Dict]:
+        """提交到批处理线程并等待结果"""
+        # 历史长度不同的序列（次新股、停牌股）在批内左侧补齐并以padding mask屏蔽
+        group_key = (pred_len, T, top_p, sample_count, quantiles)
+        future = self.batcher.submit(group_key, inputs)
+        return future.result(timeout=settings.KRONOS_QUEUE_TIMEOUT + settings.REQUEST_TIMEOUT)
+
+    def _build_result(self, inputs: Dict[str, Any], pred_df: pd.DataFrame, pred_len: int,
+                      lookback: int, T: float, top_p: float, sample_count: int,
+                      bands: Optional[Dict[float, pd.DataFrame]] = None) -> Dict[str, Any]:
+        """组织返回结果（列式载荷：dates + 每字段并行数组）"""
+        dates = inputs['y_timestamp'].dt.strftime('%Y-%m-%d').tolist()
+        result = {
+            'ts_code': inputs['ts_code'],
+            'prediction_date': datetime.now().isoformat(),
+            'historical_data': PriceSeries.from_frame(
+                inputs['df'], date_col='timestamps', fields=PAYLOAD_FIELDS, date_format='%Y-%m-%d'
+            ).to_columns(),
+            'predicted_data': PriceSeries(
+                dates, {name: pred_df[name].to_numpy() for name in PAYLOAD_FIELDS}
+            ).to_columns(),
+            'parameters': {
+                'lookback': lookback,
+                'pred_len': pred_len,
+                'temperature': T,
+                'top_p': top_p,
+                'sample_count': sample_count,
+            }
+        }
+        if bands:
+            # 各采样路径逐点的分位数，构成预测区间（如 q10 / q90）
+            result['quantiles'] = sorted(bands)
+            result['quantile_bands'] = {
+                f"q{int(round(q * 100)):02d}": PriceSeries(
+                    dates, {name: band_df[name].to_numpy() for name in PAYLOAD_FIELDS}
+                ).to_columns()
+                for q, band_df in sorted(bands.items())
+            }
+        return result
+
     def predict_kline(
         self,
         ts_code: str,
@@ -175,11 +479,16 @@ class KronosPredictorService:
         T: float = 1.0,
         top_p: float = 0.9,
         sample_count: int = 3,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        use_cache: bool = True,
+        quantiles: Optional[List[float]] = None,
+        track_view: bool = True
     ) -> Optional[Dict[str, Any]]:
         """
         预测K线数据
 
+        输入K线与参数均未变化时直接返回缓存结果；并发请求会在批处理线程中合并为一次批量推理
+
         Args:
             ts_code: 股票代码
             pred_len: 预测未来的天数
@@ -188,78 +497,37 @@ class KronosPredictorService:
             top_p: Nucleus采样概率（建议0.9-1.0）
             sample_count: 样本数量（建议2-3）
             end_date: 结束日期（YYYYMMDD格式）
+            use_cache: 是否使用预测结果缓存
+            quantiles: 输出的预测区间分位数（如 [0.1, 0.9]），默认取配置；sample_count=1 时不输出
+            track_view: 是否计入访问统计（报告图表等内部调用传False）
 
         Returns:
-            预测结果字典，包含历史数据和预测数据
+            预测结果字典，包含历史数据、预测数据（样本均值）和分位数区间
         """
-        # 延迟加载模型
-        self._lazy_load()
+        if track_view:
+            prediction_cache.record_view(ts_code)
+        quantiles = self._resolve_quantiles(quantiles, sample_count)
 
         # 获取历史K线数据
-        df = self.fetch_kline_data(ts_code, lookback, end_date)
-        if df is None or len(df) < 50:
-            logger.error(f"Insufficient data for {ts_code}")
+        inputs = self._prepare_inputs(ts_code, pred_len, lookback, end_date)
+        if inputs is None:
             return None
 
-        try:
-            # 准备预测输入
-            x_df = df[['open', 'high', 'low', 'close', 'volume', 'amount']]
-            x_timestamp = df['timestamps']
-
-            # 生成未来日期序列（仅工作日）
-            last_date = x_timestamp.iloc[-1]
-            future_dates = []
-            current_date = last_date
-
-            while len(future_dates) < pred_len:
-                current_date += timedelta(days=1)
-                # 跳过周末
-                if current_date.weekday() < 5:  # 0-4代表周一到周五
-                    future_dates.append(current_date)
+        cache_key = self._cache_key(inputs, pred_len, lookback, T, top_p, sample_count, quantiles)
+        if use_cache:
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Prediction cache hit for {ts_code}")
+                return cached
 
-            y_timestamp = pd.Series(future_dates)
+        # 延迟加载模型
+        self._lazy_load()
 
-            # 执行预测
+        try:
             logger.info(f"Predicting {pred_len} days for {ts_code}...")
-            pred_df = self.predictor.predict(
-                df=x_df,
-                x_timestamp=x_timestamp,
-                y_timestamp=y_timestamp,
-                pred_len=pred_len,
-                T=T,
-                top_p=top_p,
-                sample_count=sample_count,
-                verbose=True
-            )
-
-            # 组织返回结果
-            result = {
-                'ts_code': ts_code,
-                'prediction_date': datetime.now().isoformat(),
-                'historical_data': {
-                    'dates': x_timestamp.dt.strftime('%Y-%m-%d').tolist(),
-                    'open': x_df['open'].tolist(),
-                    'high': x_df['high'].tolist(),
-                    'low': x_df['low'].tolist(),
-                    'close': x_df['close'].tolist(),
-                    'volume': x_df['volume'].tolist(),
-                },
-                'predicted_data': {
-                    'dates': y_timestamp.dt.strftime('%Y-%m-%d').tolist(),
-                    'open': pred_df['open'].tolist(),
-                    'high': pred_df['high'].tolist(),
-                    'low': pred_df['low'].tolist(),
-                    'close': pred_df['close'].tolist(),
-                    'volume': pred_df['volume'].tolist(),
-                },
-                'parameters': {
-                    'lookback': lookback,
-                    'pred_len': pred_len,
-                    'temperature': T,
-                    'top_p': top_p,
-                    'sample_count': sample_count,
-                }
-            }
+            pred_df, bands = self._infer(inputs, pred_len, T, top_p, sample_count, quantiles)
+            result = self._build_result(inputs, pred_df, pred_len, lookback, T, top_p, sample_count, bands)
+            prediction_cache.put(ts_code, inputs['fingerprint'], cache_key, result, slot=inputs['slot'])
 
             logger.info(f"Prediction completed for {ts_code}")
             return result
@@ -272,27 +540,106 @@ class KronosPredictorService:
         self,
         ts_codes: List[str],
         pred_len: int = 30,
-        **kwargs
+        lookback: int = 400,
+        T: float = 1.0,
+        top_p: float = 0.9,
+        sample_count: int = 3,
+        end_date: Optional[str] = None,
+        use_cache: bool = True,
+        quantiles: Optional[List[float]] = None
     ) -> Dict[str, Any]:
         """
         批量预测多只股票
 
+        先获取全部历史数据，命中缓存的直接返回，其余一次性提交给批处理线程合并推理
+
         Args:
             ts_codes: 股票代码列表
             pred_len: 预测天数
-            **kwargs: 其他预测参数
+            lookback: 回看天数
+            T: 温度参数
+            top_p: Nucleus采样概率
+            sample_count: 样本数量
+            end_date: 结束日期（YYYYMMDD格式）
+            use_cache: 是否使用预测结果缓存
+            quantiles: 输出的预测区间分位数
 
         Returns:
             批量预测结果字典
         """
+        quantiles = self._resolve_quantiles(quantiles, sample_count)
         results = {}
+        pending = []
         for ts_code in ts_codes:
-            result = self.predict_kline(ts_code, pred_len=pred_len, **kwargs)
-            if result:
+            inputs = self._prepare_inputs(ts_code, pred_len, lookback, end_date)
+            if inputs is None:
+                continue
+            if use_cache:
+                cached = prediction_cache.get(
+                    self._cache_key(inputs, pred_len, lookback, T, top_p, sample_count, quantiles))
+                if cached is not None:
+                    results[ts_code] = cached
+                    continue
+            if not pending:
+                self._lazy_load()
+            group_key = (pred_len, T, top_p, sample_count, quantiles)
+            pending.append((inputs, self.batcher.submit(group_key, inputs)))
+
+        for inputs, future in pending:
+            ts_code = inputs['ts_code']
+            try:
+                pred_df, bands = future.result(timeout=settings.KRONOS_QUEUE_TIMEOUT + settings.REQUEST_TIMEOUT)
+                result = self._build_result(inputs, pred_df, pred_len, lookback, T, top_p, sample_count, bands)
+                prediction_cache.put(ts_code, inputs['fingerprint'],
+                                     self._cache_key(inputs, pred_len, lookback, T, top_p, sample_count, quantiles),
+                                     result, slot=inputs['slot'])
                 results[ts_code] = result
+            except Exception as e:
+                logger.error(f"Prediction failed for {ts_code}: {e}")
 
         return results
 
+    def precompute_popular(self, top_n: int = 20, **kwargs) -> Dict[str, Any]:
+        """
+        预计算近期访问最多的股票（收盘后调用，使用接口默认参数）
+
+        Args:
+            top_n: 预计算的股票数量
+            **kwargs: 预测参数（pred_len/lookback/T/top_p/sample_count/quantiles）
+
+        Returns:
+            {"requested": 股票数, "completed": 成功数}
+        """
+        ts_codes = prediction_cache.top_viewed(top_n)
+        if not ts_codes:
+            return {'requested': 0, 'completed': 0}
+
+        logger.info(f"Precomputing predictions for {len(ts_codes)} popular stocks")
+        results = self.predict_batch(ts_codes, **kwargs)
+        return {'requested': len(ts_codes), 'completed': len(results)}
+
+    def get_batch_stats(self) -> Dict[str, Any]:
+        """获取推理批处理统计"""
+        return self.batcher.get_stats()
+
+
+def resolve_device() -> str:
+    """
+    选择推理设备：KRONOS_DEVICE 显式配置优先，否则按 CUDA -> MPS -> CPU 自动检测
+
+    Returns:
+        设备字符串
+    """
+    if os.getenv("KRONOS_DEVICE"):
+        return settings.KRONOS_DEVICE
+
+    import torch
+    if torch.cuda.is_available():
+        return "cuda:0"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
 
 # 全局单例
 _kronos_service: Optional[KronosPredictorService] = None
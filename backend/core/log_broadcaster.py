@@ -0,0 +1,335 @@
+"""
+日志广播模块
+单个后台线程跟随日志文件（Linux下使用inotify，其它平台回退为轮询），
+处理日志轮转，并将新增行分发给所有SSE订阅者（每个订阅者一个有界缓冲区）
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+_IN_MODIFY = 0x00000002
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def tail_lines(path: Path, n: int, block_size: int = 8192) -> List[str]:
+    """
+    从文件末尾反向分块读取最后n行，只读取所需的字节
+
+    Args:
+        path: 文件路径
+        n: 行数
+        block_size: 每次反向读取的块大小
+
+    Returns:
+        最后n行（不含换行符）
+    """
+    return _tail(path, n, block_size)[0]
+
+
+def _tail(path: Path, n: int, block_size: int = 8192) -> Tuple[List[str], Optional[int], int]:
+    """
+    读取最后n个完整行，并返回文件inode与最后一个换行符之后的偏移
+
+    末尾尚未写完的半行不计入（由跟随线程在写完后广播），跟随线程从该偏移开始即可与回放无缝衔接
+
+    Returns:
+        (行列表, inode, 偏移)；文件不存在时inode为None
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], None, 0
+
+    with f:
+        inode = os.fstat(f.fileno()).st_ino
+        f.seek(0, os.SEEK_END)
+        end = position = f.tell()
+        chunks: List[bytes] = []
+        newlines = 0
+        # 多读一行以确保第一行完整（n<=0 时只需找到最后一个换行符）
+        while position > 0 and newlines <= max(n, 0):
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+
+    data = b"".join(reversed(chunks))
+    complete = data.rfind(b"\n") + 1
+    end -= len(data) - complete
+    if n <= 0:
+        return [], inode, end
+    lines = data[:complete].decode("utf-8", errors="ignore").splitlines()
+    return lines[-n:], inode, end
+
+
+class _Inotify:
+    """基于ctypes的最小inotify封装（仅Linux）"""
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        mask = _IN_MODIFY | _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+        wd = libc.inotify_add_watch(self.fd, str(directory).encode(), mask)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch失败")
+
+    def wait(self, timeout: float) -> List[str]:
+        """等待事件，返回发生变化的文件名列表（超时返回空列表）"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _, _, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            names.append(buf[offset:offset + name_len].rstrip(b"\0").decode(errors="ignore"))
+            offset += name_len
+        return names
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class _Subscriber:
+    """单个SSE订阅者：有界缓冲区，溢出时丢弃最旧的行"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        # 已由历史回放产出的位置（inode, 偏移），不晚于该位置结束的行不再重复投递
+        self.skip_inode: Optional[int] = None
+        self.skip_until = 0
+
+    def deliver(self, lines: List[str], inode: int, ends: List[int]) -> None:
+        """在事件循环线程中调用"""
+        for line, end in zip(lines, ends):
+            if inode == self.skip_inode and end <= self.skip_until:
+                continue
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(line)
+
+
+class LogBroadcaster:
+    """日志文件广播器：一个跟随线程服务所有订阅者"""
+
+    def __init__(self, path: Path, poll_interval: float = 0.5, buffer_size: int = 1000):
+        """
+        Args:
+            path: 日志文件路径
+            poll_interval: 轮询间隔（inotify模式下作为兜底检查间隔）
+            buffer_size: 每个订阅者的缓冲行数上限
+        """
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self._subscribers: Set[_Subscriber] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # 新跟随线程的起始位置（inode, 偏移），与首个订阅者的历史回放衔接
+        self._start_at: Optional[Tuple[int, int]] = None
+        self.mode = "stopped"
+
+    # ------------------------------------------------------------------ 跟随线程
+
+    def _ensure_running(self) -> None:
+        """调用方需持有 self._lock"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._follow, name="log-broadcaster", daemon=True)
+        self._thread.start()
+
+    def _open_watcher(self) -> Optional[_Inotify]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            return _Inotify(self.path.parent)
+        except Exception as e:
+            logger.debug(f"inotify不可用，回退为轮询: {e}")
+            return None
+
+    def _follow(self) -> None:
+        watcher = self._open_watcher()
+        self.mode = "inotify" if watcher else "polling"
+        handle = None
+        inode = None
+        partial = b""
+        first_open = True
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        # 标记线程退出，之后的订阅会启动新线程
+                        self._thread = None
+                        break
+
+                # 打开文件或检测轮转（inode变化或文件被截断）
+                try:
+                    stat = os.stat(self.path)
+                except FileNotFoundError:
+                    stat = None
+
+                if stat is not None and (handle is None or stat.st_ino != inode or stat.st_size < handle.tell()):
+                    if handle is not None:
+                        # 读完旧文件剩余内容再切换到新文件
+                        partial = self._drain(handle, partial, inode)
+                        handle.close()
+                    handle = open(self.path, "rb")
+                    inode = stat.st_ino
+                    if first_open:
+                        # 首次打开只跟随新增内容：从首个订阅者历史回放结束处开始，历史由回放产出
+                        start_at = self._start_at
+                        if start_at is not None and start_at[0] == inode:
+                            handle.seek(min(start_at[1], stat.st_size))
+                        else:
+                            handle.seek(0, os.SEEK_END)
+                    partial = b""
+
+                first_open = False
+                if handle is not None:
+                    partial = self._drain(handle, partial, inode)
+
+                if watcher is not None:
+                    watcher.wait(self.poll_interval)
+                else:
+                    time.sleep(self.poll_interval)
+        except Exception as e:
+            logger.error(f"日志跟随线程异常: {e}", exc_info=True)
+            with self._lock:
+                self._thread = None
+        finally:
+            if handle is not None:
+                handle.close()
+            if watcher is not None:
+                watcher.close()
+            with self._lock:
+                # 退出后可能已有新的跟随线程启动，只有仍是当前线程（或无线程）时才置为stopped
+                if self._thread is None or self._thread is threading.current_thread():
+                    self.mode = "stopped"
+
+    def _drain(self, handle, partial: bytes, inode: int) -> bytes:
+        """读取所有新增完整行并广播（附带每行结束偏移），返回末尾未完成的半行"""
+        data = handle.read()
+        if not data:
+            return partial
+        position = handle.tell() - len(data) - len(partial)
+        chunks = (partial + data).split(b"\n")
+        partial = chunks.pop()
+        if chunks:
+            lines, ends = [], []
+            for chunk in chunks:
+                position += len(chunk) + 1
+                lines.append(chunk.decode("utf-8", errors="ignore").rstrip("\r"))
+                ends.append(position)
+            self._broadcast(lines, inode, ends)
+        return partial
+
+    def _broadcast(self, lines: List[str], inode: int, ends: List[int]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, lines, inode, ends)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    # ------------------------------------------------------------------ 订阅
+
+    async def subscribe(
+        self,
+        tail: int = 200,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        check_interval: float = 5.0
+    ) -> AsyncIterator[str]:
+        """
+        订阅日志：先产出末尾tail行，再持续产出新增行
+
+        Args:
+            tail: 回放的历史行数
+            is_disconnected: 检测客户端是否断开的协程函数
+            check_interval: 无新日志时检查断开的间隔（秒）
+        """
+        sub = _Subscriber(asyncio.get_running_loop(), self.buffer_size)
+        with self._lock:
+            # 先读取历史再加入订阅（同一把锁内）：跟随线程投递的行按偏移与回放去重，新线程从回放结束处开始
+            history, inode, offset = _tail(self.path, tail)
+            sub.skip_inode, sub.skip_until = inode, offset
+            self._subscribers.add(sub)
+            if self._thread is None:
+                self._start_at = (inode, offset) if inode is not None else None
+            self._ensure_running()
+
+        try:
+            for line in history:
+                yield line
+
+            while True:
+                try:
+                    line = await asyncio.wait_for(sub.queue.get(), timeout=check_interval)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        break
+                    continue
+                yield line
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+    def get_stats(self) -> dict:
+        """获取广播器状态"""
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "mode": self.mode,
+                "subscribers": len(self._subscribers),
+                "dropped_lines": sum(s.dropped for s in self._subscribers),
+            }
+
+
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+
+def get_log_broadcaster(path: Path) -> LogBroadcaster:
+    """获取指定日志文件的广播器单例"""
+    key = str(Path(path).resolve())
+    with _broadcasters_lock:
+        if key not in _broadcasters:
+            _broadcasters[key] = LogBroadcaster(Path(path))
+        return _broadcasters[key]
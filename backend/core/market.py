@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import datetime as dt
 from typing import Dict, Any, List
-import numpy as np
 import pandas as pd
 
 from .tushare_client import (
@@ -16,6 +15,7 @@ from .tushare_client import _get_cached_df as _get_cached_df          # type: ig
 from .tushare_client import _save_df_cache as _save_df_cache          # type: ignore
 from .tushare_client import _call_api as _call_api                    # type: ignore
 from .tushare_client import STRICT_MODE as _STRICT_MODE               # type: ignore
+from .utils import clean_nan_values
 
 
 INDEX_CODES: List[str] = [
@@ -72,26 +72,6 @@ def _today_str() -> str:
     return dt.date.today().strftime("%Y%m%d")
 
 
-def _clean_nan_values(data: Any) -> Any:
-    """递归清理数据中的NaN、None和inf值，使其JSON可序列化"""
-    if isinstance(data, dict):
-        return {key: _clean_nan_values(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [_clean_nan_values(item) for item in data]
-    elif isinstance(data, (np.int64, np.int32)):
-        return int(data)
-    elif isinstance(data, (np.float64, np.float32)):
-        if pd.isna(data) or np.isinf(data):
-            return None
-        return float(data)
-    elif pd.isna(data):
-        return None
-    elif isinstance(data, float) and (np.isnan(data) or np.isinf(data)):
-        return None
-    else:
-        return data
-
-
 def _index_daily(ts_code: str, start: str, end: str) -> pd.DataFrame:
     from .cache_config import get_dynamic_ttl
     
@@ -395,7 +375,7 @@ def _get_capital_flow() -> Dict[str, Any]:
             capital_flow["hsgt_net_amount"] = None
         
         # 2. 涨跌停统计 - 反映市场情绪
-        limit_date = find_latest_trading_date_with_data(lambda **kw: stk_limit(**kw))
+        limit_date = find_latest_trading_date_with_data(lambda **kw: stk_limit(**kw), endpoint='stk_limit')
         if limit_date:
             limit_df = stk_limit(trade_date=limit_date)
             if limit_df is not None and not limit_df.empty:
@@ -406,7 +386,7 @@ def _get_capital_flow() -> Dict[str, Any]:
                 }
         
         # 3. 龙虎榜数据 - 游资动向
-        top_date = find_latest_trading_date_with_data(lambda **kw: top_list(**kw))
+        top_date = find_latest_trading_date_with_data(lambda **kw: top_list(**kw), endpoint='top_list')
         if top_date:
             top_df = top_list(trade_date=top_date)
             if top_df is not None and not top_df.empty:
@@ -418,7 +398,7 @@ def _get_capital_flow() -> Dict[str, Any]:
                 }
         
         # 4. 融资融券余额 - 使用真实数据
-        margin_date = find_latest_trading_date_with_data(lambda **kw: margin_detail(**kw))
+        margin_date = find_latest_trading_date_with_data(lambda **kw: margin_detail(**kw), endpoint='margin_detail')
         if margin_date:
             margin_df = margin_detail(trade_date=margin_date)
             if margin_df is not None and not margin_df.empty:
@@ -478,7 +458,7 @@ def _get_market_highlights() -> Dict[str, Any]:
     
     try:
         # 1. 获取龙虎榜异动股票
-        dragon_date = find_latest_trading_date_with_data(lambda **kw: top_list(**kw))
+        dragon_date = find_latest_trading_date_with_data(lambda **kw: top_list(**kw), endpoint='top_list')
         if dragon_date:
             dragon_df = top_list(trade_date=dragon_date)
             if dragon_df is not None and not dragon_df.empty:
@@ -497,7 +477,7 @@ def _get_market_highlights() -> Dict[str, Any]:
     
     try:
         # 2. 从同花顺热榜获取热门概念（只获取最新交易日数据）
-        trade_date = find_latest_trading_date_with_data(lambda **kw: ths_hot(**kw))
+        trade_date = find_latest_trading_date_with_data(lambda **kw: ths_hot(**kw), endpoint='ths_hot')
         if trade_date:
             ths = ths_hot(trade_date=trade_date)
             if ths is not None and not ths.empty:
@@ -517,7 +497,7 @@ def _get_market_highlights() -> Dict[str, Any]:
     
     # 3. 添加关键市场事件（基于数据分析）
     try:
-        limit_date = find_latest_trading_date_with_data(lambda **kw: stk_limit(**kw))
+        limit_date = find_latest_trading_date_with_data(lambda **kw: stk_limit(**kw), endpoint='stk_limit')
         if limit_date:
             limit_df = stk_limit(trade_date=limit_date)
             if limit_df is not None and not limit_df.empty:
@@ -624,7 +604,7 @@ def fetch_market_overview() -> Dict[str, Any]:
     # 获取同花顺热榜 - 只获取最新交易日数据
     hot_stocks = []
     try:
-        trade_date = find_latest_trading_date_with_data(lambda **kw: ths_hot(**kw))
+        trade_date = find_latest_trading_date_with_data(lambda **kw: ths_hot(**kw), endpoint='ths_hot')
         if trade_date:
             ths = ths_hot(trade_date=trade_date)
             if ths is not None and not ths.empty:
@@ -711,8 +691,8 @@ def fetch_market_overview() -> Dict[str, Any]:
         "alerts": market_alerts,  # 新增智能预警
     }
     
-    # 清理NaN值以确保JSON序列化
-    return _clean_nan_values(result)
+    # 清理NaN值：结果会被 market_ai_analyzer 等下游模块直接消费，需保持None语义
+    return clean_nan_values(result)
 
 
 def _get_important_announcements() -> List[Dict[str, Any]]:
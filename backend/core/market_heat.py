@@ -0,0 +1,298 @@
+"""
+全市场热度/事件表
+定期以少量横截面接口（daily_basic / limit_list_d / ths_hot / 公告）构建全市场股票的热度与重大事件标记，
+并计算市场波动率。缓存TTL决策只需查表（O(1)），不再为单只股票发起行情、公告、新闻请求
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 最多向前回溯的交易日（寻找最近一个有数据的交易日）
+MAX_LOOKBACK_DAYS = 10
+# 公告回看天数（与事件检测器的3天窗口一致）
+ANNOUNCEMENT_DAYS = 3
+
+
+def _compute_volatility(n_up: int, n_down: int, median_turnover: float) -> float:
+    """
+    由市场宽度计算0-1的波动率
+
+    涨跌停家数反映极端行情的广度，跌停家数单独加权反映恐慌，换手率中位数反映整体交投烈度。
+    常规交易日约为0.3-0.5，普跌恐慌日接近1
+
+    Args:
+        n_up: 涨停家数
+        n_down: 跌停家数
+        median_turnover: 全市场换手率中位数（%）
+
+    Returns:
+        波动率（0-1）
+    """
+    limit_score = min(1.0, (n_up + n_down) / 150)
+    panic_score = min(1.0, n_down / 60)
+    turnover_score = min(1.0, median_turnover / 3)
+    return round(0.35 * limit_score + 0.35 * panic_score + 0.3 * turnover_score, 3)
+
+
+class MarketHeatTable:
+    """全市场热度与事件标记表（内存，定期刷新）"""
+
+    def __init__(self, refresh_interval: int = 600):
+        """
+        Args:
+            refresh_interval: 刷新间隔（秒），过期后在后台线程中重建，读取方不等待
+        """
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._meta: Dict[str, Any] = {}
+        self._updated_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._stats = {'refreshes': 0, 'failures': 0, 'lookups': 0}
+
+    # ------------------------------------------------------------------ 查询
+
+    def is_stale(self) -> bool:
+        return time.time() - self._updated_at > self.refresh_interval
+
+    def ensure_fresh(self) -> None:
+        """表过期时在后台刷新（单飞），不阻塞调用方"""
+        if not self.is_stale() or self._refreshing:
+            return
+        with self._refresh_lock:
+            if self._refreshing or not self.is_stale():
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name="market-heat-refresh", daemon=True).start()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def lookup(self, ts_code: str) -> Optional[Dict[str, Any]]:
+        """查询单只股票的热度/事件记录（表未构建或不在表中时返回None）"""
+        self.ensure_fresh()
+        self._stats['lookups'] += 1
+        return self._entries.get(ts_code)
+
+    def is_hot(self, ts_code: str) -> bool:
+        entry = self.lookup(ts_code)
+        return bool(entry and entry['hot'])
+
+    def has_event(self, ts_code: str) -> bool:
+        entry = self.lookup(ts_code)
+        return bool(entry and entry['event'])
+
+    def volatility(self) -> float:
+        """市场波动率（0-1），表未构建时返回0.5（正常）"""
+        self.ensure_fresh()
+        return self._meta.get('volatility', 0.5)
+
+    # ------------------------------------------------------------------ 构建
+
+    def _latest_daily_basic(self) -> Tuple[Optional[str], pd.DataFrame]:
+        """最近一个有数据交易日的全市场每日指标"""
+        from .tushare_client import daily_basic
+        from .trading_calendar import data_dates
+
+        trade_date = data_dates.resolve('daily_basic', daily_basic, max_attempts=MAX_LOOKBACK_DAYS)
+        if not trade_date:
+            return None, pd.DataFrame()
+        return trade_date, daily_basic(trade_date=trade_date)
+
+    def _fetch_announcements(self) -> pd.DataFrame:
+        """近几日全市场公告（按日期拉取，无权限时返回空表）"""
+        from .tushare_client import _call_api
+
+        frames = []
+        for offset in range(ANNOUNCEMENT_DAYS):
+            ann_date = (datetime.now() - timedelta(days=offset)).strftime('%Y%m%d')
+            try:
+                df = _call_api("anns_d", ann_date=ann_date)
+            except Exception as e:
+                logger.debug(f"全市场公告获取失败 {ann_date}: {e}")
+                continue
+            if df is not None and not df.empty:
+                frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def refresh(self) -> bool:
+        """
+        重建热度/事件表
+
+        Returns:
+            是否成功
+        """
+        from .tushare_client import limit_list_d, ths_hot
+        from .event_detector import get_event_detector
+
+        started = time.time()
+        try:
+            trade_date, basic = self._latest_daily_basic()
+            if basic.empty:
+                raise RuntimeError("无可用的每日指标数据")
+
+            try:
+                limits = limit_list_d(trade_date=trade_date)
+            except Exception as e:
+                logger.warning(f"涨跌停数据获取失败: {e}")
+                limits = pd.DataFrame()
+            try:
+                hot_list = ths_hot(trade_date=trade_date)
+            except Exception as e:
+                logger.warning(f"同花顺热榜获取失败: {e}")
+                hot_list = pd.DataFrame()
+            announcements = self._fetch_announcements()
+
+            table = basic.set_index('ts_code')
+            turnover = pd.to_numeric(table.get('turnover_rate'), errors='coerce').fillna(0)
+            volume_ratio = pd.to_numeric(table.get('volume_ratio'), errors='coerce').fillna(0)
+            total_mv = pd.to_numeric(table.get('total_mv'), errors='coerce').fillna(0) / 10000  # 亿元
+            circ_mv = pd.to_numeric(table.get('circ_mv'), errors='coerce').fillna(0) / 10000
+            # 成交额（亿元）≈ 换手率 × 流通市值
+            amount = turnover / 100 * circ_mv
+
+            # 与原逐股判断相同的规则，向量化计算
+            hot = (
+                ((total_mv > 5000) & (amount > 30))
+                | ((total_mv > 1000) & (amount > 20))
+                | (amount > 10)
+                | (turnover > 2)
+                | (volume_ratio > 1.5)
+            )
+
+            limit_type = pd.Series(dtype=object)
+            pct_chg = pd.Series(dtype=float)
+            if not limits.empty and 'ts_code' in limits.columns:
+                limits = limits.drop_duplicates('ts_code').set_index('ts_code')
+                if 'limit' in limits.columns:
+                    limit_type = limits['limit']
+                if 'pct_chg' in limits.columns:
+                    pct_chg = pd.to_numeric(limits['pct_chg'], errors='coerce')
+            ths_rank = pd.Series(dtype=float)
+            if not hot_list.empty and 'ts_code' in hot_list.columns:
+                ranked = hot_list.drop_duplicates('ts_code').set_index('ts_code')
+                ths_rank = pd.to_numeric(ranked['rank'], errors='coerce') if 'rank' in ranked.columns \
+                    else pd.Series(range(1, len(ranked) + 1), index=ranked.index, dtype=float)
+
+            hot = hot.reindex(hot.index.union(ths_rank.index), fill_value=False)
+            hot.loc[ths_rank.index] = True
+            hot.loc[hot.index.intersection(limit_type.index)] = True
+
+            # 公告按股票分组，仅对有公告或价格异动的股票运行事件检测
+            ann_by_code: Dict[str, List[Dict[str, str]]] = {}
+            if not announcements.empty and 'ts_code' in announcements.columns:
+                for ts_code, group in announcements.groupby('ts_code'):
+                    ann_by_code[ts_code] = [
+                        {'title': str(title), 'ann_date': str(ann_date)}
+                        for title, ann_date in zip(group.get('title', ''), group.get('ann_date', ''))
+                    ]
+
+            detector = get_event_detector()
+            entries: Dict[str, Dict[str, Any]] = {}
+            for ts_code in hot.index:
+                entries[ts_code] = {
+                    'hot': bool(hot[ts_code]),
+                    'event': False,
+                    'turnover_rate': float(turnover.get(ts_code, 0)),
+                    'volume_ratio': float(volume_ratio.get(ts_code, 0)),
+                    'amount': round(float(amount.get(ts_code, 0)), 2),
+                    'ths_rank': int(ths_rank[ts_code]) if ts_code in ths_rank.index and pd.notna(ths_rank[ts_code]) else None,
+                    'limit': limit_type.get(ts_code),
+                    'events': [],
+                }
+
+            candidates = set(ann_by_code) | set(limit_type.index)
+            candidates |= set(volume_ratio.index[volume_ratio > detector.anomaly_thresholds['volume_ratio']])
+            candidates |= set(turnover.index[turnover > detector.anomaly_thresholds['turnover_rate']])
+            for ts_code in candidates:
+                events = []
+                if ts_code in ann_by_code:
+                    events.extend(detector._detect_announcement_events(ann_by_code[ts_code]))
+                events.extend(detector._detect_price_anomaly({
+                    'pct_chg': float(pct_chg.get(ts_code, 0) or 0),
+                    'volume_ratio': float(volume_ratio.get(ts_code, 0)),
+                    'turnover_rate': float(turnover.get(ts_code, 0)),
+                }))
+                if not events:
+                    continue
+                entry = entries.setdefault(ts_code, {
+                    'hot': False, 'turnover_rate': 0.0, 'volume_ratio': 0.0, 'amount': 0.0,
+                    'ths_rank': None, 'limit': None,
+                })
+                entry['event'] = detector._evaluate_events(events)
+                entry['events'] = [event['keyword'] for event in events]
+
+            n_up = int((limit_type == 'U').sum())
+            n_down = int((limit_type == 'D').sum())
+            n_broken = int((limit_type == 'Z').sum())
+            median_turnover = float(turnover[turnover > 0].median()) if (turnover > 0).any() else 0.0
+
+            meta = {
+                'trade_date': trade_date,
+                'stocks': len(entries),
+                'hot_count': sum(1 for e in entries.values() if e['hot']),
+                'event_count': sum(1 for e in entries.values() if e['event']),
+                'limit_up': n_up,
+                'limit_down': n_down,
+                'broken_limit': n_broken,
+                'median_turnover': round(median_turnover, 3),
+                'announcements': int(len(announcements)),
+                'volatility': _compute_volatility(n_up, n_down, median_turnover),
+                'build_seconds': round(time.time() - started, 2),
+            }
+
+            self._entries, self._meta = entries, meta
+            self._updated_at = time.time()
+            self._stats['refreshes'] += 1
+            logger.info(f"市场热度表已刷新: {trade_date}, 热门{meta['hot_count']}只, "
+                        f"事件{meta['event_count']}只, 波动率{meta['volatility']}")
+            return True
+
+        except Exception as e:
+            self._stats['failures'] += 1
+            # 失败后同样推迟到下个间隔再试，避免每次查询都触发重建
+            self._updated_at = time.time()
+            logger.error(f"市场热度表刷新失败: {e}")
+            return False
+
+    # ------------------------------------------------------------------ 检视
+
+    def snapshot(self, top: int = 50) -> Dict[str, Any]:
+        """
+        获取表的概要（供接口检视）
+
+        Args:
+            top: 返回的热门/事件股票数量
+
+        Returns:
+            元数据、统计与按同花顺排名/换手率排序的热门股票、事件股票列表
+        """
+        entries = self._entries
+        hot = sorted(
+            (dict(e, ts_code=code) for code, e in entries.items() if e['hot']),
+            key=lambda e: (e['ths_rank'] is None, e['ths_rank'] or 0, -e['turnover_rate'])
+        )[:top]
+        events = [dict(e, ts_code=code) for code, e in entries.items() if e['event']][:top]
+        return {
+            **self._meta,
+            'updated_at': datetime.fromtimestamp(self._updated_at).isoformat() if self._updated_at else None,
+            'stale': self.is_stale(),
+            'stats': dict(self._stats),
+            'hot': hot,
+            'events': events,
+        }
+
+
+# 全局实例
+market_heat = MarketHeatTable(refresh_interval=settings.MARKET_HEAT_REFRESH_SECONDS)
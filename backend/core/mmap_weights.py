@@ -0,0 +1,123 @@
+"""
+内存映射权重加载模块
+直接按safetensors格式解析权重文件并以mmap方式映射为张量，多个uvicorn worker进程加载同一文件时
+共享操作系统页缓存中的同一份物理内存，而不是各自复制一份完整权重
+"""
+import json
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_NAME = "model.safetensors"
+CONFIG_NAME = "config.json"
+
+# safetensors dtype -> torch dtype
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def resolve_model_files(path: str) -> Tuple[Path, Path]:
+    """
+    解析模型目录或HuggingFace Hub仓库中的配置与权重文件
+
+    Args:
+        path: 本地目录或Hub仓库ID（如 "NeoQuasar/Kronos-base"）
+
+    Returns:
+        (config.json路径, model.safetensors路径)
+    """
+    local = Path(path)
+    if local.is_dir():
+        return local / CONFIG_NAME, local / WEIGHTS_NAME
+
+    from huggingface_hub import hf_hub_download
+    config_path = hf_hub_download(repo_id=path, filename=CONFIG_NAME)
+    weights_path = hf_hub_download(repo_id=path, filename=WEIGHTS_NAME)
+    return Path(config_path), Path(weights_path)
+
+
+def load_safetensors_mmap(weights_path: Path) -> Dict[str, torch.Tensor]:
+    """
+    以只读私有映射（MAP_PRIVATE）加载safetensors文件
+
+    未被写入的页在进程间共享；权重在推理中只读，因此不会触发写时复制
+
+    Args:
+        weights_path: safetensors文件路径
+
+    Returns:
+        参数名 -> 映射在文件上的张量
+    """
+    weights_path = Path(weights_path)
+    with open(weights_path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+    header.pop("__metadata__", None)
+    data_start = 8 + header_len
+
+    nbytes = os.path.getsize(weights_path)
+    storage = torch.UntypedStorage.from_file(str(weights_path), shared=False, nbytes=nbytes)
+    file_bytes = torch.empty(0, dtype=torch.uint8).set_(storage)
+
+    tensors = {}
+    copied = 0
+    for name, info in header.items():
+        dtype = _DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        raw = file_bytes[data_start + begin:data_start + end]
+        element_size = torch.empty(0, dtype=dtype).element_size()
+        if (data_start + begin) % element_size:
+            # 未对齐的张量无法零拷贝重解释，退化为复制
+            raw = raw.clone()
+            copied += 1
+        tensors[name] = raw.view(dtype).reshape(info["shape"])
+
+    if copied:
+        logger.warning(f"{weights_path.name}: {copied}个张量未对齐，已复制到进程私有内存")
+    return tensors
+
+
+def load_pretrained_mmap(model_cls: Any, path: str) -> torch.nn.Module:
+    """
+    以内存映射方式加载 PyTorchModelHubMixin 模型（Kronos / KronosTokenizer）
+
+    Args:
+        model_cls: 模型类
+        path: 本地目录或Hub仓库ID
+
+    Returns:
+        处于eval模式的模型，参数直接引用映射的张量
+    """
+    config_path, weights_path = resolve_model_files(path)
+    if not weights_path.exists():
+        logger.warning(f"{path} 没有 {WEIGHTS_NAME}，回退为 from_pretrained")
+        return model_cls.from_pretrained(path)
+
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    model = model_cls(**config)
+    state_dict = load_safetensors_mmap(weights_path)
+    try:
+        # assign=True 直接使用映射张量替换参数，而不是复制到新分配的内存（torch>=2.1）
+        model.load_state_dict(state_dict, strict=True, assign=True)
+    except TypeError:
+        logger.warning("当前torch版本不支持load_state_dict(assign=True)，权重将被复制")
+        model.load_state_dict(state_dict, strict=True)
+    return model.eval()
@@ -0,0 +1,310 @@
+"""
+分析流程分阶段计时
+- 每个阶段（technical/news/professional_data/score/summary 等）记录一个span：耗时、Tushare调用次数与耗时、
+  缓存命中/未命中、返回数据字节数以及 ok/error/timeout/cancelled 状态
+- 当前span通过 ContextVar 传递：tushare_client 与 cache_manager 在调用处记录到所在阶段，
+  _call_api 的超时线程通过 copy_context 继承
+- span 附加在单次分析结果上，并汇总为各阶段直方图，可导出为 Prometheus 文本格式
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 阶段耗时直方图桶上界（秒）
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# span 状态
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_TIMEOUT = 'timeout'
+STATUS_CANCELLED = 'cancelled'
+
+
+class Span:
+    """单个阶段的计时与计数"""
+
+    __slots__ = ('name', 'started', 'elapsed', 'api_calls', 'api_errors', 'api_seconds',
+                 'cache_hits', 'cache_misses', 'bytes', 'status', 'error', '_lock')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.elapsed: Optional[float] = None
+        self.api_calls = 0
+        self.api_errors = 0
+        self.api_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+        self.status = STATUS_OK
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def finish(self, status: Optional[str] = None, error: Optional[str] = None) -> None:
+        if self.elapsed is None:
+            self.elapsed = time.time() - self.started
+        # 主线程已标记为timeout/cancelled的阶段，结束时不再覆盖状态
+        if status and self.status == STATUS_OK:
+            self.status = status
+            self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed if self.elapsed is not None else time.time() - self.started
+        return {
+            'stage': self.name,
+            'seconds': round(elapsed, 3),
+            'status': self.status,
+            'error': self.error,
+            'api_calls': self.api_calls,
+            'api_errors': self.api_errors,
+            'api_seconds': round(self.api_seconds, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'bytes': self.bytes,
+        }
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('pipeline_span', default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def record_api_call(seconds: float, result: Any = None, error: bool = False) -> None:
+    """记录一次Tushare调用到当前阶段（不在阶段内时忽略）"""
+    span = _current_span.get()
+    if span is None:
+        return
+    size = 0
+    if result is not None and hasattr(result, 'memory_usage'):
+        try:
+            size = int(result.memory_usage(index=True).sum())
+        except Exception:
+            size = 0
+    with span._lock:
+        span.api_calls += 1
+        span.api_errors += int(error)
+        span.api_seconds += seconds
+        span.bytes += size
+
+
+def record_cache(hit: bool) -> None:
+    """记录一次缓存访问到当前阶段（不在阶段内时忽略）"""
+    span = _current_span.get()
+    if span is None:
+        return
+    with span._lock:
+        if hit:
+            span.cache_hits += 1
+        else:
+            span.cache_misses += 1
+
+
+class PipelineTrace:
+    """一次分析的全部阶段"""
+
+    def __init__(self, label: str = ''):
+        self.label = label
+        self.started = time.time()
+        self.spans: Dict[str, Span] = {}
+        self._lock = threading.Lock()
+
+    def _open(self, name: str) -> Span:
+        span = Span(name)
+        with self._lock:
+            self.spans[name] = span
+        return span
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        """在当前线程中记录一个阶段"""
+        span = self._open(name)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.finish(STATUS_ERROR, str(e))
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+
+    def run(self, name: str, func: Callable, *args, **kwargs):
+        """在阶段内执行函数（供线程池提交）"""
+        with self.span(name):
+            return func(*args, **kwargs)
+
+    def mark(self, name: str, status: str, error: Optional[str] = None) -> None:
+        """由调用方标记阶段状态（如等待超时、结果为错误字典）"""
+        span = self.spans.get(name)
+        if span is not None and span.status == STATUS_OK:
+            span.status = status
+            span.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        spans = [span.to_dict() for span in self.spans.values()]
+        return {
+            'total_seconds': round(time.time() - self.started, 3),
+            'api_calls': sum(s['api_calls'] for s in spans),
+            'cache_hits': sum(s['cache_hits'] for s in spans),
+            'cache_misses': sum(s['cache_misses'] for s in spans),
+            'stages': spans,
+        }
+
+
+class _StageStats:
+    """单个阶段的累计直方图与计数"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.statuses: Dict[str, int] = {}
+        self.api_calls = 0
+        self.api_errors = 0
+        self.api_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+
+    def observe(self, span: Dict[str, Any]) -> None:
+        seconds = span['seconds']
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.statuses[span['status']] = self.statuses.get(span['status'], 0) + 1
+        self.api_calls += span['api_calls']
+        self.api_errors += span['api_errors']
+        self.api_seconds += span['api_seconds']
+        self.cache_hits += span['cache_hits']
+        self.cache_misses += span['cache_misses']
+        self.bytes += span['bytes']
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶上界估计分位数（落在最后一个桶时返回观测最大值）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return round(self.max, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            'count': self.count,
+            'avg_seconds': round(self.sum / self.count, 3) if self.count else None,
+            'p50_seconds': self.quantile(0.5),
+            'p95_seconds': self.quantile(0.95),
+            'max_seconds': round(self.max, 3),
+            'statuses': dict(self.statuses),
+            'api_calls': self.api_calls,
+            'api_errors': self.api_errors,
+            'api_seconds': round(self.api_seconds, 3),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': round(self.cache_hits / max(1, self.cache_hits + self.cache_misses), 3),
+            'bytes': self.bytes,
+            'histogram': dict(zip(labels, self.counts)),
+        }
+
+
+class PipelineMetrics:
+    """各阶段指标汇总"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages: Dict[str, _StageStats] = {}
+        self._runs = 0
+        self._lock = threading.Lock()
+
+    def observe(self, trace: PipelineTrace, total_stage: str = 'total') -> Dict[str, Any]:
+        """
+        汇总一次分析的各阶段，并返回其span字典（附加到分析结果）
+
+        Args:
+            trace: 已结束的计时记录
+            total_stage: 整次耗时计入的阶段名（批量流程的共享数据阶段使用单独的名称）
+        """
+        data = trace.to_dict()
+        total = {
+            'stage': total_stage, 'seconds': data['total_seconds'],
+            'status': next((s['status'] for s in data['stages'] if s['status'] != STATUS_OK), STATUS_OK),
+            'api_calls': data['api_calls'], 'cache_hits': data['cache_hits'], 'cache_misses': data['cache_misses'],
+            'api_errors': sum(s['api_errors'] for s in data['stages']),
+            'api_seconds': sum(s['api_seconds'] for s in data['stages']),
+            'bytes': sum(s['bytes'] for s in data['stages']),
+        }
+        with self._lock:
+            self._runs += 1
+            for span in data['stages'] + [total]:
+                self._stages.setdefault(span['stage'], _StageStats(self.buckets)).observe(span)
+        return data
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'runs': self._runs,
+                'stages': {name: stats.to_dict() for name, stats in self._stages.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._runs = 0
+
+    def to_prometheus(self, prefix: str = 'qsl_pipeline') -> str:
+        """导出为 Prometheus 文本格式（直方图桶为累计计数）"""
+        lines: List[str] = []
+        with self._lock:
+            stages = sorted(self._stages.items())
+            lines += [f"# HELP {prefix}_stage_seconds Analysis pipeline stage wall time",
+                      f"# TYPE {prefix}_stage_seconds histogram"]
+            for name, stats in stages:
+                cumulative = 0
+                for bound, n in zip(stats.buckets, stats.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats.sum:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats.count}')
+
+            counters = (
+                ('api_calls_total', 'Tushare API calls', 'api_calls'),
+                ('api_errors_total', 'Tushare API calls that raised', 'api_errors'),
+                ('api_seconds_total', 'Time spent in Tushare API calls', 'api_seconds'),
+                ('cache_hits_total', 'Cache hits', 'cache_hits'),
+                ('cache_misses_total', 'Cache misses', 'cache_misses'),
+                ('bytes_total', 'In-memory bytes of API results', 'bytes'),
+            )
+            for metric, help_text, attr in counters:
+                lines += [f"# HELP {prefix}_stage_{metric} {help_text} per stage",
+                          f"# TYPE {prefix}_stage_{metric} counter"]
+                for name, stats in stages:
+                    lines.append(f'{prefix}_stage_{metric}{{stage="{name}"}} {getattr(stats, attr)}')
+
+            lines += [f"# HELP {prefix}_stage_status_total Stage outcomes by status",
+                      f"# TYPE {prefix}_stage_status_total counter"]
+            for name, stats in stages:
+                for status, n in sorted(stats.statuses.items()):
+                    lines.append(f'{prefix}_stage_status_total{{stage="{name}",status="{status}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+# 全局实例
+pipeline_metrics = PipelineMetrics()
+
+
+def get_pipeline_metrics() -> PipelineMetrics:
+    """获取全局流程指标实例"""
+    return pipeline_metrics
@@ -0,0 +1,171 @@
+"""
+K线预测结果缓存模块
+以 (股票代码, 输入K线指纹, 预测参数, 模型版本) 为键持久化Kronos预测结果：
+输入K线不变时相同请求直接返回缓存；新K线到来时指纹变化，旧结果随之失效。
+失效按 (股票代码, 回看长度, 结束日期) 分组：同一股票不同窗口的请求（如报告图表与/predict/kline）互不驱逐。
+同时记录各股票的预测访问次数（内存累计、定期合并写盘），用于收盘后预计算热门股票
+"""
+import atexit
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .cache_manager import cache_manager
+from .config import settings
+
+NAMESPACE = 'prediction'
+# 访问统计保留天数
+VIEW_WINDOW_DAYS = 7
+# 访问计数合并写盘的最短间隔（秒）
+VIEW_FLUSH_SECONDS = 60
+
+
+def bars_fingerprint(x_df: pd.DataFrame, x_timestamp: pd.Series) -> str:
+    """
+    计算输入K线的指纹（数值与时间戳的哈希）
+
+    Args:
+        x_df: 模型输入的OHLCV数据
+        x_timestamp: 对应的时间戳
+
+    Returns:
+        十六进制哈希字符串
+    """
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(x_df.to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(pd.to_datetime(x_timestamp).to_numpy(dtype='datetime64[ns]')).view(np.int64).tobytes())
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """预测结果缓存（磁盘持久化，基于cache_manager）"""
+
+    def __init__(self, ttl: int = 3 * 86400):
+        """
+        Args:
+            ttl: 缓存有效期（秒），指纹未变化时也不会超过该时间
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidated': 0}
+        # 尚未写盘的访问计数 {日期: {股票代码: 次数}}
+        self._pending_views: Dict[str, Counter] = {}
+        self._views_flushed_at = time.time()
+
+    @staticmethod
+    def make_key(ts_code: str, fingerprint: str, pred_len: int, lookback: int, T: float,
+                 top_p: float, sample_count: int, model_version: str, quantiles: Tuple[float, ...] = ()) -> str:
+        """生成缓存键"""
+        bands = ','.join(str(q) for q in quantiles)
+        return f"{ts_code}|{fingerprint}|{pred_len}|{lookback}|{T}|{top_p}|{sample_count}|{bands}|{model_version}"
+
+    @staticmethod
+    def make_slot(lookback: int, end_date: Optional[str] = None) -> str:
+        """输入窗口标识：同一股票同一窗口的新指纹才使旧结果失效"""
+        return f"{lookback}|{end_date or 'latest'}"
+
+    @staticmethod
+    def _index_key(ts_code: str, slot: str) -> str:
+        return f"index:{ts_code}|{slot}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的预测结果"""
+        result = cache_manager.get(key, namespace=NAMESPACE, max_age=self.ttl)
+        with self._lock:
+            self._stats['hits' if result is not None else 'misses'] += 1
+        return result
+
+    def put(self, ts_code: str, fingerprint: str, key: str, result: Dict[str, Any], slot: str = '') -> None:
+        """
+        保存预测结果；该股票同一输入窗口的指纹变化时删除旧指纹下的全部结果
+
+        Args:
+            ts_code: 股票代码
+            fingerprint: 输入K线指纹
+            key: make_key 生成的缓存键
+            result: 预测结果
+            slot: make_slot 生成的输入窗口标识
+        """
+        with self._lock:
+            index_key = self._index_key(ts_code, slot)
+            index = cache_manager.get(index_key, namespace=NAMESPACE, max_age=self.ttl) or {}
+
+            if index.get('fingerprint') != fingerprint:
+                # 新K线到来：旧指纹下的预测全部失效
+                for old_key in index.get('keys', []):
+                    cache_manager.delete(old_key, namespace=NAMESPACE)
+                    self._stats['invalidated'] += 1
+                index = {'fingerprint': fingerprint, 'keys': []}
+
+            if key not in index['keys']:
+                index['keys'].append(key)
+            cache_manager.set(key, result, namespace=NAMESPACE)
+            cache_manager.set(index_key, index, namespace=NAMESPACE)
+
+    # ------------------------------------------------------------------ 访问统计
+
+    def record_view(self, ts_code: str) -> None:
+        """记录一次预测访问（内存累计，距上次写盘超过 VIEW_FLUSH_SECONDS 时合并写盘）"""
+        today = datetime.now().strftime('%Y%m%d')
+        with self._lock:
+            self._pending_views.setdefault(today, Counter())[ts_code] += 1
+            if time.time() - self._views_flushed_at < VIEW_FLUSH_SECONDS:
+                return
+            self._flush_views()
+
+    def flush_views(self) -> None:
+        """立即将累计的访问计数写盘"""
+        with self._lock:
+            self._flush_views()
+
+    def _flush_views(self) -> None:
+        """与磁盘上的计数合并后写回（调用方持有锁）"""
+        self._views_flushed_at = time.time()
+        if not self._pending_views:
+            return
+        views = cache_manager.get('views', namespace=NAMESPACE, max_age=VIEW_WINDOW_DAYS * 86400) or {}
+        for day, counts in self._pending_views.items():
+            merged = views.setdefault(day, {})
+            for ts_code, n in counts.items():
+                merged[ts_code] = merged.get(ts_code, 0) + n
+        self._pending_views = {}
+
+        cutoff = (datetime.now() - timedelta(days=VIEW_WINDOW_DAYS)).strftime('%Y%m%d')
+        views = {day: counts for day, counts in views.items() if day >= cutoff}
+        cache_manager.set('views', views, namespace=NAMESPACE)
+
+    def top_viewed(self, n: int = 20) -> List[str]:
+        """
+        获取近期访问最多的股票
+
+        Args:
+            n: 返回数量
+
+        Returns:
+            股票代码列表（按访问次数降序）
+        """
+        self.flush_views()
+        views = cache_manager.get('views', namespace=NAMESPACE, max_age=VIEW_WINDOW_DAYS * 86400) or {}
+        total = Counter()
+        for counts in views.values():
+            total.update(counts)
+        return [ts_code for ts_code, _ in total.most_common(n)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hit_rate'] = stats['hits'] / max(1, stats['hits'] + stats['misses'])
+        return stats
+
+
+# 全局实例
+prediction_cache = PredictionCache(ttl=settings.KRONOS_PREDICTION_CACHE_TTL)
+# 进程退出时写入尚未落盘的访问计数
+atexit.register(prediction_cache.flush_views)
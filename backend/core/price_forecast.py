@@ -0,0 +1,361 @@
+"""
+报告价格预测服务（非Kronos路径）
+统一的预测提供者接口：LLM（Ollama）提供者按批构造多只股票的提示，一次请求得到多只股票的预测；
+确定性数值引擎（EMA + 趋势衰减 + 均值回归）作为回退，保证LLM不可用或超时时延迟可控、结果可复现。
+结果按 (股票, 最后一根K线日期, 预测天数) 缓存，同一股票同一交易日的重复请求不再重新生成；
+LLM失败或超时的股票在同一键下短期缓存回退结果，期间的报告不再等待LLM超时
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+import requests
+
+from .cache_manager import cache_manager
+from .config import settings
+from .deadline import remaining_timeout
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'price_forecast'
+# 提示中携带的历史收盘价数量
+CONTEXT_BARS = 15
+# LLM预测价格相对最新收盘价的最大偏离，超出视为无效输出
+MAX_DEVIATION = 0.5
+
+_THINK_RE = re.compile(r'<think>[\s\S]*?</think>', re.IGNORECASE)
+
+
+def build_context(key: str, stock_name: str, closes: Sequence[float], last_date: str,
+                  technical_score: float = 0, fundamental_score: float = 0) -> Dict[str, Any]:
+    """
+    构建单只股票的预测上下文
+
+    Args:
+        key: 股票标识（优先使用ts_code），同时作为LLM返回结果的键
+        stock_name: 股票名称
+        closes: 历史收盘价（按日期倒序，closes[0]为最后一根K线）
+        last_date: 最后一根K线日期（YYYYMMDD）
+        technical_score: 技术面评分（满分40）
+        fundamental_score: 基本面评分（满分20）
+
+    Returns:
+        预测上下文字典
+    """
+    return {
+        'key': key,
+        'name': stock_name,
+        'closes': [float(c) for c in list(closes)[:CONTEXT_BARS]],
+        'last_date': str(last_date),
+        'technical_score': technical_score or 0,
+        'fundamental_score': fundamental_score or 0,
+    }
+
+
+def _trend_stats(closes: Sequence[float]) -> Dict[str, float]:
+    """EMA、平均日涨跌、波动率与趋势方向/强度（closes按日期倒序）"""
+    multiplier = 2 / (len(closes) + 1)
+    ema = closes[-1]
+    for close in reversed(closes[:-1]):  # 由旧到新
+        ema = (close - ema) * multiplier + ema
+
+    changes = [(closes[i] - closes[i + 1]) / closes[i + 1] for i in range(len(closes) - 1) if closes[i + 1]]
+    volatility = sum(abs(c) for c in changes) / len(changes) if changes else 0.01
+    avg_change = sum(changes[:4]) / len(changes[:4]) if changes else 0.0
+
+    recent_avg = sum(closes[:3]) / len(closes[:3])
+    earlier = closes[3:8]
+    earlier_avg = sum(earlier) / len(earlier) if len(earlier) == 5 else recent_avg
+    return {
+        'ema': ema,
+        'volatility': volatility,
+        'avg_change': avg_change,
+        'direction': 1 if recent_avg > earlier_avg else -1,
+        'strength': abs(recent_avg - earlier_avg) / earlier_avg if earlier_avg else 0.0,
+        'ma5': sum(closes[:5]) / len(closes[:5]),
+        'ma10': sum(closes[:10]) / len(closes[:10]),
+    }
+
+
+def ema_trend_forecast(closes: Sequence[float], horizon: int, seed: int = 42) -> List[float]:
+    """
+    确定性数值预测：以EMA为基准叠加随时间衰减的趋势修正，偏离EMA过远时回归一半，
+    再叠加按历史波动率缩放的小幅扰动（固定种子，结果可复现）
+
+    Args:
+        closes: 历史收盘价（按日期倒序）
+        horizon: 预测天数
+        seed: 扰动的随机种子基数
+
+    Returns:
+        horizon个预测收盘价
+    """
+    stats = _trend_stats(closes)
+    ema, volatility = stats['ema'], stats['volatility']
+    predictions = []
+    for i in range(horizon):
+        trend_factor = stats['direction'] * stats['strength'] * (1 - i / (horizon * 1.5))
+        predicted = ema * (1 + trend_factor)
+        if ema and abs(predicted - ema) / ema > volatility * 2:
+            predicted = ema + (predicted - ema) * 0.5
+        noise = random.Random(seed + i).uniform(-volatility * 0.3, volatility * 0.3)
+        predictions.append(round(predicted * (1 + noise), 2))
+    return predictions
+
+
+class PricePredictionProvider(ABC):
+    """预测提供者接口"""
+
+    name = 'base'
+
+    @property
+    def version(self) -> str:
+        """结果版本标识（参与缓存键，模型变化时旧结果失效）"""
+        return self.name
+
+    @abstractmethod
+    def predict(self, contexts: Sequence[Dict[str, Any]], horizon: int) -> List[Optional[List[float]]]:
+        """
+        批量预测
+
+        Args:
+            contexts: build_context 构建的上下文列表
+            horizon: 预测天数
+
+        Returns:
+            与contexts一一对应的预测收盘价列表，某只股票无有效结果时为None
+        """
+
+
+class FallbackPricePredictor(PricePredictionProvider):
+    """确定性数值预测（无外部依赖，总能给出结果）"""
+
+    name = 'fallback'
+
+    def predict(self, contexts: Sequence[Dict[str, Any]], horizon: int) -> List[Optional[List[float]]]:
+        return [ema_trend_forecast(ctx['closes'], horizon) if ctx['closes'] else None for ctx in contexts]
+
+
+class OllamaPricePredictor(PricePredictionProvider):
+    """Ollama LLM预测（多只股票合并为一个提示）"""
+
+    name = 'ollama'
+
+    def __init__(self, url: Optional[str] = None, model: Optional[str] = None,
+                 timeout: Optional[float] = None, batch_size: Optional[int] = None):
+        """
+        Args:
+            url: Ollama服务地址，默认 OLLAMA_URL
+            model: 模型名，默认 PRICE_PREDICTION_MODEL
+            timeout: 单次请求超时（秒），默认 PRICE_PREDICTION_TIMEOUT（不超过 OLLAMA_TIMEOUT）
+            batch_size: 每个提示包含的股票数
+        """
+        self.url = (url or settings.OLLAMA_URL).rstrip('/')
+        self.model = model or settings.PRICE_PREDICTION_MODEL
+        self.timeout = timeout or settings.PRICE_PREDICTION_TIMEOUT
+        self.batch_size = max(1, batch_size or settings.PRICE_PREDICTION_BATCH_SIZE)
+        self._session = requests.Session()
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    @staticmethod
+    def build_prompt(contexts: Sequence[Dict[str, Any]], horizon: int) -> str:
+        """构造多只股票的批量预测提示"""
+        blocks = []
+        for i, ctx in enumerate(contexts, start=1):
+            closes = ctx['closes']
+            stats = _trend_stats(closes)
+            trend = '上升' if stats['avg_change'] > 0.005 else '下降' if stats['avg_change'] < -0.005 else '横盘震荡'
+            history = ', '.join(f"{c:.2f}" for c in reversed(closes[:5]))
+            blocks.append(
+                f"[{i}] 代码: {ctx['key']}（{ctx['name']}）\n"
+                f"- 基准价格: ¥{closes[0]:.2f}（{ctx['last_date']}）\n"
+                f"- MA5: ¥{stats['ma5']:.2f}，MA10: ¥{stats['ma10']:.2f}（MA5 {'>' if stats['ma5'] > stats['ma10'] else '<'} MA10）\n"
+                f"- 近5日收盘（旧→新）: {history}\n"
+                f"- 平均日涨跌: {stats['avg_change'] * 100:+.2f}%，波动率: {stats['volatility'] * 100:.2f}%，趋势: {trend}\n"
+                f"- 技术面强度: {ctx['technical_score']}/40分，基本面强度: {ctx['fundamental_score']}/20分"
+            )
+        example = ', '.join(f'"{ctx["key"]}": [价格1, ..., 价格{horizon}]' for ctx in contexts[:2])
+        return (
+            f"你是一个精准的股票价格预测模型。基于以下{len(contexts)}只股票的历史数据，"
+            f"分别预测每只股票接下来{horizon}个交易日的收盘价。\n\n"
+            + '\n\n'.join(blocks)
+            + "\n\n预测要求：\n"
+            "1. 每日价格波动控制在该股票历史波动率以内\n"
+            "2. 整体走势与历史趋势及MA5/MA10位置关系保持一致\n"
+            "3. 价格围绕MA5波动，必须为数字\n\n"
+            f"返回格式（仅JSON对象，以代码为键，每只股票{horizon}个价格，无其他文字）：\n"
+            f"{{{example}}}"
+        )
+
+    @staticmethod
+    def parse_response(text: str, contexts: Sequence[Dict[str, Any]], horizon: int) -> List[Optional[List[float]]]:
+        """解析LLM输出，逐只股票校验价格数量与偏离幅度"""
+        text = _THINK_RE.sub('', text or '').strip()
+        data: Any = None
+        match = re.search(r'\{[\s\S]*\}', text)
+        if match:
+            try:
+                data = json.loads(match.group())
+            except ValueError:
+                data = None
+        if data is None and len(contexts) == 1:
+            # 单只股票时兼容直接返回数组的写法
+            match = re.search(r'\[[\s\S]*\]', text)
+            if match:
+                try:
+                    data = {contexts[0]['key']: json.loads(match.group())}
+                except ValueError:
+                    data = None
+        if not isinstance(data, dict):
+            return [None] * len(contexts)
+
+        results: List[Optional[List[float]]] = []
+        for ctx in contexts:
+            values = data.get(ctx['key'])
+            try:
+                prices = [float(v['price'] if isinstance(v, dict) else v) for v in values][:horizon]
+            except (TypeError, ValueError, KeyError):
+                results.append(None)
+                continue
+            base = ctx['closes'][0]
+            if len(prices) < horizon or any(not base or abs(p / base - 1) > MAX_DEVIATION for p in prices):
+                results.append(None)
+                continue
+            results.append([round(p, 2) for p in prices])
+        return results
+
+    def _generate(self, prompt: str) -> str:
+        response = self._session.post(
+            f"{self.url}/api/generate",
+            json={
+                'model': self.model,
+                'prompt': prompt,
+                'stream': False,
+                'options': {'temperature': 0.3, 'num_predict': 200 + 120 * self.batch_size},
+            },
+            timeout=remaining_timeout(self.timeout, 'ollama price prediction'),
+        )
+        response.raise_for_status()
+        return response.json().get('response', '')
+
+    def predict(self, contexts: Sequence[Dict[str, Any]], horizon: int) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = []
+        for start in range(0, len(contexts), self.batch_size):
+            chunk = contexts[start:start + self.batch_size]
+            try:
+                text = self._generate(self.build_prompt(chunk, horizon))
+                results.extend(self.parse_response(text, chunk, horizon))
+            except Exception as e:
+                logger.warning(f"LLM价格预测失败（{len(chunk)}只股票）: {e}")
+                results.extend([None] * len(chunk))
+        return results
+
+
+class PricePredictionService:
+    """预测服务：缓存 -> 主提供者（批量）-> 确定性回退"""
+
+    def __init__(self, provider: Optional[PricePredictionProvider] = None,
+                 fallback: Optional[PricePredictionProvider] = None, ttl: int = 86400,
+                 negative_ttl: int = 1800):
+        """
+        Args:
+            provider: 主提供者，None时只使用回退引擎
+            fallback: 回退提供者，默认确定性数值预测
+            ttl: 主提供者结果的缓存有效期（秒）
+            negative_ttl: 主提供者失败时回退结果的缓存有效期（秒）
+        """
+        self.provider = provider
+        self.fallback = fallback or FallbackPricePredictor()
+        self.ttl = ttl
+        self.negative_ttl = min(negative_ttl, ttl)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'cache_hits': 0, 'provider_results': 0, 'fallbacks': 0}
+
+    def _cache_key(self, ctx: Dict[str, Any], horizon: int) -> str:
+        return f"{ctx['key']}|{ctx['last_date']}|{horizon}|{self.provider.version}"
+
+    def forecast(self, contexts: Sequence[Dict[str, Any]], horizon: int) -> List[Dict[str, Any]]:
+        """
+        批量预测（缓存未命中的股票合并为一次主提供者调用）
+
+        Args:
+            contexts: build_context 构建的上下文列表
+            horizon: 预测天数
+
+        Returns:
+            与contexts一一对应的 {'prices': [...], 'source': 提供者名称}
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(contexts)
+        pending = []
+        for i, ctx in enumerate(contexts):
+            if self.provider is not None:
+                cached = cache_manager.get(self._cache_key(ctx, horizon), namespace=NAMESPACE, max_age=self.ttl)
+                if isinstance(cached, dict):
+                    # 主提供者失败后缓存的回退结果
+                    if time.time() < cached.get('expires_at', 0):
+                        results[i] = {'prices': cached['prices'], 'source': cached['source'], 'cached': True}
+                        continue
+                elif cached is not None:
+                    results[i] = {'prices': cached, 'source': self.provider.name, 'cached': True}
+                    continue
+            pending.append(i)
+
+        hits = len(contexts) - len(pending)
+        produced = 0
+        if pending and self.provider is not None:
+            predicted = self.provider.predict([contexts[i] for i in pending], horizon)
+            for i, prices in zip(pending, predicted):
+                if prices:
+                    cache_manager.set(self._cache_key(contexts[i], horizon), prices, namespace=NAMESPACE)
+                    results[i] = {'prices': prices, 'source': self.provider.name, 'cached': False}
+                    produced += 1
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fallback_prices = self.fallback.predict([contexts[i] for i in missing], horizon)
+            expires_at = time.time() + self.negative_ttl
+            for i, prices in zip(missing, fallback_prices):
+                results[i] = {'prices': prices or [], 'source': self.fallback.name, 'cached': False}
+                if self.provider is not None and prices:
+                    cache_manager.set(self._cache_key(contexts[i], horizon),
+                                      {'prices': prices, 'source': self.fallback.name, 'expires_at': expires_at},
+                                      namespace=NAMESPACE)
+
+        with self._lock:
+            self._stats['requests'] += len(contexts)
+            self._stats['cache_hits'] += hits
+            self._stats['provider_results'] += produced
+            self._stats['fallbacks'] += len(missing)
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'provider': self.provider.version if self.provider else None,
+                'fallback': self.fallback.name,
+            }
+
+
+_service: Optional[PricePredictionService] = None
+_service_lock = threading.Lock()
+
+
+def get_price_prediction_service() -> PricePredictionService:
+    """获取全局预测服务（PRICE_PREDICTION_PROVIDER=fallback 时只使用确定性数值预测）"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                provider = OllamaPricePredictor() if settings.PRICE_PREDICTION_PROVIDER == 'ollama' else None
+                _service = PricePredictionService(provider, ttl=settings.PRICE_PREDICTION_CACHE_TTL,
+                                                  negative_ttl=settings.PRICE_PREDICTION_NEGATIVE_TTL)
+    return _service
@@ -0,0 +1,248 @@
+"""
+列式价格序列模块
+以"日期数组 + 每个字段一个并行数组"的形式保存K线数据，
+直接由DataFrame向量化构建，替代逐行 iterrows 生成的 per-bar 字典列表
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Tushare日线字段 -> 输出字段及单位换算系数
+DAILY_FIELD_MAP = {
+    'open': ('open', 1.0),
+    'high': ('high', 1.0),
+    'low': ('low', 1.0),
+    'close': ('close', 1.0),
+    'vol': ('volume', 1.0),
+    'amount': ('amount', 1000.0),  # 千元 -> 元
+    'pct_chg': ('pct_chg', 1.0),
+}
+
+DATE_COLUMNS = ('trade_date', 'trade_time', 'date', 'datetime', 'timestamps')
+
+COLUMNAR_FORMAT = 'columnar'
+
+
+class PriceSeries:
+    """
+    列式价格序列
+
+    行顺序与来源DataFrame一致（Tushare日线为日期倒序，第0行是最新交易日）。
+    兼容旧的 per-bar 字典列表用法：支持 len()、迭代、整数下标（返回字典）和切片，
+    因此 prices[0]['close']、prices[:60][::-1] 等既有写法无需修改。
+    """
+
+    __slots__ = ('dates', 'columns')
+
+    def __init__(self, dates: Sequence[str], columns: Dict[str, np.ndarray]):
+        self.dates: List[str] = list(dates)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.asarray(values, dtype=np.float64) for name, values in columns.items()
+        }
+        for name, values in self.columns.items():
+            if len(values) != len(self.dates):
+                raise ValueError(f"字段{name}长度({len(values)})与日期数组长度({len(self.dates)})不一致")
+
+    # ------------------------------------------------------------------ 构建
+
+    @classmethod
+    def from_daily(cls, df: pd.DataFrame) -> 'PriceSeries':
+        """
+        由Tushare daily DataFrame构建（vol -> volume，amount 千元 -> 元）
+
+        Args:
+            df: Tushare日线数据
+
+        Returns:
+            PriceSeries实例
+        """
+        if df is None or df.empty:
+            return cls([], {})
+
+        columns = {}
+        for src, (dst, factor) in DAILY_FIELD_MAP.items():
+            if src in df.columns:
+                values = pd.to_numeric(df[src], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                values = np.full(len(df), np.nan)
+            columns[dst] = values * factor if factor != 1.0 else values
+
+        dates = df['trade_date'].astype(str).tolist() if 'trade_date' in df.columns else [''] * len(df)
+        return cls(dates, columns)
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        date_col: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        date_format: str = '%Y%m%d'
+    ) -> 'PriceSeries':
+        """
+        由任意K线DataFrame构建（保留原字段名，缺失值保留为NaN）
+
+        Args:
+            df: K线数据
+            date_col: 日期列名，默认自动识别 trade_date/trade_time/date 等
+            fields: 需要保留的数值字段，默认为全部数值列
+            date_format: 日期列为datetime类型时的格式化字符串
+
+        Returns:
+            PriceSeries实例
+        """
+        if df is None or df.empty:
+            return cls([], {})
+
+        if date_col is None:
+            date_col = next((c for c in DATE_COLUMNS if c in df.columns), None)
+
+        if fields is None:
+            fields = [c for c in df.select_dtypes(include='number').columns if c != date_col]
+
+        columns = {
+            name: pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            for name in fields if name in df.columns
+        }
+
+        if date_col is None:
+            dates = [''] * len(df)
+        elif pd.api.types.is_datetime64_any_dtype(df[date_col]):
+            dates = df[date_col].dt.strftime(date_format).tolist()
+        else:
+            dates = df[date_col].astype(str).tolist()
+
+        return cls(dates, columns)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> 'PriceSeries':
+        """由旧的 per-bar 字典列表构建（用于兼容旧缓存数据）"""
+        if not records:
+            return cls([], {})
+
+        fields = [k for k, v in records[0].items()
+                  if k not in DATE_COLUMNS and isinstance(v, (int, float, np.number))]
+        dates = [str(r.get('trade_date') or r.get('date') or r.get('datetime', '')) for r in records]
+        columns = {
+            name: np.fromiter((r.get(name, np.nan) for r in records), dtype=np.float64, count=len(records))
+            for name in fields
+        }
+        return cls(dates, columns)
+
+    @classmethod
+    def from_columns(cls, payload: Dict[str, Any]) -> 'PriceSeries':
+        """由 to_columns() 生成的载荷还原"""
+        dates = payload.get('dates', [])
+        fields = payload.get('fields') or [k for k in payload if k not in ('dates', 'fields', 'format')]
+        columns = {
+            name: np.array([np.nan if v is None else v for v in payload[name]], dtype=np.float64)
+            for name in fields
+        }
+        return cls(dates, columns)
+
+    @classmethod
+    def coerce(cls, prices: Union['PriceSeries', Sequence[Dict[str, Any]], Dict[str, Any], None]) -> 'PriceSeries':
+        """将 PriceSeries / 字典列表 / 列式载荷统一转换为 PriceSeries"""
+        if isinstance(prices, PriceSeries):
+            return prices
+        if isinstance(prices, dict):
+            return cls.from_columns(prices)
+        return cls.from_records(prices or [])
+
+    # ------------------------------------------------------------------ 访问
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.columns.keys())
+
+    def column(self, name: str) -> np.ndarray:
+        """获取字段数组（不存在时返回全NaN数组）"""
+        values = self.columns.get(name)
+        if values is None:
+            return np.full(len(self.dates), np.nan)
+        return values
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """获取单根K线的字典表示（trade_date + 各字段）"""
+        bar: Dict[str, Any] = {'trade_date': self.dates[index]}
+        for name, values in self.columns.items():
+            bar[name] = float(values[index])
+        return bar
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __bool__(self) -> bool:
+        return len(self.dates) > 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.dates)):
+            yield self.record(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return PriceSeries(
+                self.dates[key],
+                {name: values[key] for name, values in self.columns.items()}
+            )
+        return self.record(key)
+
+    def __repr__(self) -> str:
+        return f"PriceSeries(len={len(self)}, fields={self.fields})"
+
+    # ------------------------------------------------------------------ 输出
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """转换为旧的 per-bar 字典列表"""
+        return list(self)
+
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        转换为列式载荷
+
+        数值字段保持为numpy数组，由 core.serialization 直接编码（NaN/Inf -> null）
+
+        Returns:
+            {"format": "columnar", "fields": [...], "dates": [...], "<field>": ndarray, ...}
+        """
+        payload: Dict[str, Any] = {
+            'format': COLUMNAR_FORMAT,
+            'fields': self.fields,
+            'dates': self.dates,
+        }
+        for name, values in self.columns.items():
+            # 切片/反转得到的视图不连续，orjson只能原生编码C连续数组
+            payload[name] = np.ascontiguousarray(values)
+        return payload
+
+    def to_arrow_ipc(self) -> bytes:
+        """
+        序列化为Arrow IPC流格式（适用于大窗口数据的二进制传输）
+
+        Returns:
+            Arrow IPC字节串
+
+        Raises:
+            RuntimeError: 未安装pyarrow
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise RuntimeError("Arrow格式需要安装pyarrow")
+
+        arrays = [pa.array(self.dates, type=pa.string())]
+        names = ['dates']
+        for name, values in self.columns.items():
+            arrays.append(pa.array(values, type=pa.float64(), from_pandas=True))
+            names.append(name)
+
+        table = pa.Table.from_arrays(arrays, names=names)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def is_columnar_payload(obj: Any) -> bool:
+    """判断对象是否为 PriceSeries.to_columns() 生成的列式载荷"""
+    return isinstance(obj, dict) and obj.get('format') == COLUMNAR_FORMAT
@@ -108,6 +108,17 @@ class TushareRateLimiter:
         # Tushare免费用户限制：120次/分钟，单接口不超过200次/天
         self.minute_limiter = RateLimiter(max_calls=100, time_window=60)  # 留20次余量
         self.daily_limiters = defaultdict(lambda: RateLimiter(max_calls=180, time_window=86400))  # 留20次余量
+        # 实际调用量（按账户积分对应的每分钟上限统计），供后台任务按余量调整频率
+        from .config import settings
+        self.usage = RateLimiter(max_calls=settings.TUSHARE_CALLS_PER_MINUTE, time_window=60)
+
+    def record_call(self) -> None:
+        """记录一次实际发出的Tushare调用"""
+        self.usage.is_allowed("tushare")
+
+    def usage_ratio_remaining(self) -> float:
+        """当前分钟配额剩余比例（0-1）"""
+        return self.usage.get_remaining_calls("tushare") / self.usage.max_calls
 
     def check_and_wait(self, api_name: str, timeout: float = 30.0) -> bool:
         """
@@ -140,6 +151,8 @@ class TushareRateLimiter:
         return {
             "minute_remaining": self.minute_limiter.get_remaining_calls("tushare"),
             "minute_limit": self.minute_limiter.max_calls,
+            "usage_remaining": self.usage.get_remaining_calls("tushare"),
+            "usage_limit": self.usage.max_calls,
         }
 
 
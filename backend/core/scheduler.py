@@ -8,42 +8,71 @@ from typing import Callable, Dict, List, Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor
+import hashlib
+import json
 import pytz
 import logging
 
 from .professional_report_generator_v2 import ProfessionalReportGeneratorV2
 from .concept_manager import get_concept_manager
 from .cache_strategy import get_smart_cache
+from .config import settings
+from .scheduling import AdaptiveInterval, JobMetrics, TradingDayCronTrigger, TradingSessionTrigger, timed
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 收盘后登记最新数据日期的横截面接口
+SYNCED_ENDPOINTS = ('daily_basic', 'stk_limit', 'top_list', 'margin_detail', 'ths_hot', 'limit_list_d', 'moneyflow_dc')
+
 class TaskScheduler:
     """智能任务调度器"""
 
     def __init__(self):
-        self.scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Shanghai'))
+        self.timezone = pytz.timezone('Asia/Shanghai')
+        # 所有任务默认单实例、错过的多次触发合并为一次；后台线程数受限，避免挤占交互请求
+        self.scheduler = BackgroundScheduler(
+            timezone=self.timezone,
+            executors={'default': ThreadPoolExecutor(settings.SCHEDULER_MAX_WORKERS)},
+            job_defaults={'max_instances': 1, 'coalesce': True}
+        )
         self.report_gen = ProfessionalReportGeneratorV2()
         self.concept_mgr = get_concept_manager()
         self.cache = get_smart_cache()
         
-        # 任务执行状态
+        # 任务执行状态与耗时统计
         self.task_status: Dict[str, Dict] = {}
+        self.job_metrics: Dict[str, JobMetrics] = {}
+
+        # 交易时段行情刷新的自适应间隔
+        self.market_interval = AdaptiveInterval(
+            base=settings.MARKET_REFRESH_BASE_SECONDS,
+            minimum=settings.MARKET_REFRESH_MIN_SECONDS,
+            maximum=settings.MARKET_REFRESH_MAX_SECONDS
+        )
+        self._market_fingerprint: Optional[str] = None
         
         # 注册事件监听器
         self.scheduler.add_listener(self._job_executed, EVENT_JOB_EXECUTED)
         self.scheduler.add_listener(self._job_error, EVENT_JOB_ERROR)
+        self.scheduler.add_listener(self._job_skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
         
         # 初始化所有定时任务
         self._setup_scheduled_tasks()
     
+    def _add_job(self, func: Callable, trigger, id: str, name: str, **kwargs):
+        """注册任务，并包装耗时统计"""
+        metrics = self.job_metrics.setdefault(id, JobMetrics())
+        return self.scheduler.add_job(func=timed(metrics, func), trigger=trigger, id=id, name=name, **kwargs)
+
     def _setup_scheduled_tasks(self):
         """设置所有定时任务"""
 
         # 0. 新闻预处理 (每天凌晨 03:00) - 新增
-        self.scheduler.add_job(
+        self._add_job(
             func=self._preprocess_news,
             trigger=CronTrigger(hour=3, minute=0, second=0),
             id='preprocess_news',
@@ -52,34 +81,34 @@ class TaskScheduler:
         )
 
         # 1. 早报生成 (每个交易日 08:30)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._generate_morning_report,
-            trigger=CronTrigger(hour=8, minute=30, second=0),
+            trigger=TradingDayCronTrigger(hour=8, minute=30, second=0),
             id='morning_report',
             name='生成早报',
             misfire_grace_time=300  # 5分钟容错
         )
         
         # 2. 午报生成 (每个交易日 12:00)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._generate_noon_report,
-            trigger=CronTrigger(hour=12, minute=0, second=0),
+            trigger=TradingDayCronTrigger(hour=12, minute=0, second=0),
             id='noon_report',
             name='生成午报',
             misfire_grace_time=300
         )
         
         # 3. 晚报生成 (每个交易日 18:00)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._generate_evening_report,
-            trigger=CronTrigger(hour=18, minute=0, second=0),
+            trigger=TradingDayCronTrigger(hour=18, minute=0, second=0),
             id='evening_report',
             name='生成晚报',
             misfire_grace_time=300
         )
         
         # 4. 概念库刷新 (每天 07:00)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._refresh_concepts,
             trigger=CronTrigger(hour=7, minute=0, second=0),
             id='refresh_concepts',
@@ -88,7 +117,7 @@ class TaskScheduler:
         )
         
         # 5. 缓存清理 (每天 02:00)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._cleanup_cache,
             trigger=CronTrigger(hour=2, minute=0, second=0),
             id='cleanup_cache',
@@ -96,6 +125,15 @@ class TaskScheduler:
             misfire_grace_time=1800
         )
         
+        # 5.1 智能缓存维护 (每分钟)：交易时段预刷新热点键，冷键降级
+        self._add_job(
+            func=self._maintain_smart_cache,
+            trigger=IntervalTrigger(minutes=1),
+            id='smart_cache_maintenance',
+            name='智能缓存维护',
+            misfire_grace_time=30
+        )
+
         # 6. 交易时间内的高频任务
         self._setup_trading_hours_tasks()
         
@@ -105,38 +143,38 @@ class TaskScheduler:
     def _setup_trading_hours_tasks(self):
         """设置交易时间内的高频任务"""
         
-        # 市场数据刷新 (交易时间内每5分钟)
-        # 上午: 09:30-11:30, 下午: 13:00-15:00
-        for hour in [9, 10, 11, 13, 14]:
-            for minute in range(0, 60, 5):
-                # 跳过非交易时间
-                if hour == 9 and minute < 30:
-                    continue
-                if hour == 11 and minute > 30:
-                    continue
-                
-                self.scheduler.add_job(
-                    func=self._refresh_market_data,
-                    trigger=CronTrigger(hour=hour, minute=minute, second=0),
-                    id=f'market_refresh_{hour}_{minute}',
-                    name=f'市场数据刷新{hour}:{minute:02d}',
-                    misfire_grace_time=60
-                )
+        # 市场数据刷新：仅在交易日的 09:30-11:30、13:00-15:00 内触发，间隔随数据变化率与Tushare配额余量自适应
+        self._add_job(
+            func=self._refresh_market_data,
+            trigger=TradingSessionTrigger(self.market_interval, self.timezone),
+            id='market_refresh',
+            name='市场数据刷新',
+            misfire_grace_time=60
+        )
     
     def _setup_after_hours_tasks(self):
         """设置盘后数据更新任务"""
         
         # 盘后基础数据更新 (15:30)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._update_basic_data,
-            trigger=CronTrigger(hour=15, minute=30, second=0),
+            trigger=TradingDayCronTrigger(hour=15, minute=30, second=0),
             id='update_basic_data',
             name='更新基础数据',
             misfire_grace_time=1800
         )
         
+        # 热门股票K线预测预计算 (15:45)
+        self._add_job(
+            func=self._precompute_predictions,
+            trigger=TradingDayCronTrigger(hour=15, minute=45, second=0),
+            id='precompute_predictions',
+            name='预计算热门股票K线预测',
+            misfire_grace_time=1800
+        )
+
         # 财务数据更新 (19:00)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._update_financial_data,
             trigger=CronTrigger(hour=19, minute=0, second=0),
             id='update_financial_data',
@@ -145,7 +183,7 @@ class TaskScheduler:
         )
         
         # 新闻公告爬取 (每小时)
-        self.scheduler.add_job(
+        self._add_job(
             func=self._crawl_news_announcements,
             trigger=IntervalTrigger(hours=1),
             id='crawl_news',
@@ -156,11 +194,6 @@ class TaskScheduler:
     def _generate_morning_report(self):
         """生成早报任务"""
         try:
-            # 只在交易日执行
-            if not self._is_trading_day():
-                logger.info("非交易日，跳过早报生成")
-                return
-            
             logger.info("开始生成早报...")
             report = self.report_gen.generate_morning_report()
             
@@ -183,10 +216,6 @@ class TaskScheduler:
     def _generate_noon_report(self):
         """生成午报任务"""
         try:
-            if not self._is_trading_day():
-                logger.info("非交易日，跳过午报生成")
-                return
-            
             logger.info("开始生成午报...")
             report = self.report_gen.generate_noon_report()
             
@@ -209,10 +238,6 @@ class TaskScheduler:
     def _generate_evening_report(self):
         """生成晚报任务"""
         try:
-            if not self._is_trading_day():
-                logger.info("非交易日，跳过晚报生成")
-                return
-            
             logger.info("开始生成晚报...")
             report = self.report_gen.generate_evening_report()
             
@@ -258,11 +283,12 @@ class TaskScheduler:
         """清理缓存任务"""
         try:
             logger.info("开始清理过期缓存...")
-            self.cache.clear_expired()
+            removed = self.cache.clear_expired()
             
             self.task_status['cleanup_cache'] = {
                 'last_run': datetime.now().isoformat(),
-                'status': 'success'
+                'status': 'success',
+                'removed': removed
             }
             
             logger.info("缓存清理完成")
@@ -275,19 +301,45 @@ class TaskScheduler:
                 'error': str(e)
             }
     
+    def _maintain_smart_cache(self):
+        """智能缓存维护任务"""
+        try:
+            refreshed = self.cache.refresh_hot() if self._is_trading_time() else None
+            demoted = self.cache.demote_cold()
+            self.task_status['smart_cache_maintenance'] = {
+                'last_run': datetime.now().isoformat(),
+                'status': 'success',
+                'refresh': refreshed,
+                'demoted': demoted
+            }
+        except Exception as e:
+            logger.error(f"智能缓存维护失败: {e}")
+            self.task_status['smart_cache_maintenance'] = {
+                'last_run': datetime.now().isoformat(),
+                'status': 'error',
+                'error': str(e)
+            }
+
     def _refresh_market_data(self):
         """刷新市场数据任务"""
         try:
-            if not self._is_trading_time():
-                return
-            
             # 刷新指数数据缓存
             self._clear_index_cache()
             
             # 刷新市场数据
             from .market import fetch_market_overview
             market_data = fetch_market_overview()
-            logger.info(f"市场数据刷新完成 - 指数数量: {len(market_data.get('indices', []))}")
+
+            # 按指数数据是否变化调整下一次刷新间隔
+            fingerprint = hashlib.md5(
+                json.dumps(market_data.get('indices'), sort_keys=True, default=str).encode()
+            ).hexdigest()
+            self.market_interval.observe(fingerprint != self._market_fingerprint)
+            self._market_fingerprint = fingerprint
+            logger.info(
+                f"市场数据刷新完成 - 指数数量: {len(market_data.get('indices', []))}, "
+                f"下次间隔: {self.market_interval.seconds:.0f}秒"
+            )
             
         except Exception as e:
             logger.error(f"市场数据刷新失败: {e}")
@@ -311,20 +363,52 @@ class TaskScheduler:
     def _update_basic_data(self):
         """更新基础数据任务"""
         try:
-            if not self._is_trading_day():
-                return
-            
-            # 更新股票列表、基本信息等
-            logger.info("基础数据更新完成")
+            # 登记各横截面接口的最新有数据交易日，盘后请求直接使用，无需逐日试探
+            from . import tushare_client as tc
+            from .trading_calendar import data_dates
+            resolved = {}
+            for endpoint in SYNCED_ENDPOINTS:
+                api_func = getattr(tc, endpoint, None)
+                if api_func is not None:
+                    resolved[endpoint] = data_dates.resolve(endpoint, api_func)
+            logger.info(f"基础数据更新完成: {resolved}")
             
         except Exception as e:
             logger.error(f"基础数据更新失败: {e}")
     
+    def _precompute_predictions(self):
+        """收盘后为近期访问最多的股票预计算K线预测（写入预测缓存）"""
+        try:
+            from .config import settings
+            from .kronos_predictor import get_kronos_service, is_kronos_available, resolve_device
+            if not is_kronos_available():
+                return
+
+            service = get_kronos_service(device=resolve_device())
+            summary = service.precompute_popular(top_n=settings.KRONOS_PRECOMPUTE_TOP_N)
+
+            self.task_status['precompute_predictions'] = {
+                'last_run': datetime.now().isoformat(),
+                'status': 'success',
+                **summary
+            }
+            logger.info(f"K线预测预计算完成: {summary}")
+
+        except Exception as e:
+            logger.error(f"K线预测预计算失败: {e}")
+            self.task_status['precompute_predictions'] = {
+                'last_run': datetime.now().isoformat(),
+                'status': 'error',
+                'error': str(e)
+            }
+
     def _update_financial_data(self):
         """更新财务数据任务"""
         try:
-            # 更新财务报表、指标等
-            logger.info("财务数据更新完成")
+            # 按报告期批量加载全市场财务报表，披露期内的报告期纳入新公告
+            from .financial_store import get_financial_store
+            summary = get_financial_store().refresh()
+            logger.info(f"财务数据更新完成: {summary}")
             
         except Exception as e:
             logger.error(f"财务数据更新失败: {e}")
@@ -366,15 +450,9 @@ class TaskScheduler:
             }
     
     def _is_trading_day(self) -> bool:
-        """判断是否为交易日"""
-        now = datetime.now()
-        
-        # 简单判断：周一到周五（实际应该排除节假日）
-        if now.weekday() >= 5:  # 6=周日, 0=周一
-            return False
-        
-        # 这里可以添加更复杂的节假日判断逻辑
-        return True
+        """判断是否为交易日（本地交易日历，含节假日）"""
+        from .trading_calendar import trading_calendar
+        return trading_calendar.is_trading_day(datetime.now())
     
     def _is_trading_time(self) -> bool:
         """判断是否在交易时间"""
@@ -400,6 +478,13 @@ class TaskScheduler:
     def _job_error(self, event):
         """任务执行失败回调"""
         logger.error(f"任务执行失败: {event.job_id}, 错误: {event.exception}")
+
+    def _job_skipped(self, event):
+        """任务因上次执行未结束或错过触发时间而跳过的回调"""
+        metrics = self.job_metrics.get(event.job_id)
+        if metrics:
+            metrics.skip()
+        logger.warning(f"任务触发被跳过: {event.job_id}")
     
     def start(self):
         """启动调度器"""
@@ -434,13 +519,16 @@ class TaskScheduler:
                 'id': job.id,
                 'name': job.name,
                 'next_run_time': job.next_run_time.isoformat() if job.next_run_time else None,
-                'last_status': self.task_status.get(job.id, {})
+                'last_status': self.task_status.get(job.id, {}),
+                'metrics': self.job_metrics[job.id].snapshot() if job.id in self.job_metrics else None
             })
         
         return {
             'scheduler_running': self.scheduler.running,
             'jobs': job_info,
-            'task_status': self.task_status
+            'task_status': self.task_status,
+            'market_refresh': self.market_interval.snapshot(),
+            'smart_cache': self.cache.get_stats()
         }
     
     def run_job_now(self, job_id: str) -> bool:
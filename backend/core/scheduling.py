@@ -0,0 +1,209 @@
+"""
+调度辅助模块
+- 交易日历感知的触发器：非交易日（含节假日）不触发，交易时段触发器只在连续竞价时段内触发
+- 自适应间隔：按观测到的数据变化率与Tushare剩余配额调整刷新频率
+- 任务耗时直方图：供调度器任务状态展示
+"""
+import bisect
+import functools
+import threading
+import time
+from datetime import datetime, time as dtime, timedelta
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+
+from .trading_calendar import trading_calendar
+
+# A股连续竞价时段
+TRADING_SESSIONS: Tuple[Tuple[dtime, dtime], ...] = ((dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0)))
+
+# 耗时直方图桶上界（秒）
+DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+
+class TradingDayCronTrigger(CronTrigger):
+    """只在交易日触发的Cron触发器（交易日判断由触发器完成，任务本身无需检查）"""
+
+    # 最多向后跳过的触发次数（长假约10个自然日）
+    MAX_SKIPS = 31
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        fire_time = super().get_next_fire_time(previous_fire_time, now)
+        for _ in range(self.MAX_SKIPS):
+            if fire_time is None or trading_calendar.is_trading_day(fire_time):
+                return fire_time
+            fire_time = super().get_next_fire_time(fire_time, fire_time + timedelta(seconds=1))
+        return fire_time
+
+    def __str__(self):
+        return f"trading_day_{super().__str__()}"
+
+
+class AdaptiveInterval:
+    """
+    自适应刷新间隔
+
+    数据变化越频繁间隔越短；Tushare分钟配额余量不足时按比例放慢，给交互请求让出配额
+    """
+
+    def __init__(self, base: float = 300, minimum: float = 60, maximum: float = 900, smoothing: float = 0.3):
+        """
+        Args:
+            base: 基准间隔（秒），变化率为0.5时的间隔
+            minimum: 最短间隔（秒）
+            maximum: 最长间隔（秒）
+            smoothing: 变化率指数平滑系数
+        """
+        self.base = base
+        self.minimum = minimum
+        self.maximum = maximum
+        self.smoothing = smoothing
+        self.change_rate = 0.5
+        self._lock = threading.Lock()
+
+    def observe(self, changed: bool) -> None:
+        """记录一次刷新是否观测到数据变化"""
+        with self._lock:
+            self.change_rate += self.smoothing * ((1.0 if changed else 0.0) - self.change_rate)
+
+    @staticmethod
+    def quota_ratio() -> float:
+        """Tushare分钟配额剩余比例（0-1）"""
+        from .rate_limiter import get_tushare_limiter
+        return get_tushare_limiter().usage_ratio_remaining()
+
+    @property
+    def seconds(self) -> float:
+        """当前间隔（秒）"""
+        interval = self.base * 0.5 / max(self.change_rate, 0.05)
+        ratio = self.quota_ratio()
+        if ratio < 0.5:
+            interval *= 1 + (0.5 - ratio) * 6  # 余量为0时放慢到4倍
+        return min(self.maximum, max(self.minimum, interval))
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            'interval_seconds': round(self.seconds, 1),
+            'change_rate': round(self.change_rate, 3),
+            'quota_remaining': round(self.quota_ratio(), 3),
+        }
+
+
+class TradingSessionTrigger(BaseTrigger):
+    """
+    交易时段内按自适应间隔触发
+
+    下一次触发时间为上次触发加当前间隔；落在时段之外时顺延到下一个交易时段（按交易日历跳过节假日）的开盘时刻
+    """
+
+    def __init__(self, interval: AdaptiveInterval, timezone, sessions: Sequence[Tuple[dtime, dtime]] = TRADING_SESSIONS):
+        self.interval = interval
+        self.timezone = timezone
+        self.sessions = tuple(sessions)
+
+    def _localize(self, day, at: dtime) -> datetime:
+        return self.timezone.localize(datetime.combine(day, at))
+
+    def _next_session_start(self, after: datetime) -> Optional[datetime]:
+        """after之后（含）最近的交易时段开始时刻"""
+        day = after.date()
+        for _ in range(31):
+            if trading_calendar.is_trading_day(day):
+                for start, _end in self.sessions:
+                    start_at = self._localize(day, start)
+                    if start_at >= after:
+                        return start_at
+            day += timedelta(days=1)
+            after = self._localize(day, dtime(0, 0))
+        return None
+
+    def _in_session(self, moment: datetime) -> bool:
+        if not trading_calendar.is_trading_day(moment):
+            return False
+        clock = moment.time()
+        return any(start <= clock <= end for start, end in self.sessions)
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        now = now.astimezone(self.timezone)
+        if previous_fire_time is None:
+            candidate = now
+        else:
+            candidate = max(previous_fire_time.astimezone(self.timezone) + timedelta(seconds=self.interval.seconds), now)
+        if self._in_session(candidate):
+            return candidate
+        return self._next_session_start(candidate)
+
+    def __str__(self):
+        return f"trading_session[{self.interval.seconds:.0f}s]"
+
+    def __repr__(self):
+        return f"<TradingSessionTrigger (interval={self.interval.seconds:.0f}s)>"
+
+
+class JobMetrics:
+    """单个任务的耗时直方图与执行计数"""
+
+    def __init__(self, buckets: Sequence[float] = DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 > 最大上界
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds: Optional[float] = None
+        self.running_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> float:
+        started = time.time()
+        self.running_since = started
+        return started
+
+    def finish(self, started: float, error: bool = False) -> None:
+        elapsed = time.time() - started
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, elapsed)] += 1
+            self.runs += 1
+            self.errors += int(error)
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            self.last_seconds = elapsed
+            self.running_since = None
+
+    def skip(self) -> None:
+        """记录一次因上次执行未结束（max_instances）或错过而跳过的触发"""
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+            return {
+                'runs': self.runs,
+                'errors': self.errors,
+                'skipped': self.skipped,
+                'avg_seconds': round(self.total_seconds / self.runs, 3) if self.runs else None,
+                'max_seconds': round(self.max_seconds, 3),
+                'last_seconds': round(self.last_seconds, 3) if self.last_seconds is not None else None,
+                'running_for': round(time.time() - self.running_since, 1) if self.running_since else None,
+                'histogram': dict(zip(labels, self.counts)),
+            }
+
+
+def timed(metrics: JobMetrics, func):
+    """包装任务函数，记录耗时与异常"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = metrics.start()
+        error = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            metrics.finish(started, error)
+    return wrapper
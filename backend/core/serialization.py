@@ -0,0 +1,113 @@
+"""
+响应序列化模块
+在JSON编码阶段一次性完成 NaN/Inf -> null 转换，并支持 numpy/pandas 类型，
+替代"先递归 clean_nan_values 再交给标准编码器"的两遍处理
+"""
+import datetime as dt
+import decimal
+import json
+import logging
+import math
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+from .price_series import PriceSeries
+from .utils import clean_nan_values
+
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+    _ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+if _ORJSON_AVAILABLE:
+    # orjson 原生将 NaN/Inf 编码为 null；OPT_SERIALIZE_NUMPY 直接处理 ndarray 与 numpy 标量
+    # pd.NaT 是 datetime 子类，orjson 原生编码会输出 "NaT"，因此日期时间统一交给 _default 处理
+    _ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                       | orjson.OPT_PASSTHROUGH_DATETIME)
+else:
+    logger.warning("orjson未安装，响应序列化回退到标准json（性能较低）")
+
+
+def _default(obj: Any) -> Any:
+    """处理编码器原生不支持的类型"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, PriceSeries):
+        return obj.to_columns()
+    if isinstance(obj, np.generic):
+        value = obj.item()
+        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+            return None
+        return value
+    if isinstance(obj, np.ndarray):
+        # orjson无法原生处理的数组（非连续/object类型）及标准库回退路径
+        return clean_nan_values(obj.tolist())
+    if isinstance(obj, pd.Timestamp):
+        return None if pd.isna(obj) else obj.isoformat()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('records')
+    if isinstance(obj, (dt.datetime, dt.date, dt.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        value = float(obj)
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    将对象编码为UTF-8 JSON字节串，NaN/Inf 编码为 null
+
+    Args:
+        obj: 需要序列化的对象
+
+    Returns:
+        JSON字节串
+    """
+    if _ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    # 标准库无法在编码时替换NaN，回退到先清理再编码
+    return json.dumps(
+        clean_nan_values(obj),
+        ensure_ascii=False,
+        allow_nan=False,
+        default=_default,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """
+    将对象编码为JSON字符串（用于SSE等文本场景）
+
+    Args:
+        obj: 需要序列化的对象
+
+    Returns:
+        JSON字符串
+    """
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    基于orjson的JSON响应类
+
+    直接返回该响应可绕过FastAPI的 jsonable_encoder，整份数据只遍历一次
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
@@ -7,7 +7,7 @@ import pandas as pd
 from .tushare_client import (
     daily_basic, moneyflow_dc, limit_list_d, ths_hot, stock_basic
 )
-from .trading_date_helper import get_recent_trading_dates
+from .trading_date_helper import get_recent_trading_dates, find_latest_trading_date_with_data
 
 
 def _today_ymd() -> str:
@@ -51,15 +51,14 @@ def get_top_picks(trade_date: Optional[str] = None, limit: int = 10) -> List[Dic
     # 选定交易日
     td = _to_ymd(trade_date)
     if not trade_date:
-        dates = get_recent_trading_dates(1)
-        if dates:
-            td = dates[0]
+        # 最近有数据的交易日（登记表命中时无需试探）
+        td = find_latest_trading_date_with_data(daily_basic) or td
 
     # 1) 横截面基础面/估值（若指定日期无数据，向前查找最近有数据的交易日）
     db = daily_basic(trade_date=td)
     if db is None or db.empty:
         # 向前寻找最近的有效交易日（不使用缓存或旧数据文件，仅查询API）
-        for dt0 in get_recent_trading_dates(10):
+        for dt0 in get_recent_trading_dates(10, end=td):
             db = daily_basic(trade_date=dt0)
             if db is not None and not db.empty:
                 td = dt0
@@ -0,0 +1,155 @@
+"""
+异步SSE流式核心
+- 同步分析流程在专用线程池中运行，事件通过 asyncio 队列推送给订阅者，不再占用FastAPI线程池
+- 同一key（如同一只股票）的多个客户端共享同一次分析（fan-out），后加入者先回放已产生的事件
+- 定期发送心跳；全部订阅者断开后通过取消令牌中止底层流程，避免继续消耗Tushare配额
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Any]
+Emit = Callable[[str, Any], None]
+# runner(emit, cancel_event)：在工作线程中执行，通过emit推送事件，需定期检查cancel_event
+Runner = Callable[[Emit, threading.Event], None]
+
+_END = object()
+
+
+class PipelineCancelled(Exception):
+    """分析流程被取消（所有订阅者已断开）"""
+
+
+class _StreamJob:
+    """一次正在运行的流式任务及其订阅者"""
+
+    def __init__(self, key: str, history_limit: int):
+        self.key = key
+        self.history: List[Event] = []
+        self.history_limit = history_limit
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.cancel_event = threading.Event()
+        self.finished = False
+
+    def publish(self, item: Any) -> None:
+        """在事件循环线程中调用：记录历史并分发给所有订阅者"""
+        if item is _END:
+            self.finished = True
+        elif len(self.history) < self.history_limit:
+            self.history.append(item)
+        for queue in self.subscribers:
+            queue.put_nowait(item)
+
+
+class StreamHub:
+    """SSE流式任务中心"""
+
+    def __init__(self, max_workers: int = 8, heartbeat_interval: float = 15.0,
+                 history_limit: int = 500):
+        """
+        Args:
+            max_workers: 同时运行的分析任务上限
+            heartbeat_interval: 无事件时的心跳间隔（秒）
+            history_limit: 每个任务保留用于回放的事件数上限
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stream")
+        self._jobs: Dict[str, _StreamJob] = {}
+        self.heartbeat_interval = heartbeat_interval
+        self.history_limit = history_limit
+
+    def _start_job(self, key: str, runner: Runner) -> _StreamJob:
+        loop = asyncio.get_running_loop()
+        job = _StreamJob(key, self.history_limit)
+        self._jobs[key] = job
+
+        def _emit(event: str, data: Any) -> None:
+            loop.call_soon_threadsafe(job.publish, (event, data))
+
+        def _run() -> None:
+            try:
+                runner(_emit, job.cancel_event)
+            except PipelineCancelled:
+                logger.info(f"流式任务已取消: {key}")
+            except Exception as e:
+                logger.error(f"流式任务失败 {key}: {e}", exc_info=True)
+                _emit("error", {"message": str(e)})
+            finally:
+                loop.call_soon_threadsafe(self._finish_job, job)
+
+        loop.run_in_executor(self._executor, _run)
+        logger.info(f"启动流式任务: {key}")
+        return job
+
+    def _finish_job(self, job: _StreamJob) -> None:
+        job.publish(_END)
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+    async def stream(
+        self,
+        key: str,
+        runner: Runner,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[Event]:
+        """
+        订阅key对应的任务（不存在则启动），逐个产出 (event, data)
+
+        Args:
+            key: 任务去重键，相同key的请求共享同一次执行
+            runner: 任务函数
+            is_disconnected: 检测客户端是否断开的协程函数（如 request.is_disconnected）
+
+        Yields:
+            (事件名, 数据)；无事件时产出 ("ping", {}) 心跳
+        """
+        job = self._jobs.get(key)
+        if job is None or job.finished or job.cancel_event.is_set():
+            job = self._start_job(key, runner)
+        else:
+            logger.info(f"复用运行中的流式任务: {key}（订阅者 {len(job.subscribers) + 1}）")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        backlog = list(job.history)
+        job.subscribers.add(queue)
+
+        try:
+            for item in backlog:
+                yield item
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        break
+                    yield ("ping", {})
+                    continue
+
+                if item is _END:
+                    break
+                yield item
+        finally:
+            job.subscribers.discard(queue)
+            if not job.subscribers and not job.finished:
+                logger.info(f"流式任务无订阅者，取消: {key}")
+                job.cancel_event.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取运行中任务的统计"""
+        return {
+            "running_jobs": len(self._jobs),
+            "jobs": {key: len(job.subscribers) for key, job in self._jobs.items()},
+        }
+
+
+# 全局实例
+stream_hub = StreamHub(
+    max_workers=settings.STREAM_MAX_JOBS,
+    heartbeat_interval=settings.STREAM_HEARTBEAT_SECONDS
+)
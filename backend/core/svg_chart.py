@@ -0,0 +1,261 @@
+"""
+向量化SVG图表渲染模块
+坐标一次性由numpy计算，每个数据系列输出一个紧凑的<path>（而非每根K线、每个点一个元素），
+背景、网格、图例等与数据无关的静态片段按布局缓存并在多张图之间复用
+"""
+import base64
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from .price_series import PriceSeries
+
+logger = logging.getLogger(__name__)
+
+# 配色
+BG_COLOR = '#1a1d29'
+GRID_COLOR = '#2a2e3f'
+LABEL_COLOR = '#8b93a7'
+RISE_COLOR = '#ef5350'
+FALL_COLOR = '#26a69a'
+MA5_COLOR = '#ffb74d'
+PRED_COLOR = '#9333ea'
+ACTUAL_COLOR = '#10b981'
+ERROR_COLOR = '#f59e0b'
+
+GRID_LINES = 5
+DATE_LABEL_EVERY = 10
+MARKER_RADIUS = 4
+
+
+def _path_data(fmt: str, coords: np.ndarray) -> str:
+    """
+    将坐标矩阵格式化为路径数据：每行按fmt格式化一次，整体只做一次字符串格式化
+
+    Args:
+        fmt: 单行的格式串（如 "M%.1f %.1fV%.1f"）
+        coords: [N, k] 坐标矩阵，k等于fmt中的占位符数量
+
+    Returns:
+        路径数据字符串
+    """
+    if len(coords) == 0:
+        return ''
+    return (fmt * len(coords)) % tuple(np.round(coords, 1).ravel().tolist())
+
+
+def _polyline(xs: np.ndarray, ys: np.ndarray) -> str:
+    """折线路径数据（M x y L x y ...）"""
+    if len(xs) == 0:
+        return ''
+    points = np.column_stack([xs, ys])
+    return 'M' + _path_data('%.1f %.1fL', points)[:-1]
+
+
+def _markers(xs: np.ndarray, ys: np.ndarray, r: float = MARKER_RADIUS) -> str:
+    """圆形标记路径数据（每个点两段弧），一个<path>绘制全部标记"""
+    coords = np.column_stack([xs - r, ys])
+    return _path_data(f'M%.1f %.1fa{r} {r} 0 1 0 {2 * r} 0a{r} {r} 0 1 0 {-2 * r} 0', coords)
+
+
+class KlineChartRenderer:
+    """K线图渲染器（同一布局的多张图共享静态片段）"""
+
+    def __init__(self, width: int = 1200, height: int = 500,
+                 padding: Tuple[int, int, int, int] = (40, 100, 60, 60), max_bars: int = 60):
+        """
+        Args:
+            width: 图宽
+            height: 图高
+            padding: 上、右、下、左边距
+            max_bars: 显示的最大K线数量（最近N根）
+        """
+        self.width = width
+        self.height = height
+        self.top, self.right, self.bottom, self.left = padding
+        self.max_bars = max_bars
+        self.chart_width = width - self.left - self.right
+        self.chart_height = height - self.top - self.bottom
+
+    # ------------------------------------------------------------------ 静态片段
+
+    @lru_cache(maxsize=4)
+    def _frame(self) -> str:
+        """SVG头、背景与网格线（与数据无关）"""
+        ys = self.top + self.chart_height * np.arange(GRID_LINES) / (GRID_LINES - 1)
+        grid = _path_data(f'M{self.left} %.1fH{self.width - self.right}', ys[:, None])
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" '
+            f'viewBox="0 0 {self.width} {self.height}">'
+            f'<rect width="{self.width}" height="{self.height}" fill="{BG_COLOR}"/>'
+            f'<path d="{grid}" stroke="{GRID_COLOR}" stroke-width="1" stroke-dasharray="4,4"/>'
+        )
+
+    @lru_cache(maxsize=8)
+    def _legend(self, with_predictions: bool) -> str:
+        """图例（按是否含预测缓存两种版本）"""
+        y, x = self.top + 20, self.left
+        items = [(0, RISE_COLOR, 3, '', '涨'), (70, FALL_COLOR, 3, '', '跌'), (140, MA5_COLOR, 2, '', 'MA5')]
+        if with_predictions:
+            items.append((220, PRED_COLOR, 2, ' stroke-dasharray="5,5"', 'AI预测'))
+        parts = [
+            f'<line x1="{x + dx}" y1="{y}" x2="{x + dx + 30}" y2="{y}" stroke="{color}" stroke-width="{sw}"{extra}/>'
+            f'<text x="{x + dx + 35}" y="{y + 4}" fill="{color}" font-size="12">{label}</text>'
+            for dx, color, sw, extra, label in items
+        ]
+        if with_predictions:
+            parts.append(
+                f'<circle cx="{x + 320}" cy="{y}" r="{MARKER_RADIUS}" fill="{ACTUAL_COLOR}" stroke="#ffffff" stroke-width="1"/>'
+                f'<text x="{x + 330}" y="{y + 4}" fill="{ACTUAL_COLOR}" font-size="12">实际</text>'
+            )
+        return ''.join(parts)
+
+    # ------------------------------------------------------------------ 渲染
+
+    def render(self, prices, stock_name: str = '', predictions: Optional[List[Dict]] = None) -> str:
+        """
+        渲染K线图（含MA5与预测曲线）
+
+        Args:
+            prices: PriceSeries、per-bar字典列表或列式载荷（按日期倒序）
+            stock_name: 标题中的股票名称
+            predictions: 预测列表（predicted_price，可选actual_price），接在最后一根K线之后
+
+        Returns:
+            SVG文档字符串，无数据时为空字符串
+        """
+        if prices is None or len(prices) == 0:
+            return ''
+
+        display = PriceSeries.coerce(prices)[:self.max_bars][::-1]  # 反转为正序
+        opens = display.column('open')
+        highs = display.column('high')
+        lows = display.column('low')
+        closes = display.column('close')
+        n = len(display)
+
+        pred = np.array([p['predicted_price'] for p in predictions or []], dtype=np.float64)
+        actual = np.array([p.get('actual_price') or np.nan for p in predictions or []], dtype=np.float64)
+
+        # 价格范围与坐标变换
+        max_price = float(np.nanmax(highs))
+        min_price = float(np.nanmin(lows))
+        if len(pred):
+            max_price = max(max_price, float(pred.max()))
+            min_price = min(min_price, float(pred.min()))
+        pad = (max_price - min_price) * 0.1
+        max_y, min_y = max_price + pad, min_price - pad
+        total_range = (max_y - min_y) or 1.0
+        scale = self.chart_height / total_range
+
+        def to_y(values: np.ndarray) -> np.ndarray:
+            return self.top + (max_y - values) * scale
+
+        step = self.chart_width / n
+        candle_width = max(4, min(14, step - 3))
+        xs = self.left + np.arange(n) * step + candle_width  # K线实体左边
+        cx = xs + candle_width / 2                           # K线中线
+
+        open_y, close_y, high_y, low_y = to_y(opens), to_y(closes), to_y(highs), to_y(lows)
+        body_top = np.minimum(open_y, close_y)
+        body_height = np.maximum(np.abs(close_y - open_y), 1)
+        rise = closes >= opens
+
+        parts = [self._frame()]
+        title = f'{escape(stock_name)} - 日K线图 {"+ AI预测对比" if len(pred) else ""}'
+        parts.append(f'<text x="{self.width / 2}" y="25" fill="#ffffff" font-size="18" '
+                     f'font-weight="bold" text-anchor="middle">{title}</text>')
+
+        # 价格刻度
+        label_x = self.width - self.right + 10
+        for i in range(GRID_LINES):
+            ratio = i / (GRID_LINES - 1)
+            y = self.top + self.chart_height * ratio
+            parts.append(f'<text x="{label_x}" y="{y + 5:.1f}" fill="{LABEL_COLOR}" font-size="12">'
+                         f'{max_y - total_range * ratio:.2f}</text>')
+
+        # K线：每种颜色一个<path>，上影线 + 实体矩形 + 下影线
+        candle_fmt = f'M%.1f %.1fV%.1fM%.1f %.1fh{candle_width:.1f}v%.1fh{-candle_width:.1f}zM%.1f %.1fV%.1f'
+        coords = np.column_stack([
+            cx, high_y, body_top,
+            xs, body_top, body_height,
+            cx, body_top + body_height, low_y,
+        ])
+        for mask, color, fill in ((rise, RISE_COLOR, RISE_COLOR), (~rise, FALL_COLOR, BG_COLOR)):
+            if mask.any():
+                parts.append(f'<path d="{_path_data(candle_fmt, coords[mask])}" fill="{fill}" '
+                             f'stroke="{color}" stroke-width="1.5"/>')
+
+        # 日期标签
+        label_y = self.height - self.bottom + 20
+        for idx in range(0, n, DATE_LABEL_EVERY):
+            date_str = str(display.dates[idx])
+            parts.append(f'<text x="{cx[idx]:.1f}" y="{label_y}" fill="{LABEL_COLOR}" font-size="11" '
+                         f'text-anchor="middle">{date_str[4:6]}/{date_str[6:8]}</text>')
+
+        # MA5（累积和滑窗）
+        if n >= 5:
+            csum = np.concatenate([[0.0], np.cumsum(closes)])
+            ma5 = (csum[5:] - csum[:-5]) / 5
+            parts.append(f'<path d="{_polyline(cx[4:], to_y(ma5))}" fill="none" stroke="{MA5_COLOR}" '
+                         f'stroke-width="2" opacity="0.8"/>')
+
+        # 预测曲线：起点为最后一根实际K线，预测点接在其后
+        if len(pred):
+            px = self.left + (n + np.arange(len(pred))) * step + candle_width
+            py = to_y(pred)
+            line_x = np.concatenate([[cx[-1]], px])
+            line_y = np.concatenate([[close_y[-1]], py])
+            parts.append(f'<path d="{_polyline(line_x, line_y)}" fill="none" stroke="{PRED_COLOR}" '
+                         f'stroke-width="2.5" stroke-dasharray="5,5" opacity="0.9"/>')
+
+            has_actual = ~np.isnan(actual)
+            if has_actual.any():
+                ay = to_y(actual[has_actual])
+                err = np.column_stack([px[has_actual], py[has_actual], ay])
+                parts.append(f'<path d="{_path_data("M%.1f %.1fV%.1f", err)}" stroke="{ERROR_COLOR}" '
+                             f'stroke-width="1" stroke-dasharray="2,2"/>')
+            parts.append(f'<path d="{_markers(px, py)}" fill="{PRED_COLOR}" stroke="#ffffff" stroke-width="1"/>')
+            if has_actual.any():
+                parts.append(f'<path d="{_markers(px[has_actual], ay)}" fill="{ACTUAL_COLOR}" '
+                             f'stroke="#ffffff" stroke-width="1"/>')
+
+        parts.append(self._legend(bool(len(pred))))
+
+        # 最新价格标注
+        latest_close = float(closes[-1])
+        latest_y = float(close_y[-1])
+        badge = RISE_COLOR if n > 1 and latest_close >= closes[-2] else FALL_COLOR
+        parts.append(f'<rect x="{self.width - self.right}" y="{latest_y - 15:.1f}" width="90" height="30" '
+                     f'fill="{badge}" rx="4"/>'
+                     f'<text x="{self.width - self.right + 45}" y="{latest_y + 5:.1f}" fill="#ffffff" '
+                     f'font-size="14" font-weight="bold" text-anchor="middle">{latest_close:.2f}</text>')
+
+        parts.append('</svg>')
+        return ''.join(parts)
+
+
+def to_data_url(svg: str, encoding: str = 'base64') -> str:
+    """
+    SVG转data URL
+
+    Args:
+        svg: SVG文本
+        encoding: 'base64'（兼容性最好）或 'utf8'（百分号转义，空格同样转义，可直接用于Markdown图片链接）
+
+    Returns:
+        data URL，svg为空时返回空字符串
+    """
+    if not svg:
+        return ''
+    if encoding == 'utf8':
+        return 'data:image/svg+xml;charset=utf-8,' + quote(svg, safe='=:/,')
+    return 'data:image/svg+xml;base64,' + base64.b64encode(svg.encode('utf-8')).decode('ascii')
+
+
+# 全局实例（默认布局）
+kline_renderer = KlineChartRenderer()
@@ -0,0 +1,363 @@
+"""
+本地交易日历服务
+持久化多年的上交所交易日历，交易日判断、前后推移、区间查询均为本地O(1)运算；
+同时维护"各接口最新有数据日期"登记表，由同步任务和日期解析结果更新，
+使"最近有数据的交易日"解析在绝大多数情况下不再逐日试探调用API
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .cache_manager import _atomic_write
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y%m%d'
+CALENDAR_FILE = 'trading_calendar.json'
+REGISTRY_FILE = 'data_dates.json'
+# 日历覆盖范围：向前若干年，向后到明年年底（交易所通常在12月公布次年休市安排）
+HISTORY_YEARS = 5
+# 日历文件超过该天数后重新拉取，以纳入新公布的休市安排
+CALENDAR_MAX_AGE_DAYS = 7
+
+
+def _to_date(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(str(value).replace('-', '')[:8], DATE_FORMAT)
+
+
+def _to_str(value: Any) -> str:
+    return _to_date(value).strftime(DATE_FORMAT)
+
+
+class TradingCalendar:
+    """交易日历（本地持久化）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(settings.CACHE_DIR / CALENDAR_FILE)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dates: List[str] = []           # 升序交易日
+        self._position: Dict[str, int] = {}   # 交易日 -> 序号
+        self._floor: Dict[str, int] = {}      # 任意自然日 -> 不晚于该日的最近交易日序号
+        self._start = ''
+        self._end = ''
+        self._fetched_at = 0.0
+
+    # ------------------------------------------------------------------ 加载
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded and not self._needs_refresh():
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load_file()
+                self._loaded = True
+            if self._needs_refresh():
+                self._fetch()
+
+    def _needs_refresh(self) -> bool:
+        if not self._dates:
+            return time.time() - self._fetched_at > 3600  # 拉取失败后1小时内不再重试
+        today = datetime.now().strftime(DATE_FORMAT)
+        if self._end < today:
+            # 日历已过期：按同样的1小时间隔重试，拉取失败时不在每次查询时重复调用
+            return time.time() - self._fetched_at > 3600
+        return time.time() - self._fetched_at > CALENDAR_MAX_AGE_DAYS * 86400
+
+    def _load_file(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._build(data['dates'], data['start'], data['end'])
+            self._fetched_at = data.get('fetched_at', 0.0)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"交易日历文件读取失败，将重新拉取: {e}")
+
+    def _fetch(self) -> None:
+        """从Tushare拉取多年日历并持久化（一次调用）"""
+        now = datetime.now()
+        start = f"{now.year - HISTORY_YEARS}0101"
+        end = f"{now.year + 1}1231"
+        self._fetched_at = time.time()
+        try:
+            from .tushare_client import pro
+            df = pro.trade_cal(exchange='SSE', start_date=start, end_date=end)
+        except Exception as e:
+            logger.warning(f"获取交易日历失败: {e}")
+            return
+        if df is None or df.empty:
+            return
+
+        dates = sorted(df.loc[df['is_open'].astype(int) == 1, 'cal_date'].astype(str).tolist())
+        # 接口只返回到已公布休市安排的日期，覆盖范围以实际返回为准
+        self._build(dates, start, str(df['cal_date'].astype(str).max()))
+        payload = {'dates': dates, 'start': start, 'end': self._end, 'fetched_at': self._fetched_at}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            _atomic_write(self.path, json.dumps(payload).encode('utf-8'))
+        except Exception as e:
+            logger.warning(f"交易日历保存失败: {e}")
+        logger.info(f"交易日历已更新: {start} - {self._end}, {len(dates)}个交易日")
+
+    def _build(self, dates: List[str], start: str, end: str) -> None:
+        """构建交易日序号和自然日 -> 最近交易日的映射"""
+        position = {d: i for i, d in enumerate(dates)}
+        floor = {}
+        idx = -1
+        for day in pd.date_range(start, end, freq='D').strftime(DATE_FORMAT):
+            if day in position:
+                idx = position[day]
+            floor[day] = idx
+        self._dates, self._position, self._floor = dates, position, floor
+        self._start, self._end = start, end
+
+    @property
+    def available(self) -> bool:
+        self._ensure_loaded()
+        return bool(self._dates)
+
+    # ------------------------------------------------------------------ 查询
+
+    def is_trading_day(self, date: Any = None) -> bool:
+        """是否为交易日（日历不可用时按周一至周五判断）"""
+        day = _to_date(date or datetime.now())
+        self._ensure_loaded()
+        key = day.strftime(DATE_FORMAT)
+        if self._dates and self._start <= key <= self._end:
+            return key in self._position
+        return day.weekday() < 5
+
+    def _floor_index(self, date: Any) -> int:
+        key = _to_str(date)
+        if key in self._floor:
+            return self._floor[key]
+        if key > self._end:
+            return len(self._dates) - 1
+        return -1
+
+    def prev(self, date: Any = None, inclusive: bool = True) -> Optional[str]:
+        """
+        不晚于（inclusive）或早于给定日期的最近交易日
+
+        Args:
+            date: 日期（YYYYMMDD / YYYY-MM-DD / datetime），默认今天
+            inclusive: 给定日期本身是交易日时是否返回它
+
+        Returns:
+            交易日（YYYYMMDD），超出日历范围时为None
+        """
+        self._ensure_loaded()
+        if not self._dates:
+            return self._fallback_offset(date, 0 if inclusive else -1)
+        key = _to_str(date or datetime.now())
+        idx = self._floor_index(key)
+        if not inclusive and idx >= 0 and self._dates[idx] == key:
+            idx -= 1
+        return self._dates[idx] if idx >= 0 else None
+
+    def next(self, date: Any = None, inclusive: bool = False) -> Optional[str]:
+        """晚于（或inclusive时不早于）给定日期的最近交易日"""
+        self._ensure_loaded()
+        if not self._dates:
+            return self._fallback_offset(date, 0 if inclusive else 1, forward=True)
+        key = _to_str(date or datetime.now())
+        idx = self._floor_index(key)
+        if idx < 0 or self._dates[idx] != key or not inclusive:
+            idx += 1
+        return self._dates[idx] if 0 <= idx < len(self._dates) else None
+
+    def offset(self, date: Any, n: int) -> Optional[str]:
+        """
+        交易日推移：n>0 向后第n个交易日，n<0 向前第|n|个交易日，n=0 为不晚于该日的最近交易日
+
+        非交易日起算时两个方向对称：后一个/前一个交易日分别计为第1步（周六 -1 为周五，+1 为下周一）
+        """
+        self._ensure_loaded()
+        if not self._dates:
+            return self._fallback_offset(date, n, forward=n > 0)
+        key = _to_str(date)
+        idx = self._floor_index(key)
+        if idx < 0 or self._dates[idx] != key:
+            if n > 0:
+                # 非交易日向后推移时，第1个交易日即为下一交易日
+                idx += 1
+                n -= 1
+            elif n < 0:
+                # 向前推移时，不晚于该日的最近交易日即为第1个交易日
+                n += 1
+        idx += n
+        return self._dates[idx] if 0 <= idx < len(self._dates) else None
+
+    def range(self, start: Any, end: Any) -> List[str]:
+        """区间内的交易日（含端点，升序）"""
+        self._ensure_loaded()
+        start_key, end_key = _to_str(start), _to_str(end)
+        if not self._dates:
+            return [d for d in pd.bdate_range(start_key, end_key).strftime(DATE_FORMAT)]
+        lo = self._floor_index(start_key)
+        if lo < 0 or self._dates[lo] != start_key:
+            lo += 1
+        hi = self._floor_index(end_key)
+        return self._dates[lo:hi + 1] if hi >= lo else []
+
+    def recent(self, n: int, end: Any = None) -> List[str]:
+        """截至end（默认今天）最近的n个交易日（最新在前）"""
+        self._ensure_loaded()
+        if not self._dates:
+            # 按周一至周五倒序取n天；不能逐个 offset(-i)，周末出发时 offset(0) 与 offset(-1) 相同
+            days = pd.bdate_range(end=_to_date(end or datetime.now()), periods=max(n, 0))
+            return list(days[::-1].strftime(DATE_FORMAT))
+        hi = self._floor_index(end or datetime.now())
+        if hi < 0:
+            return []
+        return self._dates[max(0, hi - n + 1):hi + 1][::-1]
+
+    def latest(self) -> str:
+        """不晚于今天的最近交易日"""
+        return self.prev(datetime.now()) or datetime.now().strftime(DATE_FORMAT)
+
+    @staticmethod
+    def _fallback_offset(date: Any, n: int, forward: bool = False) -> str:
+        """日历不可用时按周一至周五推移"""
+        day = _to_date(date or datetime.now())
+        step = timedelta(days=1 if forward or n > 0 else -1)
+        if day.weekday() >= 5:
+            while day.weekday() >= 5:
+                day += step
+            # 与日历路径一致：从非交易日出发时，最近的交易日计为第1步
+            if n:
+                n += -1 if n > 0 else 1
+        for _ in range(abs(n)):
+            day += step
+            while day.weekday() >= 5:
+                day += step
+        return day.strftime(DATE_FORMAT)
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return {
+            'start': self._start,
+            'end': self._end,
+            'trading_days': len(self._dates),
+            'fetched_at': datetime.fromtimestamp(self._fetched_at).isoformat() if self._fetched_at else None,
+        }
+
+
+class DataDateRegistry:
+    """各数据接口最新有数据交易日的登记表（本地持久化）"""
+
+    def __init__(self, calendar: TradingCalendar, path: Optional[str] = None, probe_interval: int = 600):
+        """
+        Args:
+            calendar: 交易日历
+            path: 持久化文件路径
+            probe_interval: 同一接口两次试探新日期之间的最短间隔（秒）
+        """
+        self.calendar = calendar
+        self.path = path or str(settings.CACHE_DIR / REGISTRY_FILE)
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._dates: Dict[str, str] = {}
+        self._probed_at: Dict[str, float] = {}
+        self._stats = {'resolved': 0, 'api_calls': 0}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._dates = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"数据日期登记表读取失败: {e}")
+
+    def get(self, endpoint: str) -> Optional[str]:
+        """接口已登记的最新有数据日期"""
+        return self._dates.get(endpoint)
+
+    def record(self, endpoint: str, trade_date: str) -> None:
+        """登记接口在某交易日有数据（只向后更新）"""
+        trade_date = _to_str(trade_date)
+        with self._lock:
+            if self._dates.get(endpoint, '') >= trade_date:
+                return
+            self._dates[endpoint] = trade_date
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                _atomic_write(self.path, json.dumps(self._dates, ensure_ascii=False, indent=1).encode('utf-8'))
+            except Exception as e:
+                logger.warning(f"数据日期登记表保存失败: {e}")
+
+    def _has_data(self, api_func: Callable, trade_date: str) -> bool:
+        self._stats['api_calls'] += 1
+        try:
+            result = api_func(trade_date=trade_date)
+            return result is not None and not result.empty
+        except Exception:
+            return False
+
+    def resolve(self, endpoint: str, api_func: Callable, max_attempts: int = 10) -> Optional[str]:
+        """
+        解析接口最近有数据的交易日
+
+        已登记日期即为最新交易日时直接返回；否则仅试探登记日期之后的交易日（同一接口按probe_interval节流），
+        无登记时按交易日倒序试探最多max_attempts个
+
+        Args:
+            endpoint: 接口名（登记表键）
+            api_func: 接受trade_date参数的数据函数
+            max_attempts: 无登记时的最大试探次数
+
+        Returns:
+            交易日（YYYYMMDD），找不到时为None
+        """
+        self._stats['resolved'] += 1
+        known = self._dates.get(endpoint)
+        latest = self.calendar.latest()
+        if known and known >= latest:
+            return known
+
+        now = time.time()
+        if known and now - self._probed_at.get(endpoint, 0) < self.probe_interval:
+            return known
+        self._probed_at[endpoint] = now
+
+        if known:
+            candidates = [d for d in self.calendar.recent(max_attempts) if d > known]
+        else:
+            candidates = self.calendar.recent(max_attempts)
+
+        for trade_date in candidates:
+            if self._has_data(api_func, trade_date):
+                self.record(endpoint, trade_date)
+                return trade_date
+        return known
+
+    def candidates(self, endpoint: str, n: int = 5) -> List[str]:
+        """
+        按优先顺序排列的候选交易日（最新在前）
+
+        登记日期之后尚未确认的交易日排在最前，随后从登记的最新有数据日期向前；未登记时即最近n个交易日。
+        调用方查询成功后应record该日期
+        """
+        known = self._dates.get(endpoint)
+        if not known:
+            return self.calendar.recent(n)
+        newer = [d for d in self.calendar.recent(n) if d > known]
+        return (newer + self.calendar.recent(n, end=known))[:n]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'endpoints': dict(self._dates)}
+
+
+# 全局实例
+trading_calendar = TradingCalendar()
+data_dates = DataDateRegistry(trading_calendar, probe_interval=settings.DATA_DATE_PROBE_INTERVAL)
@@ -1,78 +1,56 @@
 """
 交易日期辅助函数
+交易日由本地持久化的交易日历提供（见 trading_calendar），最新有数据日期按接口登记，不再逐日试探
 """
-from datetime import datetime, timedelta
 from typing import Optional, List
-from .tushare_client import pro as ts_pro
+from .trading_calendar import trading_calendar, data_dates
 
-pro = ts_pro
 
-_trading_dates_cache = None
-_cache_expiry = None
+def get_recent_trading_dates(days: int = 30, end: str = None) -> List[str]:
+    """获取截至end（默认今天）最近的交易日期列表（最新的在前）"""
+    return trading_calendar.recent(days, end=end)
 
-def get_recent_trading_dates(days: int = 30) -> List[str]:
-    """获取最近的交易日期列表"""
-    global _trading_dates_cache, _cache_expiry
-    
-    # 检查缓存
-    if _trading_dates_cache and _cache_expiry and datetime.now() < _cache_expiry:
-        return _trading_dates_cache[:days]
-    
-    try:
-        # 获取交易日历
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=60)).strftime('%Y%m%d')
-        
-        df = pro.trade_cal(exchange='SSE', start_date=start_date, end_date=end_date)
-        if not df.empty:
-            # 筛选交易日
-            trading_dates = df[df['is_open'] == 1]['cal_date'].tolist()
-            trading_dates.sort(reverse=True)  # 最新的在前
-            
-            # 缓存1小时
-            _trading_dates_cache = trading_dates
-            _cache_expiry = datetime.now() + timedelta(hours=1)
-            
-            return trading_dates[:days]
-    except Exception as e:
-        print(f"[警告] 获取交易日历失败: {e}")
-    
-    # 降级方案：生成最近的日期列表（跳过周末）
-    dates = []
-    current = datetime.now()
-    
-    while len(dates) < days:
-        # 跳过周末
-        if current.weekday() < 5:  # 0-6，0是周一，6是周日
-            dates.append(current.strftime('%Y%m%d'))
-        current -= timedelta(days=1)
-    
-    return dates
 
-def find_latest_trading_date_with_data(api_func, max_attempts: int = 10) -> Optional[str]:
+def _endpoint_name(api_func) -> Optional[str]:
+    name = getattr(api_func, '__name__', None)
+    return None if not name or name == '<lambda>' else name
+
+
+def find_latest_trading_date_with_data(api_func, max_attempts: int = 10, endpoint: str = None) -> Optional[str]:
     """
     查找最近有数据的交易日期
-    
+
     Args:
         api_func: API调用函数，接受trade_date参数
         max_attempts: 最大尝试次数
-    
+        endpoint: 登记表中的接口名，默认取api_func的函数名（lambda等匿名函数不登记，逐日试探）
+
     Returns:
         有数据的最新交易日期，如果没有则返回None
     """
-    trading_dates = get_recent_trading_dates(max_attempts)
-    
-    for trade_date in trading_dates:
+    endpoint = endpoint or _endpoint_name(api_func)
+    if endpoint:
+        return data_dates.resolve(endpoint, api_func, max_attempts=max_attempts)
+
+    for trade_date in trading_calendar.recent(max_attempts):
         try:
             result = api_func(trade_date=trade_date)
             if result is not None and not result.empty:
                 return trade_date
         except Exception:
             continue
-    
     return None
 
+
+def get_candidate_trading_dates(endpoint: str, days: int = 5) -> List[str]:
+    """
+    某接口按优先顺序排列的候选交易日（从已登记的最新有数据日期开始，最新的在前）
+
+    适用于按单只股票查询、无法用全市场结果判断日期是否有数据的场景
+    """
+    return data_dates.candidates(endpoint, days)
+
+
 def get_latest_trading_date() -> str:
     """获取最新的交易日期"""
-    trading_dates = get_recent_trading_dates(1)
-    return trading_dates[0] if trading_dates else datetime.now().strftime('%Y%m%d')
\ No newline at end of file
+    return trading_calendar.latest()
@@ -14,6 +14,12 @@ from pathlib import Path
 import hashlib
 import functools
 import socket
+import contextvars
+
+from .cache_strategy import smart_cache
+from .rate_limiter import get_tushare_limiter
+from .pipeline_metrics import record_api_call, record_cache
+from .deadline import DeadlineExceeded, check_deadline, remaining_timeout
 
 # 设置全局socket超时时间为15秒，防止HTTP请求无限挂起
 socket.setdefaulttimeout(15)
@@ -63,6 +69,29 @@ except Exception:
 
 _ensure_https_pro_client(pro)
 
+
+def _instrument_pro_client(client) -> None:
+    """将经由该客户端的每次查询（含 pro.xxx() 直接调用）计入当前分析阶段，并遵守当前截止时间"""
+    query = client.query
+
+    @functools.wraps(query)
+    def _query(*args, **kwargs):
+        # 所在流程已到期/取消时不再发起请求
+        check_deadline(str(args[0]) if args else '')
+        started = time.time()
+        try:
+            df = query(*args, **kwargs)
+        except Exception:
+            record_api_call(time.time() - started, error=True)
+            raise
+        record_api_call(time.time() - started, df)
+        return df
+
+    client.query = _query
+
+
+_instrument_pro_client(pro)
+
 # 创建缓存目录
 CACHE_DIR = Path.home() / ".qsl_cache"
 CACHE_DIR.mkdir(exist_ok=True)
@@ -109,6 +138,7 @@ def _rate_limit():
     if elapsed < _api_delay:
         time.sleep(_api_delay - elapsed)
     _last_api_call = time.time()
+    get_tushare_limiter().record_call()
 
 
 def _get_cache_key(prefix: str, **kwargs) -> str:
@@ -215,7 +245,7 @@ def save_cache(key: str, df: pd.DataFrame):
 
 def _call_api(api_name: str, **kwargs) -> Optional[pd.DataFrame]:
     """
-    调用Tushare API的通用方法，带20秒超时
+    调用Tushare API的通用方法，带20秒超时（存在截止时间时取剩余预算的较小者）
 
     Args:
         api_name: API接口名称
@@ -223,25 +253,36 @@ def _call_api(api_name: str, **kwargs) -> Optional[pd.DataFrame]:
 
     Returns:
         DataFrame或None
+
+    Raises:
+        DeadlineExceeded: 调用前截止时间已过或流程已取消
     """
     from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
+    timeout = remaining_timeout(20, api_name)
+
     def _do_query():
         _rate_limit()
+        # 限流等待期间可能已到期
+        check_deadline(api_name)
         return pro.query(api_name, **kwargs)
 
+    # 超时后不等待查询线程结束（由socket超时回收），调用方立即返回
+    executor = ThreadPoolExecutor(max_workers=1)
     try:
-        # 使用线程池执行查询，带20秒超时
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(_do_query)
-            try:
-                df = future.result(timeout=20)  # 20秒超时
-                return df if df is not None and not df.empty else pd.DataFrame()
-            except FutureTimeoutError:
-                print(f"[超时] API调用超时: {api_name}, 参数: {kwargs}")
-                raise APIError(f"API调用超时(20秒): {api_name}")
-    except FutureTimeoutError:
-        raise APIError(f"API调用超时(20秒): {api_name}")
+        # 在当前上下文中执行，使调用计入所在的分析阶段并继承截止时间
+        future = executor.submit(contextvars.copy_context().run, _do_query)
+        try:
+            df = future.result(timeout=timeout)
+            return df if df is not None and not df.empty else pd.DataFrame()
+        except DeadlineExceeded:
+            # DeadlineExceeded 是 TimeoutError 的子类，需先于超时分支处理
+            raise
+        except FutureTimeoutError:
+            print(f"[超时] API调用超时({timeout:.1f}秒): {api_name}, 参数: {kwargs}")
+            raise APIError(f"API调用超时({timeout:.1f}秒): {api_name}")
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         error_msg = str(e)
         if "每天最多访问" in error_msg or "每分钟最多访问" in error_msg:
@@ -252,6 +293,15 @@ def _call_api(api_name: str, **kwargs) -> Optional[pd.DataFrame]:
             raise ConfigurationError(f"接口名称错误: {error_msg}")
         else:
             raise APIError(f"API错误: {api_name}\n原始错误: {error_msg}")
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _reload_cache(func, cache_key: str, args: tuple, kwargs: dict):
+    """重新调用接口并写回缓存（供智能缓存预刷新热点键）"""
+    result = func(*args, **kwargs)
+    if result is not None and not result.empty:
+        save_cache(cache_key, result)
 
 
 def cached(func):
@@ -273,6 +323,10 @@ def cached(func):
         # 检查缓存
         if not force:
             cached_df = check_cache(cache_key)
+            record_cache(cached_df is not None)
+            smart_cache.record_access('tushare', cache_key, cached_df is not None,
+                                      loader=lambda: _reload_cache(func, cache_key, args, kwargs),
+                                      stored_at=lambda: _get_cache_path(cache_key).stat().st_mtime)
             if cached_df is not None:
                 return cached_df
         
@@ -572,6 +626,38 @@ def cashflow(ts_code: str, period: str = None, force: bool = False) -> pd.DataFr
 
 # ========== 市场数据接口 ==========
 
+@cached
+def moneyflow(ts_code: str = None, trade_date: str = None, start_date: str = None, end_date: str = None, force: bool = False) -> pd.DataFrame:
+    """获取个股资金流向（不传ts_code、只传trade_date时为全市场截面）"""
+    key = f"moneyflow_{ts_code or 'all'}_{trade_date or end_date or 'latest'}"
+    stale = _get_any_cached_df(key)
+
+    if not force:
+        cached_df = _get_cached_df(key, ttl_seconds=get_dynamic_ttl("capital_flow"))
+        if cached_df is not None and not cached_df.empty:
+            return cached_df
+
+    try:
+        params = {}
+        if ts_code:
+            params["ts_code"] = ts_code
+        if trade_date:
+            params["trade_date"] = trade_date
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+
+        df = _call_api("moneyflow", **params)
+        if df is not None and not df.empty:
+            _save_df_cache(key, df)
+        return _choose_df(df, stale)
+    except (RateLimitError, AccessDeniedError) as e:
+        raise Exception(f"API访问失败: {_first_line_from_exception(e)}")
+    except (ConfigurationError, APIError) as e:
+        raise Exception(f"API配置错误: {str(e)}")
+
+
 @cached
 def moneyflow_hsgt(trade_date: str = None, start_date: str = None, end_date: str = None, force: bool = False) -> pd.DataFrame:
     """获取沪深港通资金流向
@@ -35,7 +35,7 @@ def clean_nan_values(obj: Any) -> Any:
             return None
         return obj.item()
     elif isinstance(obj, np.ndarray):
-        return obj.tolist()
+        return clean_nan_values(obj.tolist())
     elif pd.isna(obj):
         return None
     return obj
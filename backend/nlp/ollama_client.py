@@ -2,6 +2,13 @@ import os
 import json
 import requests
 
+try:
+    # 在分析流程/HTTP请求的截止时间内调用时，超时不超过剩余预算，到期后直接跳过
+    from core.deadline import remaining_timeout
+except ImportError:
+    def remaining_timeout(default, what=''):
+        return default
+
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:8b")  # 默认使用8b模型
 OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "8192"))  # 输出长度限制
@@ -393,7 +400,7 @@ def summarize(chunks: dict, stream_callback=None) -> str:
                 f"{OLLAMA_URL}/api/generate",
                 json=body,
                 stream=True,
-                timeout=OLLAMA_TIMEOUT,
+                timeout=remaining_timeout(OLLAMA_TIMEOUT, 'ollama'),
             )
             r.raise_for_status()
             full_response = ""
@@ -416,7 +423,7 @@ def summarize(chunks: dict, stream_callback=None) -> str:
             r = requests.post(
                 f"{OLLAMA_URL}/api/generate",
                 json=body,
-                timeout=OLLAMA_TIMEOUT,
+                timeout=remaining_timeout(OLLAMA_TIMEOUT, 'ollama'),
             )
             r.raise_for_status()
             resp = r.json().get("response", "").strip()
@@ -539,7 +546,7 @@ def summarize_hotspot(hotspot_data: dict, stream_callback=None) -> str:
                 f"{OLLAMA_URL}/api/generate",
                 json=body,
                 stream=True,
-                timeout=OLLAMA_TIMEOUT,
+                timeout=remaining_timeout(OLLAMA_TIMEOUT, 'ollama'),
             )
             r.raise_for_status()
             full_response = ""
@@ -562,7 +569,7 @@ def summarize_hotspot(hotspot_data: dict, stream_callback=None) -> str:
             r = requests.post(
                 f"{OLLAMA_URL}/api/generate",
                 json=body,
-                timeout=OLLAMA_TIMEOUT,
+                timeout=remaining_timeout(OLLAMA_TIMEOUT, 'ollama'),
             )
             r.raise_for_status()
             resp = r.json().get("response", "").strip()
@@ -662,7 +669,7 @@ def summarize_morning(report_data: dict) -> str:
         r = requests.post(
             f"{OLLAMA_URL}/api/generate",
             json=body,
-            timeout=OLLAMA_TIMEOUT,
+            timeout=remaining_timeout(OLLAMA_TIMEOUT, 'ollama'),
         )
         r.raise_for_status()
         resp = r.json().get("response", "").strip()
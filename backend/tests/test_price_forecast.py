@@ -0,0 +1,154 @@
+"""
+报告价格预测（Ollama提供者）测试
+在本地起一个模拟 /api/generate 的HTTP服务，OLLAMA_URL 指向该服务，
+覆盖批量解析、无效输出回退与超时回退（含回退结果的短期缓存）
+
+运行: cd backend && python -m unittest discover -s tests
+"""
+import json
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import price_forecast  # noqa: E402
+from core.cache_manager import CacheManager  # noqa: E402
+from core.config import settings  # noqa: E402
+from core.price_forecast import (  # noqa: E402
+    OllamaPricePredictor, PricePredictionService, build_context,
+)
+
+HORIZON = 3
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """按服务器上设置的 reply / delay 应答 /api/generate"""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server.requests.append(body)
+        if server.delay:
+            time.sleep(server.delay)
+        payload = json.dumps({'response': server.reply(body)}).encode('utf-8')
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时断开
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def _context(key, base):
+    closes = [base * (1 + 0.002 * i) for i in range(15)]
+    return build_context(key, key, closes, '20250102', technical_score=20, fundamental_score=10)
+
+
+class OllamaPricePredictorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubOllama)
+        cls.server.daemon_threads = True
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.delay = 0
+        self.server.reply = lambda body: ''
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patches = [
+            mock.patch.object(settings, 'OLLAMA_URL', self.url),
+            mock.patch.object(price_forecast, 'cache_manager', CacheManager(base_dir=self.cache_dir.name)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+        self.contexts = [_context('600000.SH', 10.0), _context('000001.SZ', 20.0), _context('300750.SZ', 200.0)]
+
+    def _service(self, timeout=5, batch_size=2):
+        provider = OllamaPricePredictor(timeout=timeout, batch_size=batch_size)
+        return PricePredictionService(provider, ttl=3600, negative_ttl=600)
+
+    def test_batched_prompts_are_parsed_per_stock(self):
+        def reply(body):
+            # 按提示中出现的代码逐只给出价格，附带思考过程与多余文字
+            prices = {ctx['key']: [round(ctx['closes'][0] * 1.01, 2)] * HORIZON
+                      for ctx in self.contexts if ctx['key'] in body['prompt']}
+            return f"<think>分析中</think>预测如下：{json.dumps(prices)}"
+
+        self.server.reply = reply
+        results = self._service(batch_size=2).forecast(self.contexts, HORIZON)
+
+        # 3只股票按每批2只分为两次请求
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertTrue(all(body['model'] == settings.PRICE_PREDICTION_MODEL for body in self.server.requests))
+        for ctx, result in zip(self.contexts, results):
+            self.assertEqual(result['source'], 'ollama')
+            self.assertEqual(result['prices'], [round(ctx['closes'][0] * 1.01, 2)] * HORIZON)
+
+    def test_invalid_output_falls_back_per_stock(self):
+        def reply(body):
+            # 第一只有效；第二只数量不足；第三只偏离过大
+            return json.dumps({
+                '600000.SH': [10.1, 10.2, 10.3],
+                '000001.SZ': [20.1],
+                '300750.SZ': [900, 900, 900],
+            })
+
+        self.server.reply = reply
+        results = self._service(batch_size=8).forecast(self.contexts, HORIZON)
+
+        self.assertEqual([r['source'] for r in results], ['ollama', 'fallback', 'fallback'])
+        self.assertEqual(results[0]['prices'], [10.1, 10.2, 10.3])
+        self.assertTrue(all(len(r['prices']) == HORIZON for r in results))
+
+    def test_unparseable_output_falls_back(self):
+        self.server.reply = lambda body: '无法预测'
+        results = self._service().forecast(self.contexts[:1], HORIZON)
+        self.assertEqual(results[0]['source'], 'fallback')
+        self.assertEqual(len(results[0]['prices']), HORIZON)
+
+    def test_timeout_falls_back_and_is_cached(self):
+        self.server.delay = 2
+        self.server.reply = lambda body: json.dumps({'600000.SH': [10.1, 10.2, 10.3]})
+        service = self._service(timeout=0.5)
+
+        started = time.time()
+        first = service.forecast(self.contexts[:1], HORIZON)
+        self.assertLess(time.time() - started, 2)
+        self.assertEqual(first[0]['source'], 'fallback')
+        self.assertEqual(len(self.server.requests), 1)
+
+        # 回退结果已短期缓存：再次请求不再等待LLM
+        started = time.time()
+        second = service.forecast(self.contexts[:1], HORIZON)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(second[0]['cached'])
+        self.assertEqual(second[0]['source'], 'fallback')
+        self.assertEqual(second[0]['prices'], first[0]['prices'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+响应序列化测试
+覆盖 NaN/Inf、缺失日期时间（NaT/NA）与 numpy/pandas 类型的编码，
+并分别验证 orjson 与标准库回退两条路径
+
+运行: cd backend && python -m unittest discover -s tests
+"""
+import datetime as dt
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import serialization  # noqa: E402
+from core.serialization import dumps  # noqa: E402
+
+
+class DumpsTest(unittest.TestCase):
+
+    def _check(self):
+        payload = {
+            'nat': pd.NaT,
+            'na': pd.NA,
+            'nan': float('nan'),
+            'inf': np.float64('inf'),
+            'ts': pd.Timestamp('2024-01-02 09:30'),
+            'date': dt.date(2024, 1, 1),
+            'dates': [pd.Timestamp('2024-01-03'), pd.NaT],
+            'values': np.array([1.5, np.nan]),
+        }
+        self.assertEqual(json.loads(dumps(payload)), {
+            'nat': None,
+            'na': None,
+            'nan': None,
+            'inf': None,
+            'ts': '2024-01-02T09:30:00',
+            'date': '2024-01-01',
+            'dates': ['2024-01-03T00:00:00', None],
+            'values': [1.5, None],
+        })
+
+    @unittest.skipUnless(serialization._ORJSON_AVAILABLE, 'orjson未安装')
+    def test_orjson_encodes_missing_values_as_null(self):
+        self._check()
+
+    def test_stdlib_fallback_encodes_missing_values_as_null(self):
+        with mock.patch.object(serialization, '_ORJSON_AVAILABLE', False):
+            self._check()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+交易日历测试
+不访问Tushare：直接构建日历，或模拟日历拉取失败后的周一至周五回退路径，
+重点覆盖从周末出发的推移与最近交易日列表
+
+运行: cd backend && python -m unittest discover -s tests
+"""
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.trading_calendar import DATE_FORMAT, TradingCalendar  # noqa: E402
+
+FRIDAY, SATURDAY, SUNDAY, MONDAY = '20261016', '20261017', '20261018', '20261019'
+
+
+def _calendar(dates=None):
+    """构建已加载的日历；dates为None时模拟拉取失败（空日历，1小时内不重试）"""
+    tmp = tempfile.TemporaryDirectory()
+    calendar = TradingCalendar(path=str(Path(tmp.name) / 'calendar.json'))
+    calendar._loaded = True
+    calendar._fetched_at = time.time()
+    if dates is not None:
+        calendar._build(dates, '20261001', '20261031')
+    return calendar, tmp
+
+
+class TradingCalendarTest(unittest.TestCase):
+
+    def setUp(self):
+        weekdays = list(pd.bdate_range('20261001', '20261031').strftime(DATE_FORMAT))
+        self.calendar, tmp = _calendar(weekdays)
+        self.addCleanup(tmp.cleanup)
+        self.fallback, tmp = _calendar()
+        self.addCleanup(tmp.cleanup)
+
+    def test_offset_from_weekend_is_symmetric(self):
+        for calendar in (self.calendar, self.fallback):
+            self.assertEqual(calendar.offset(SATURDAY, 0), FRIDAY)
+            self.assertEqual(calendar.offset(SATURDAY, -1), FRIDAY)
+            self.assertEqual(calendar.offset(SATURDAY, 1), MONDAY)
+            self.assertEqual(calendar.offset(FRIDAY, -1), '20261015')
+            self.assertEqual(calendar.offset(FRIDAY, 1), MONDAY)
+
+    def test_recent_from_weekend_has_no_duplicates(self):
+        for calendar in (self.calendar, self.fallback):
+            for end in (SATURDAY, SUNDAY, FRIDAY):
+                self.assertEqual(calendar.recent(3, end=end), [FRIDAY, '20261015', '20261014'])
+            self.assertEqual(calendar.recent(0, end=SUNDAY), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
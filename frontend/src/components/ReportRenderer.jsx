@@ -2,14 +2,18 @@ import React from 'react'
 import ReactMarkdown from 'react-markdown'
 import remarkGfm from 'remark-gfm'
 import InteractiveKLineChart from './InteractiveKLineChart'
+import { toPriceRecords } from '../utils/priceSeries'
 
 /**
  * 智能报告渲染器
  * 自动检测并提取HTML图表，用交互式ECharts替换
  */
-export default function ReportRenderer({ text, prices, predictions, stockName, indicators }) {
+export default function ReportRenderer({ text, prices: rawPrices, predictions, stockName, indicators }) {
   if (!text) return null
 
+  // 兼容列式载荷和旧的逐根K线数组
+  const prices = toPriceRecords(rawPrices);
+
   // 检测是否有图表（静态SVG或HTML）
   const chartMatch = text.match(/<div class="chart-container">[\s\S]*?<\/div>/);
 
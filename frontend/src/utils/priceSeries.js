@@ -0,0 +1,22 @@
+/**
+ * 价格序列工具
+ * 后端以列式载荷返回K线：{ format: 'columnar', fields, dates, open: [...], ... }
+ * 图表组件按逐根K线对象消费，这里统一转换（旧的对象数组原样返回）
+ */
+export function toPriceRecords(prices) {
+  if (!prices) return [];
+  if (Array.isArray(prices)) return prices;
+  if (prices.format !== 'columnar') return [];
+
+  const dates = prices.dates || [];
+  const fields = prices.fields || [];
+  const records = new Array(dates.length);
+  for (let i = 0; i < dates.length; i++) {
+    const bar = { trade_date: dates[i] };
+    for (const field of fields) {
+      bar[field] = prices[field]?.[i] ?? null;
+    }
+    records[i] = bar;
+  }
+  return records;
+}